@@ -0,0 +1,275 @@
+"""
+Streaming aggregation module
+Keeps running counts, sums, min/max and mergeable quantile sketches per group key
+(GDB attributes, LV95 tiles, size classes). Partial aggregates of each chunk merge at
+the end, so aggregates never need the full result table in memory
+"""
+
+import math
+import logging
+
+import numpy as np
+
+from sampling import size_class_labels
+
+SKETCH_ACCURACY = 0.01  # Relative accuracy of the quantile sketches
+SKETCH_MAX_BUCKETS = 2048
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+TILE_PREFIX = 'tile:'
+SIZE_KEY = 'size'
+MISSING_LABEL = '(missing)'  # Key of buildings without a value (null attribute, no geometry)
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative error guarantees (DDSketch style)
+
+    Values are counted in logarithmic buckets; two sketches merge by adding bucket counts.
+    """
+
+    __slots__ = ('gamma', 'log_gamma', 'positive', 'negative', 'zeros', 'count')
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, values):
+        """Add an array of values (NaN is ignored)"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.zeros += int((values == 0).sum())
+        for store, part in ((self.positive, values[values > 0]), (self.negative, -values[values < 0])):
+            if len(part):
+                buckets, counts = np.unique(np.ceil(np.log(part) / self.log_gamma).astype(np.int64),
+                                            return_counts=True)
+                for bucket, count in zip(buckets.tolist(), counts.tolist()):
+                    store[bucket] = store.get(bucket, 0) + count
+                self._collapse(store)
+
+    def merge(self, other):
+        """Add the counts of another sketch with the same accuracy"""
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for bucket, count in other_store.items():
+                store[bucket] = store.get(bucket, 0) + count
+            self._collapse(store)
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def _collapse(self, store):
+        """Fold the smallest buckets together when a store grows too large"""
+        if len(store) <= SKETCH_MAX_BUCKETS:
+            return
+        buckets = sorted(store)
+        keep = buckets[-(SKETCH_MAX_BUCKETS - 1)]
+        folded = sum(store.pop(bucket) for bucket in buckets[:-(SKETCH_MAX_BUCKETS - 1)])
+        store[keep] += folded
+
+    def quantile(self, q):
+        """Approximate value at quantile q (None if the sketch is empty)"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+
+        # Negative values from the most negative up, then zeros, then positive values
+        seen = 0
+        for bucket in sorted(self.negative, reverse=True):
+            seen += self.negative[bucket]
+            if seen > rank:
+                return -self._value(bucket)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for bucket in sorted(self.positive):
+            seen += self.positive[bucket]
+            if seen > rank:
+                return self._value(bucket)
+        return self._value(max(self.positive)) if self.positive else 0.0
+
+    def _value(self, bucket):
+        """Representative value of a bucket"""
+        return 2 * self.gamma ** bucket / (self.gamma + 1)
+
+
+class GroupStats:
+    """Running statistics of one metric column within one group"""
+
+    __slots__ = ('count', 'total', 'minimum', 'maximum', 'sketch')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.sketch = QuantileSketch()
+
+    def add(self, values):
+        """Add an array of values of this group"""
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        self.sketch.add(values)
+
+    def merge(self, other):
+        """Add the statistics of another partial aggregate"""
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.sketch.merge(other.sketch)
+
+
+def parse_group_keys(text):
+    """Parse a grouping such as 'GEMEINDE', 'tile:1000' or 'tile:1000,size'"""
+    keys = [key.strip() for key in str(text).split(',') if key.strip()]
+    if not keys:
+        raise ValueError("No group keys given")
+    for key in keys:
+        if key.startswith(TILE_PREFIX):
+            float(key[len(TILE_PREFIX):])  # Tile size in meters
+    return keys
+
+
+def validate_group_keys(keys, columns, attributes=None):
+    """Check a grouping against the result columns and, when known, the input attributes
+
+    Raises ValueError for a size key without the footprint metric or an attribute key
+    that is not in the input, which would otherwise put every building in one group.
+    """
+    for key in keys:
+        if key == SIZE_KEY and 'surf_footprint_area' not in columns:
+            raise ValueError(f"Group key '{SIZE_KEY}' needs the footprint metric (add footprint to --metrics)")
+        if (not key.startswith(TILE_PREFIX) and key != SIZE_KEY and attributes is not None
+                and key not in attributes):
+            raise ValueError(f"Group key '{key}' is not an attribute of the input "
+                             f"(available: {', '.join(attributes)})")
+
+
+def key_label(value):
+    """Group key text of a non-null attribute value - the same whatever the chunk's dtype"""
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))  # Integer attributes turn float in chunks with nulls
+    if isinstance(value, np.generic):
+        value = value.item()
+    return str(value)
+
+
+def building_centroids(chunk_data):
+    """Mean vertex position (x, y) of each building of a chunk, in LV95 - NaN without geometry"""
+    centroids = np.full((len(chunk_data), 2), np.nan)
+    for i, row in enumerate(chunk_data):
+        vertices = row.get('_vertices')
+        if vertices is not None and len(vertices):
+            centroids[i] = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)[:, :2].mean(axis=0)
+            if row.get('_origin') is not None:
+                centroids[i] += row['_origin'][:2]
+    return centroids
+
+
+def group_key_columns(df, keys, centroids=None):
+    """Key label arrays for a grouping (tiles as the LV95 lower left corner in meters, MISSING_LABEL without a value)"""
+    columns = []
+    for key in keys:
+        if key.startswith(TILE_PREFIX):
+            tile_size = float(key[len(TILE_PREFIX):])
+            corner = np.floor(centroids / tile_size) * tile_size
+            labels = [f"{x:.0f}_{y:.0f}" if x == x else MISSING_LABEL for x, y in corner]
+            columns.append(np.array(labels, dtype=object))
+        elif key == SIZE_KEY:
+            labels = size_class_labels(df['surf_footprint_area'].to_numpy(dtype=np.float64)).astype(object)
+            columns.append(np.where(labels == '', MISSING_LABEL, labels).astype(object))
+        elif key in df.columns:
+            missing = df[key].isna().to_numpy()
+            columns.append(np.array([MISSING_LABEL if null else key_label(value)
+                                     for value, null in zip(df[key].to_numpy(dtype=object), missing)], dtype=object))
+        else:
+            # Attributes of CityGML / CityJSON buildings can be absent from a whole chunk
+            columns.append(np.full(len(df), MISSING_LABEL, dtype=object))
+    return columns
+
+
+class GroupAggregator:
+    """Per-group running statistics of the metric columns for one grouping"""
+
+    def __init__(self, keys, columns, quantiles=DEFAULT_QUANTILES):
+        self.keys = list(keys)
+        self.columns = list(columns)
+        self.quantiles = tuple(quantiles)
+        self.groups = {}  # key tuple -> {column: GroupStats}
+        self.buildings = {}  # key tuple -> building count
+
+    def needs_centroids(self):
+        """True if a key is derived from coordinates"""
+        return any(key.startswith(TILE_PREFIX) for key in self.keys)
+
+    def partial(self, df, centroids=None):
+        """Aggregate one chunk into a new partial aggregator"""
+        part = GroupAggregator(self.keys, self.columns, self.quantiles)
+        if len(df) == 0:
+            return part
+
+        key_columns = group_key_columns(df, self.keys, centroids)
+        group_labels = list(zip(*key_columns))
+        unique_groups, inverse = np.unique(np.array(['\x1f'.join(g) for g in group_labels], dtype=object),
+                                           return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(inverse))])
+        values = {column: df[column].to_numpy(dtype=np.float64) for column in self.columns if column in df.columns}
+
+        for i in range(len(unique_groups)):
+            members = order[bounds[i]:bounds[i + 1]]
+            group = group_labels[members[0]]
+            part.buildings[group] = len(members)
+            stats = part.groups[group] = {column: GroupStats() for column in values}
+            for column, column_values in values.items():
+                stats[column].add(column_values[members])
+        return part
+
+    def merge(self, other):
+        """Merge a partial aggregate (of a chunk or a worker) into this one"""
+        for group, other_stats in other.groups.items():
+            self.buildings[group] = self.buildings.get(group, 0) + other.buildings[group]
+            stats = self.groups.setdefault(group, {})
+            for column, column_stats in other_stats.items():
+                if column in stats:
+                    stats[column].merge(column_stats)
+                else:
+                    stats[column] = column_stats
+
+    def update(self, df, centroids=None):
+        """Aggregate one chunk and merge it"""
+        self.merge(self.partial(df, centroids))
+
+    def to_frame(self):
+        """One row per group with count and per-column sum, mean, min, max and quantiles"""
+        import pandas as pd
+
+        rows = []
+        for group in sorted(self.groups):
+            row = dict(zip(self.keys, group))
+            row['buildings'] = self.buildings[group]
+            for column, stats in self.groups[group].items():
+                has_values = stats.count > 0
+                row[f'{column}_count'] = stats.count
+                row[f'{column}_sum'] = stats.total
+                row[f'{column}_mean'] = stats.total / stats.count if has_values else None
+                row[f'{column}_min'] = stats.minimum if has_values else None
+                row[f'{column}_max'] = stats.maximum if has_values else None
+                for q in self.quantiles:
+                    row[f'{column}_p{q * 100:g}'] = stats.sketch.quantile(q)
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def write(self, path):
+        """Write the aggregates to CSV"""
+        df = self.to_frame()
+        df.to_csv(path, index=False)
+        logging.getLogger(__name__).info(f"Saved {len(df)} aggregate groups by {', '.join(self.keys)} to {path}")
+        return df
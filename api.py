@@ -0,0 +1,126 @@
+"""
+Python API module
+Streams buildings held in memory through the parallel worker pool without any file I/O:
+records go in as (id, vertices, faces) or (id, wkb) and results come out as a generator,
+in input order or as they complete, with a bounded number of batches in flight
+
+    from api import analyze_buildings
+    for building_id, result in analyze_buildings(records, num_workers=4, metrics=['volume']):
+        ...
+"""
+
+from itertools import islice
+from concurrent.futures import wait, FIRST_COMPLETED
+
+import numpy as np
+
+from chunking import IN_FLIGHT_PER_WORKER
+from metrics import plan_metrics
+from welding import DEFAULT_WELD_TOLERANCE
+
+DEFAULT_BATCH_SIZE = 64  # Buildings per worker task
+
+
+def prepare_batch(records):
+    """Worker tasks of a batch of records - returns (ids, tasks) with compact local geometry"""
+    from triangulation import VERTEX_DTYPE, FACE_DTYPE, localize, triangulate_local
+    from wkb_reader import decode_wkb_batch
+
+    ids = []
+    tasks = [None] * len(records)
+    wkb_positions = []
+    for n, record in enumerate(records):
+        if len(record) == 2:
+            wkb_positions.append(n)
+        elif len(record) == 3:
+            vertices = np.asarray(record[1], dtype=np.float64).reshape(-1, 3)
+            faces = np.asarray(record[2], dtype=np.int64).reshape(-1, 3)
+            local, origins = localize(vertices, np.array([0, len(vertices)]))
+            tasks[n] = (n, local.astype(VERTEX_DTYPE), faces.astype(FACE_DTYPE), origins[0])
+        else:
+            raise ValueError(f"Records are (id, vertices, faces) or (id, wkb), got {len(record)} values")
+        ids.append(record[0])
+
+    # WKB geometries of the batch are decoded and triangulated together
+    if wkb_positions:
+        vertices, faces, vertex_offsets, face_offsets, origins = triangulate_local(
+            *decode_wkb_batch([records[n][1] for n in wkb_positions]))
+        for i, n in enumerate(wkb_positions):
+            tasks[n] = (n, vertices[vertex_offsets[i]:vertex_offsets[i + 1]],
+                        faces[face_offsets[i]:face_offsets[i + 1]], origins[i])
+    return ids, tasks
+
+
+def batch_results(future, ids, columns, raw):
+    """(id, result) pairs of a finished worker task (failed records if the task raised)"""
+    from result_schema import ErrorCode, failed_record, decode_record
+
+    try:
+        records = {idx: record for idx, record, _ in future.result()}
+    except Exception as e:
+        records = dict.fromkeys(range(len(ids)), failed_record(ErrorCode.WORKER_ERROR, str(e)))
+    if raw:
+        return [(building_id, records[n]) for n, building_id in enumerate(ids)]
+    return [(building_id, decode_record(records[n], columns)) for n, building_id in enumerate(ids)]
+
+
+def analyze_buildings(records, num_workers=None, metrics=None, weld_tolerance=DEFAULT_WELD_TOLERANCE,
+                      ordered=True, batch_size=DEFAULT_BATCH_SIZE, max_in_flight=None, executor=None, raw=False):
+    """Analyze buildings from an iterable of records - yields (id, result)
+
+    records are (id, vertices, faces) with absolute (n, 3) vertices and (m, 3) triangle
+    indices, or (id, wkb) with a WKB (multi)polygon Z / polyhedral surface; they are read
+    lazily, at most max_in_flight batches ahead (default IN_FLIGHT_PER_WORKER per worker).
+    result is a dict of the metric columns with readable status (see
+    result_schema.decode_record), or with raw=True the record tuple in RESULT_COLUMNS
+    order. With ordered=False results are yielded as their batch completes. A pool is
+    started for the call unless a running executor (e.g. worker.start_worker_pool) is
+    given; pass its num_workers along, the prefetch bound is sized from it.
+    """
+    from worker import process_building_batch, start_worker_pool, default_worker_count
+
+    plan = plan_metrics(metrics)
+    own_executor = executor is None
+    num_workers = num_workers or default_worker_count()
+    if own_executor:
+        executor = start_worker_pool(num_workers)
+    max_in_flight = max(max_in_flight or num_workers * IN_FLIGHT_PER_WORKER, 1)
+
+    records = iter(records)
+    pending = {}  # future -> (batch number, ids)
+    completed = {}  # batch number -> results waiting for an earlier batch (ordered only)
+    submitted = 0
+    next_yield = 0
+    exhausted = False
+
+    try:
+        while True:
+            # Completed batches held back for ordering count against the prefetch bound
+            while not exhausted and len(pending) + len(completed) < max_in_flight:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    exhausted = True
+                    break
+                ids, tasks = prepare_batch(batch)
+                future = executor.submit(process_building_batch, tasks, weld_tolerance, plan['stages'])
+                pending[future] = (submitted, ids)
+                submitted += 1
+
+            if not pending:
+                return
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                number, ids = pending.pop(future)
+                results = batch_results(future, ids, plan['columns'], raw)
+                if ordered:
+                    completed[number] = results
+                else:
+                    yield from results
+
+            while next_yield in completed:
+                yield from completed.pop(next_yield)
+                next_yield += 1
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
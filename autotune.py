@@ -0,0 +1,312 @@
+"""
+Automatic calibration module
+Finds the CPUs and memory actually available to the process (affinity, cgroup limits),
+measures the throughput of a random sample of the layer over a range of worker counts and
+batch sizes, and saves the best settings per machine so later runs can reuse them
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import logging
+import platform
+from pathlib import Path
+
+from metrics import parse_metrics, plan_metrics, describe_plan
+from welding import DEFAULT_WELD_TOLERANCE
+
+DEFAULT_CALIBRATION_SIZE = 2000
+DEFAULT_TUNE_FILE = Path.home() / '.swissbuildings3d' / 'autotune.json'
+WORKER_MEMORY = 512 * 1024 ** 2  # Planned RSS per worker for the default worker count
+CALIBRATION_BATCH_SIZE = 64  # Batch size while the worker count is searched
+BATCH_SIZES = (16, 32, 64, 128, 256)
+MEMORY_HEADROOM = 0.8  # Share of the available memory the workers may use
+STOP_RATIO = 0.95  # Stop adding workers once throughput falls below this share of the best
+
+
+def read_first_line(path):
+    """First line of a small system file, None if it cannot be read"""
+    try:
+        with open(path, encoding='ascii') as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit():
+    """CPU quota of the container in cores (cgroup v2 or v1), None without a quota"""
+    line = read_first_line('/sys/fs/cgroup/cpu.max')
+    if line:
+        quota, period = line.split()[:2]
+        if quota != 'max':
+            return max(int(quota) / int(period), 1.0)
+        return None
+    quota = read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+    period = read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if quota and period and int(quota) > 0:
+        return max(int(quota) / int(period), 1.0)
+    return None
+
+
+def cgroup_memory_limit():
+    """Memory limit of the container in bytes (cgroup v2 or v1), None without a limit"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        line = read_first_line(path)
+        if line and line != 'max' and int(line) < 2 ** 60:  # v1 reports a huge number without a limit
+            return int(line)
+    return None
+
+
+def available_cpus():
+    """CPUs this process may use: affinity mask and container quota, at least 1"""
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_limit()
+    if quota:
+        cpus = min(cpus, math.ceil(quota))
+    return max(cpus, 1)
+
+
+def available_memory():
+    """Memory available to this process in bytes (container limit or free system memory)"""
+    try:
+        import psutil
+        memory = psutil.virtual_memory().available
+    except ImportError:
+        try:
+            memory = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        except (ValueError, OSError, AttributeError):
+            memory = None
+    limit = cgroup_memory_limit()
+    if limit and memory:
+        return min(limit, memory)
+    return limit or memory
+
+
+def total_memory():
+    """Installed memory or container limit in bytes (stable between runs, unlike the free memory)"""
+    try:
+        import psutil
+        memory = psutil.virtual_memory().total
+    except ImportError:
+        try:
+            memory = os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        except (ValueError, OSError, AttributeError):
+            memory = None
+    limit = cgroup_memory_limit()
+    if limit and memory:
+        return min(limit, memory)
+    return limit or memory
+
+
+def default_workers():
+    """Worker count without calibration: all available CPUs but one, within the memory"""
+    workers = available_cpus() - 1
+    memory = available_memory()
+    if memory:
+        workers = min(workers, int(memory * MEMORY_HEADROOM // WORKER_MEMORY))
+    return max(workers, 1)
+
+
+def machine_key(stages=None):
+    """Key of the saved settings: host, CPUs and memory of the process, and the stages tuned for"""
+    memory = total_memory()
+    memory_gb = f"{memory / 1024 ** 3:.0f}GB" if memory else 'unknown'
+    key = f"{platform.node()}|{available_cpus()}cpu|{memory_gb}"
+    return f"{key}|{'+'.join(stages)}" if stages else key
+
+
+def worker_candidates(max_workers):
+    """Worker counts to try: powers of two up to max_workers, and max_workers itself"""
+    candidates = []
+    workers = 1
+    while workers < max_workers:
+        candidates.append(workers)
+        workers *= 2
+    candidates.append(max_workers)
+    return candidates
+
+
+def read_calibration_sample(gdb_path, layer_name, size, seed=0, reader=None):
+    """Rows with packed geometry of a random sample of a GDB layer, or the first buildings of other inputs"""
+    from readers import select_reader, resolve_layer_name, read_gdb_buildings_chunked
+
+    read_chunks = select_reader(Path(gdb_path), reader)
+    if read_chunks is not read_gdb_buildings_chunked and reader != 'arrow':
+        # Geometry caches and city models have no random access by feature id
+        rows = []
+        for _, chunk_data in read_chunks(Path(gdb_path), layer_name, size, size):
+            rows.extend(chunk_data)
+        return rows
+
+    import fiona
+    from sampling import read_sample
+
+    layer_name = resolve_layer_name(gdb_path, layer_name)
+    with fiona.open(gdb_path, layer=layer_name) as src:
+        fids = list(src.keys())
+    rng = random.Random(seed)
+    sample = {fid: '' for fid in rng.sample(fids, min(size, len(fids)))}
+    return read_sample(gdb_path, layer_name, sample)
+
+
+def measure(rows, executor, num_workers, batch_size, stages, weld_tolerance, monitor):
+    """Throughput in buildings/s of one configuration on the sample"""
+    from main import process_chunk_parallel
+
+    start = time.perf_counter()
+    process_chunk_parallel(rows, 0, num_workers, executor=executor, weld_tolerance=weld_tolerance,
+                           stages=stages, batch_size=batch_size)
+    seconds = time.perf_counter() - start
+    monitor.sample()
+    return len(rows) / seconds if seconds > 0 else 0.0
+
+
+def calibrate(gdb_path, layer_name, size=DEFAULT_CALIBRATION_SIZE, stages=None, weld_tolerance=DEFAULT_WELD_TOLERANCE,
+              max_workers=None, seed=0, reader=None):
+    """Search worker count, then batch size, on a sample of the layer - returns the settings"""
+    from worker import start_worker_pool
+    from memory_monitor import MemoryMonitor, process_memory
+    logger = logging.getLogger(__name__)
+
+    stages = stages or plan_metrics()['stages']
+    cpus = available_cpus()
+    memory = available_memory()
+    max_workers = max_workers or cpus
+    rows = read_calibration_sample(gdb_path, layer_name, size, seed, reader)
+    memory_text = f", {memory / 1024 ** 3:.1f} GB available" if memory else ''
+    logger.info(f"Calibrating on {len(rows)} sampled buildings ({cpus} CPUs{memory_text})")
+
+    results = []
+
+    def run(num_workers, batch_sizes):
+        """Measure batch sizes with one pool - returns the worker peak RSS"""
+        executor = start_worker_pool(num_workers)
+        monitor = MemoryMonitor()
+        monitor.attach(executor)
+        try:
+            # Untimed warm-up so the first measurement does not pay for worker caches
+            measure(rows[:CALIBRATION_BATCH_SIZE * num_workers], executor, num_workers, CALIBRATION_BATCH_SIZE,
+                    stages, weld_tolerance, monitor)
+            for batch_size in batch_sizes:
+                throughput = measure(rows, executor, num_workers, batch_size, stages, weld_tolerance, monitor)
+                results.append({'workers': num_workers, 'batch_size': batch_size, 'buildings_per_s': throughput})
+                logger.info(f"  {num_workers} workers, batch size {batch_size}: {throughput:.1f} buildings/s")
+        finally:
+            executor.shutdown()
+        return max(monitor.worker_peaks.values(), default=0)
+
+    # Step 1: Worker count, while throughput still grows and the workers fit in memory
+    best = None
+    for num_workers in worker_candidates(max_workers):
+        worker_peak = run(num_workers, [CALIBRATION_BATCH_SIZE])
+        throughput = results[-1]['buildings_per_s']
+        if best is None or throughput > best['buildings_per_s']:
+            best = results[-1]
+        elif throughput < best['buildings_per_s'] * STOP_RATIO:
+            break
+        if memory and worker_peak:
+            parent_rss = process_memory()[0] or 0
+            fits = int((memory * MEMORY_HEADROOM - parent_rss) // worker_peak)
+            if fits <= num_workers:
+                logger.info(f"  stopping at {num_workers} workers: memory for {fits} workers "
+                            f"of {worker_peak / 1024 ** 2:.0f} MB")
+                break
+
+    # Step 2: Batch size with the best worker count
+    run(best['workers'], [b for b in BATCH_SIZES if b != CALIBRATION_BATCH_SIZE])
+    best = max((r for r in results if r['workers'] == best['workers']), key=lambda r: r['buildings_per_s'])
+
+    return {
+        'workers': best['workers'],
+        'batch_size': best['batch_size'],
+        'buildings_per_s': best['buildings_per_s'],
+        'cpus': cpus,
+        'memory_bytes': memory,
+        'layer': str(gdb_path),
+        'stages': list(stages),
+        'sample_size': len(rows),
+        'calibrated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def load_settings(tune_file=DEFAULT_TUNE_FILE, stages=None):
+    """Saved settings of this machine for the stages, None if there are none"""
+    path = Path(tune_file)
+    if not path.exists():
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get(machine_key(stages))
+
+
+def save_settings(settings, tune_file=DEFAULT_TUNE_FILE):
+    """Save the settings of this machine (other machines in the file are kept)"""
+    path = Path(tune_file)
+    saved = {}
+    if path.exists():
+        with open(path, encoding='utf-8') as f:
+            saved = json.load(f)
+    saved[machine_key(settings.get('stages'))] = settings
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(saved, f, indent=2)
+
+
+def tuned_settings(gdb_path, layer_name, tune_file=DEFAULT_TUNE_FILE, retune=False, **calibrate_args):
+    """Saved settings of this machine for the stages, or calibrate and save them"""
+    logger = logging.getLogger(__name__)
+    calibrate_args['stages'] = calibrate_args.get('stages') or plan_metrics()['stages']
+    settings = None if retune else load_settings(tune_file, calibrate_args['stages'])
+    if settings is not None:
+        logger.info(f"Using saved calibration from {settings['calibrated']}: {settings['workers']} workers, "
+                    f"batch size {settings['batch_size']} ({tune_file})")
+        return settings
+
+    settings = calibrate(gdb_path, layer_name, **calibrate_args)
+    save_settings(settings, tune_file)
+    logger.info(f"Calibrated: {settings['workers']} workers, batch size {settings['batch_size']}, "
+                f"{settings['buildings_per_s']:.1f} buildings/s (saved to {tune_file})")
+    return settings
+
+
+def main(argv=None):
+    """Command line entry point of the autotune subcommand"""
+    from readers import READERS
+
+    parser = argparse.ArgumentParser(prog='main.py autotune',
+                                     description='Calibrate worker count and batch size on a sample of a layer')
+    parser.add_argument('input_gdb', help='Path to input GDB file')
+    parser.add_argument('--layer', default='Building_solid', help='GDB layer name')
+    parser.add_argument('--reader', choices=READERS,
+                        help='Input reader (default: by file type)')
+    parser.add_argument('--size', type=int, default=DEFAULT_CALIBRATION_SIZE,
+                        help=f'Number of sampled buildings (default: {DEFAULT_CALIBRATION_SIZE})')
+    parser.add_argument('--max-workers', type=int, help='Largest worker count to try (default: available CPUs)')
+    parser.add_argument('--metrics', type=parse_metrics, default=None, help='Metrics of the runs to tune for')
+    parser.add_argument('--weld-tolerance', type=float, default=DEFAULT_WELD_TOLERANCE,
+                        help=f'Vertex weld tolerance in meters (default: {DEFAULT_WELD_TOLERANCE:g})')
+    parser.add_argument('--tune-file', default=DEFAULT_TUNE_FILE,
+                        help=f'File the settings are saved to (default: {DEFAULT_TUNE_FILE})')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the sample')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    plan = plan_metrics(args.metrics)
+    print(f"Machine: {machine_key()}, default workers without calibration: {default_workers()}")
+    settings = tuned_settings(args.input_gdb, args.layer, args.tune_file, retune=True, size=args.size,
+                              stages=plan['stages'], weld_tolerance=args.weld_tolerance,
+                              max_workers=args.max_workers, seed=args.seed, reader=args.reader)
+    print(f"Best for metrics {describe_plan(plan)}: --workers {settings['workers']} "
+          f"(batch size {settings['batch_size']}, {settings['buildings_per_s']:.1f} buildings/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
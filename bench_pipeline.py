@@ -0,0 +1,196 @@
+"""
+End-to-end benchmark module
+Runs the full pipeline (main.py as a separate process) on a dataset, by default a generated
+synthetic layer, and reports buildings/s, peak memory, output size and, for generated
+data, the volume accuracy; results are appended to a history file as a baseline
+"""
+
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+from pathlib import Path
+
+from generate_test_dataset import DEFAULT_MIX, generate_dataset, parse_mix, sidecar_path
+
+DEFAULT_COUNT = 100000
+DEFAULT_HISTORY = 'bench_history.jsonl'
+VOLUME_TOLERANCE = 1e-6  # Relative volume error counted as correct
+
+
+def directory_size(path):
+    """Total size of the files below a directory in bytes"""
+    return sum(f.stat().st_size for f in Path(path).rglob('*') if f.is_file())
+
+
+def git_revision():
+    """Current git commit of the code being measured (None outside a repository)"""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def check_volumes(results_csv):
+    """Share of generated closed solids whose volume matches - None without generator fields"""
+    import pandas as pd
+
+    columns = pd.read_csv(results_csv, nrows=0).columns
+    if 'SYNTH_VOLUME' not in columns or 'mesh_volume' not in columns:
+        return None
+    df = pd.read_csv(results_csv, usecols=['SYNTH_VOLUME', 'mesh_volume'])
+    expected = df.dropna(subset=['SYNTH_VOLUME'])
+    error = ((expected['mesh_volume'] - expected['SYNTH_VOLUME']).abs() / expected['SYNTH_VOLUME']).fillna(1.0)
+    return {
+        'checked': len(expected),
+        'correct_share': float((error <= VOLUME_TOLERANCE).mean()) if len(expected) else None,
+        'max_relative_error': float(error.max()) if len(expected) else None,
+        'volume_total_error': float(expected['mesh_volume'].sum() / expected['SYNTH_VOLUME'].sum() - 1)
+        if len(expected) else None,
+    }
+
+
+def run_pipeline(dataset, output_dir, layer, pipeline_args):
+    """Run main.py on a dataset - returns (seconds, return code)"""
+    command = [sys.executable, str(Path(__file__).parent / 'main.py'), str(dataset), str(output_dir),
+               '--layer', layer] + list(pipeline_args)
+    start = time.perf_counter()
+    result = subprocess.run(command)
+    return time.perf_counter() - start, result.returncode
+
+
+def summarize_run(output_dir, seconds):
+    """Throughput, memory and output size of a finished run from its progress file and outputs"""
+    with open(Path(output_dir) / 'progress.json', encoding='utf-8') as f:
+        status = json.load(f)
+    processed = status['stages'].get('process', {}).get('count', 0)
+    memory = status.get('memory') or {}
+    worker_peaks = list((memory.get('worker_peak_bytes') or {}).values())
+    results = sorted(Path(output_dir).glob('building_analysis_*.csv'))
+    return {
+        'buildings': processed,
+        'seconds': seconds,
+        'buildings_per_s': processed / seconds if seconds > 0 else None,
+        'workers': status.get('workers'),
+        'orchestrator_peak_mb': (memory.get('parent_peak_bytes') or 0) / 1024 ** 2,
+        'worker_peak_mb': max(worker_peaks, default=0) / 1024 ** 2,
+        'total_peak_mb': ((memory.get('parent_peak_bytes') or 0) + sum(worker_peaks)) / 1024 ** 2,
+        'output_mb': directory_size(output_dir) / 1024 ** 2,
+        'failure_rate': status['stages'].get('process', {}).get('failure_rate'),
+        'volumes': check_volumes(results[0]) if results else None,
+    }
+
+
+def previous_run(history_path, key):
+    """Last history entry with the same dataset and pipeline arguments"""
+    if not Path(history_path).exists():
+        return None
+    previous = None
+    with open(history_path, encoding='utf-8') as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get('key') == key:
+                previous = entry
+    return previous
+
+
+def format_summary(summary, previous=None):
+    """Readable benchmark report"""
+    lines = [
+        f"Buildings:        {summary['buildings']} in {summary['seconds']:.1f}s "
+        f"({summary['buildings_per_s']:.1f} buildings/s, {summary['workers']} workers)",
+        f"Peak memory:      orchestrator {summary['orchestrator_peak_mb']:.0f} MB, "
+        f"worker max {summary['worker_peak_mb']:.0f} MB, total {summary['total_peak_mb']:.0f} MB",
+        f"Output size:      {summary['output_mb']:.1f} MB",
+    ]
+    if summary['failure_rate'] is not None:
+        lines.append(f"Failure rate:     {summary['failure_rate'] * 100:.2f}%")
+    volumes = summary['volumes']
+    if volumes and volumes['checked']:
+        lines.append(f"Volume accuracy:  {volumes['correct_share'] * 100:.2f}% of {volumes['checked']} closed "
+                     f"solids exact, total error {volumes['volume_total_error']:.2e}")
+    if previous:
+        before = previous['summary']
+        change = summary['buildings_per_s'] / before['buildings_per_s'] - 1 if before['buildings_per_s'] else 0
+        lines.append(f"Previous run:     {before['buildings_per_s']:.1f} buildings/s ({previous['revision']}, "
+                     f"{previous['date']}) -> {change * 100:+.1f}%")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Command line entry point of the bench subcommand"""
+    parser = argparse.ArgumentParser(prog='main.py bench',
+                                     description='Run the full pipeline on a (generated) dataset and report '
+                                                 'throughput, peak memory and output size',
+                                     epilog='Arguments after -- are passed to main.py, e.g. -- --workers 4')
+    parser.add_argument('dataset', nargs='?', help='Dataset to run on (default: generate one)')
+    parser.add_argument('--count', type=int, default=DEFAULT_COUNT,
+                        help=f'Buildings of the generated dataset (default: {DEFAULT_COUNT})')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'Mix of the generated dataset (default: {DEFAULT_MIX})')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the generated dataset')
+    parser.add_argument('--layer', default='Building_solid', help='Layer name')
+    parser.add_argument('--work-dir', help='Directory for the generated dataset and outputs (default: temporary)')
+    parser.add_argument('--history', default=DEFAULT_HISTORY,
+                        help=f'JSON lines file the results are appended to (default: {DEFAULT_HISTORY})')
+    parser.add_argument('--keep', action='store_true', help='Keep the pipeline outputs')
+    argv = list(sys.argv[1:] if argv is None else argv)
+    pipeline_args = argv[argv.index('--') + 1:] if '--' in argv else []
+    args = parser.parse_args(argv[:argv.index('--')] if '--' in argv else argv)
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix='bench_'))
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    # Step 1: Dataset (generated datasets are reused while count, mix and seed are the same)
+    dataset = Path(args.dataset) if args.dataset else work_dir / f"synthetic_{args.count}_{args.seed}.gpkg"
+    if not args.dataset:
+        sidecar = sidecar_path(dataset)
+        reuse = False
+        if dataset.exists() and sidecar.exists():
+            with open(sidecar, encoding='utf-8') as f:
+                reuse = json.load(f).get('mix') == args.mix
+        if not reuse:
+            print(f"Generating {args.count} buildings to {dataset}")
+            generate_dataset(dataset, args.count, args.mix, args.seed, args.layer)
+
+    # Step 2: Full pipeline run
+    output_dir = work_dir / 'output'
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    seconds, returncode = run_pipeline(dataset, output_dir, args.layer, pipeline_args)
+    if returncode != 0:
+        print(f"Pipeline failed with exit code {returncode}")
+        return returncode
+
+    # Step 3: Report and history
+    summary = summarize_run(output_dir, seconds)
+    key = f"{dataset.name}|{' '.join(pipeline_args)}"
+    previous = previous_run(args.history, key)
+    print(format_summary(summary, previous))
+
+    entry = {
+        'key': key,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'machine': platform.node(),
+        'python': platform.python_version(),
+        'dataset': str(dataset),
+        'pipeline_args': pipeline_args,
+        'summary': summary,
+    }
+    with open(args.history, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + "\n")
+
+    if not args.keep:
+        shutil.rmtree(output_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Mesh repair benchmark module
+Compares the trimesh repair sequence with boundary-loop capping on the buildings of a
+dataset that are not watertight: how many each makes watertight and how long it takes
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+from welding import DEFAULT_WELD_TOLERANCE
+
+DEFAULT_LIMIT = 10000
+
+
+def load_open_meshes(gdb_path, layer_name, limit, weld_tolerance):
+    """Welded (vertices, faces) of the buildings that are not watertight - returns (read, meshes)"""
+    import trimesh
+    from readers import read_gdb_buildings_chunked
+    from welding import weld_vertices
+
+    read = 0
+    meshes = []
+    for _, chunk_data in read_gdb_buildings_chunked(gdb_path, layer_name, limit, limit):
+        for row in chunk_data:
+            read += 1
+            if len(row['_vertices']) == 0 or len(row['_faces']) == 0:
+                continue
+            vertices, faces = weld_vertices(row['_vertices'], row['_faces'], weld_tolerance)
+            if not trimesh.Trimesh(vertices=vertices, faces=faces, process=False).is_watertight:
+                meshes.append((vertices, faces))
+    return read, meshes
+
+
+def run_repairs(meshes, cap_holes):
+    """Repair every mesh - returns (watertight count, volumes found, seconds)"""
+    import trimesh
+    from mesh_repair_volume import repair_mesh
+
+    watertight = 0
+    volumes = 0
+    start = time.perf_counter()
+    for vertices, faces in meshes:
+        mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+        is_watertight, volume, _ = repair_mesh(mesh, cap_holes=cap_holes)
+        watertight += bool(is_watertight)
+        volumes += volume is not None
+    return watertight, volumes, time.perf_counter() - start
+
+
+def format_result(label, result, count):
+    """One line of the benchmark report"""
+    watertight, volumes, seconds = result
+    per_building = seconds / count * 1000 if count else 0.0
+    return (f"{label:<18} watertight {watertight}/{count}, volume {volumes}/{count}, "
+            f"{seconds:.2f}s ({per_building:.2f} ms per building)")
+
+
+def main(argv=None):
+    """Command line entry point of the bench-repair subcommand"""
+    parser = argparse.ArgumentParser(prog='main.py bench-repair',
+                                     description='Compare trimesh repair with boundary-loop capping')
+    parser.add_argument('input_gdb', help='Path to input GDB file')
+    parser.add_argument('--layer', default='Building_solid', help='GDB layer name')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                        help=f'Number of buildings to read (default: {DEFAULT_LIMIT})')
+    parser.add_argument('--weld-tolerance', type=float, default=DEFAULT_WELD_TOLERANCE,
+                        help=f'Vertex weld tolerance in meters (default: {DEFAULT_WELD_TOLERANCE:g})')
+    args = parser.parse_args(argv)
+
+    read, meshes = load_open_meshes(Path(args.input_gdb), args.layer, args.limit, args.weld_tolerance)
+    count = len(meshes)
+    print(f"Buildings read: {read}, not watertight after welding: {count}")
+    if not count:
+        return 0
+
+    trimesh_result = run_repairs(meshes, cap_holes=False)
+    capping_result = run_repairs(meshes, cap_holes=True)
+    print(format_result('trimesh repair', trimesh_result, count))
+    print(format_result('capping + trimesh', capping_result, count))
+    print(f"Made watertight by capping: {capping_result[0] - trimesh_result[0]}, "
+          f"time saved: {trimesh_result[2] - capping_result[2]:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Boundary repair module
+Finds the open boundary loops of a mesh with sorted-edge counting and caps planar or
+near-planar loops by triangulating them (missing floor slabs, roof patches)
+"""
+
+import numpy as np
+
+from triangulation import triangulate_packed
+
+PLANARITY_TOLERANCE = 0.05  # Meters a loop vertex may lie off the plane of its loop
+
+
+def boundary_edges(faces):
+    """Directed edges used by exactly one face, oriented as in that face"""
+    faces = np.asarray(faces, dtype=np.int64)
+    if len(faces) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    edges = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    undirected = np.sort(edges, axis=1)
+    keys = undirected[:, 0] * (int(faces.max()) + 1) + undirected[:, 1]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return edges[counts[inverse] == 1]
+
+
+def boundary_loops(edges):
+    """Chain boundary edges into closed loops - returns (loop_vertices, loop_offsets)
+
+    Loops follow the boundary edges backwards, which is the winding a cap needs to match
+    the faces around it. Returns None if the boundary is not a set of simple cycles
+    (a vertex with several boundary edges in or out).
+    """
+    if len(edges) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+
+    nodes, local = np.unique(edges, return_inverse=True)
+    local = local.reshape(-1, 2)
+    count = len(nodes)
+    if len(local) != count or len(np.unique(local[:, 0])) != count or len(np.unique(local[:, 1])) != count:
+        return None
+
+    successor = np.empty(count, dtype=np.int64)
+    successor[local[:, 1]] = local[:, 0]
+    rounds = int(np.ceil(np.log2(count))) + 1
+
+    # Loop id = smallest node of the cycle (pointer doubling)
+    loop = np.arange(count)
+    jump = successor.copy()
+    for _ in range(rounds):
+        loop = np.minimum(loop, loop[jump])
+        jump = jump[jump]
+
+    # Position in the loop by list ranking, each cycle cut just before its smallest node
+    is_last = successor == loop
+    jump = np.where(is_last, np.arange(count), successor)
+    remaining = (~is_last).astype(np.int64)
+    for _ in range(rounds):
+        remaining = remaining + remaining[jump]
+        jump = jump[jump]
+
+    order = np.lexsort((-remaining, loop))
+    loop_offsets = np.zeros(1, dtype=np.int64)
+    loop_offsets = np.append(loop_offsets, np.cumsum(np.bincount(loop)[np.unique(loop)]))
+    return nodes[order], loop_offsets
+
+
+def loop_planarity(vertices, loop_vertices, loop_offsets):
+    """Largest distance of a loop vertex from the Newell plane of its loop"""
+    lengths = np.diff(loop_offsets)
+    loop_id = np.repeat(np.arange(len(lengths)), lengths)
+    points = vertices[loop_vertices]
+    centroids = np.add.reduceat(points, loop_offsets[:-1], axis=0) / lengths[:, None]
+    points = points - centroids[loop_id]
+
+    following = np.arange(1, len(points) + 1)
+    following[loop_offsets[1:] - 1] = loop_offsets[:-1]
+    p, q = points, points[following]
+    newell = np.stack([(p[:, 1] - q[:, 1]) * (p[:, 2] + q[:, 2]),
+                       (p[:, 2] - q[:, 2]) * (p[:, 0] + q[:, 0]),
+                       (p[:, 0] - q[:, 0]) * (p[:, 1] + q[:, 1])], axis=1)
+    normals = np.add.reduceat(newell, loop_offsets[:-1], axis=0)
+    lengths = np.linalg.norm(normals, axis=1)
+
+    # Loops without area (collinear slivers) count as planar
+    units = np.divide(normals, lengths[:, None], out=np.zeros_like(normals), where=lengths[:, None] > 0)
+    distances = np.abs(np.einsum('ij,ij->i', points, units[loop_id]))
+    return np.maximum.reduceat(distances, loop_offsets[:-1])
+
+
+def cap_boundary_loops(vertices, faces, tolerance=PLANARITY_TOLERANCE):
+    """Close planar boundary loops with triangulated caps
+
+    Returns (faces, capped loops, open loops before capping). faces are returned unchanged
+    if the boundary cannot be chained into simple loops.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+
+    loops = boundary_loops(boundary_edges(faces))
+    if loops is None:
+        return faces, 0, -1
+    loop_vertices, loop_offsets = loops
+    num_loops = len(loop_offsets) - 1
+    if num_loops == 0:
+        return faces, 0, 0
+
+    # Step 1: Keep loops that are flat enough to cap
+    lengths = np.diff(loop_offsets)
+    planar = (loop_planarity(vertices, loop_vertices, loop_offsets) <= tolerance) & (lengths >= 3)
+    if not planar.any():
+        return faces, 0, num_loops
+
+    # Step 2: Triangulate the kept loops as one packed batch
+    keep_vertices = np.repeat(planar, lengths)
+    capped_vertices = loop_vertices[keep_vertices]
+    ring_offsets = np.zeros(int(planar.sum()) + 1, dtype=np.int64)
+    np.cumsum(lengths[planar], out=ring_offsets[1:])
+    cap_faces, _ = triangulate_packed(vertices[capped_vertices], ring_offsets,
+                                      np.zeros(len(ring_offsets) - 1, dtype=bool),
+                                      np.array([0, len(ring_offsets) - 1], dtype=np.int64))
+
+    return np.concatenate([faces, capped_vertices[cap_faces]]), int(planar.sum()), num_loops
@@ -0,0 +1,110 @@
+"""
+Memory-budgeted chunking module
+Decides chunk boundaries from the running vertex/face totals of the data being parsed
+and scales worker count, batch size and in-flight batches to a memory budget
+"""
+
+import re
+
+CHUNK_SIZE = 100000  # Buildings per chunk unless the memory budget ends it first
+
+# Size of one packed local vertex (3 x float32) and face (3 x int32), see triangulation.VERTEX_DTYPE
+VERTEX_BYTES = 3 * 4
+FACE_BYTES = 3 * 4
+ROW_BYTES = 3 * 1024  # Property dict of a ~20 field fiona feature plus its result record
+
+# Peak while a chunk is parsed: rings in array('d') (24 B per vertex) plus the float64/int64
+# copies of to_arrays, localize and triangulate_local (measured ~200 B per vertex, faces included)
+PARSE_VERTEX_BYTES = 184
+PARSE_FACE_BYTES = 72
+
+TARGET_BATCH_BYTES = 2 * 1024 ** 2  # Geometry sent to a worker per task
+MAX_BATCH_SIZE = 256
+IN_FLIGHT_FRACTION = 0.25  # Share of the chunk budget for pickled tasks in flight
+IN_FLIGHT_PER_WORKER = 4  # Batches queued per worker when memory allows
+
+SIZE_UNITS = {'': 1024 ** 2, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(text):
+    """Parse a memory size such as '512M', '2G' or '1.5GB' (plain numbers are MB)"""
+    match = re.fullmatch(r'\s*([0-9.]+)\s*([KMGT]?)I?B?\s*', str(text).upper())
+    if not match:
+        raise ValueError(f"Invalid memory size: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def estimate_geometry_bytes(vertex_count, face_count):
+    """Estimate the in-memory size of packed vertex and face arrays"""
+    return vertex_count * VERTEX_BYTES + face_count * FACE_BYTES
+
+
+def estimate_parse_bytes(vertex_count, face_count):
+    """Estimate the peak memory of parsing and triangulating geometry (not just the packed result)"""
+    return vertex_count * PARSE_VERTEX_BYTES + face_count * PARSE_FACE_BYTES
+
+
+def building_bytes(vertices, faces):
+    """Memory held by the parsed geometry of one building"""
+    if hasattr(vertices, 'nbytes'):  # Packed NumPy arrays
+        return vertices.nbytes + faces.nbytes
+    return estimate_geometry_bytes(len(vertices), len(faces))
+
+
+class ChunkBudget:
+    """Running vertex/face/byte totals of the chunk being read"""
+
+    def __init__(self, max_bytes=None, max_count=None):
+        self.max_bytes = max_bytes
+        self.max_count = max_count
+        self.reset()
+
+    def reset(self):
+        """Start a new chunk"""
+        self.count = 0
+        self.vertices = 0
+        self.faces = 0
+        self.bytes = 0
+
+    def add(self, vertex_count, face_count, geometry_bytes):
+        """Account for one building - returns True when the chunk is full"""
+        self.count += 1
+        self.vertices += vertex_count
+        self.faces += face_count
+        self.bytes += geometry_bytes + ROW_BYTES
+
+        if self.max_count and self.count >= self.max_count:
+            return True
+        return bool(self.max_bytes and self.bytes >= self.max_bytes)
+
+    def describe(self):
+        """Summary of the current chunk for the log"""
+        return (f"{self.count} buildings, {self.vertices} vertices, {self.faces} faces, "
+                f"~{self.bytes / 1024 ** 2:.0f} MB")
+
+
+def plan_parallelism(chunk_bytes, chunk_len, num_workers, max_bytes=None):
+    """Choose (workers, batch size, max in-flight batches) for a chunk
+
+    Tasks in flight are held twice (pickled in the queue and unpickled in the worker),
+    so their total is kept under IN_FLIGHT_FRACTION of the memory budget.
+    """
+    mean_bytes = max(chunk_bytes / chunk_len, 1) if chunk_len else 1
+    batch_size = int(min(max(TARGET_BATCH_BYTES // mean_bytes, 1), MAX_BATCH_SIZE))
+    # Enough batches per worker to balance the tail of the chunk
+    batch_size = max(min(batch_size, -(-chunk_len // (num_workers * IN_FLIGHT_PER_WORKER))), 1)
+    max_in_flight = num_workers * IN_FLIGHT_PER_WORKER
+
+    if max_bytes:
+        batch_bytes = 2 * batch_size * mean_bytes
+        affordable = int(max_bytes * IN_FLIGHT_FRACTION // batch_bytes)
+
+        # Smaller batches first, then fewer workers
+        while affordable < num_workers and batch_size > 1:
+            batch_size = max(batch_size // 2, 1)
+            batch_bytes = 2 * batch_size * mean_bytes
+            affordable = int(max_bytes * IN_FLIGHT_FRACTION // batch_bytes)
+        num_workers = max(min(num_workers, affordable), 1)
+        max_in_flight = max(min(max_in_flight, affordable), num_workers)
+
+    return num_workers, batch_size, max_in_flight
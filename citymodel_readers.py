@@ -0,0 +1,346 @@
+"""
+City model reader module
+Streams buildings from CityGML (incremental XML parsing, one building in memory at a time)
+and CityJSON / CityJSONSeq (shared vertex list decoded once into a NumPy array) into the
+same packed, chunked rows as the GDB readers
+"""
+
+import gc
+import json
+import logging
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from chunking import CHUNK_SIZE, ChunkBudget, estimate_parse_bytes
+from triangulation import RingBatch, assign_chunk_geometry
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+CITYGML_SUFFIXES = ('.gml', '.citygml', '.xml')
+CITYJSON_SUFFIXES = ('.json', '.jsonl', '.cityjson')
+BUILDING_TYPES = ('Building', 'BuildingPart')
+
+# Geometry properties that are not part of the building shell
+SKIPPED_GEOMETRY = ('opening', 'lod1TerrainIntersection', 'lod2TerrainIntersection', 'lod3TerrainIntersection',
+                    'lod4TerrainIntersection')
+GENERIC_ATTRIBUTES = ('stringAttribute', 'intAttribute', 'doubleAttribute', 'dateAttribute', 'uriAttribute',
+                      'measureAttribute', 'StringAttribute', 'IntAttribute', 'DoubleAttribute', 'DateAttribute',
+                      'UriAttribute', 'MeasureAttribute')
+
+
+def is_cityjson(path):
+    """Whether a .json/.jsonl file is CityJSON (checked from its first bytes, GeoJSON is not)"""
+    path = Path(path)
+    if path.suffix.lower() not in CITYJSON_SUFFIXES or not path.is_file():
+        return False
+    with open(path, 'rb') as f:
+        return b'CityJSON' in f.read(4096)
+
+
+def city_model_reader(path):
+    """Chunk reader for a CityGML or CityJSON file, None for other inputs"""
+    suffix = Path(path).suffix.lower()
+    if suffix in CITYGML_SUFFIXES:
+        return read_citygml_buildings_chunked
+    if is_cityjson(path):
+        return read_cityjson_buildings_chunked
+    return None
+
+
+def parse_value(text):
+    """Attribute text as int or float where possible"""
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def pack_chunks(buildings, chunk_size, limit=None, progress=None, max_chunk_bytes=None):
+    """Collect (properties, rings) of buildings into chunks with packed geometry - yields (chunk_num, chunk)
+
+    rings are (coordinates, is_hole) pairs, coordinates an (n, 3) array without the closing point.
+    """
+    logger = logging.getLogger(__name__)
+
+    chunk = []
+    chunk_num = 0
+    total_count = 0
+    budget = ChunkBudget(max_chunk_bytes, chunk_size)
+    batch = RingBatch()
+
+    for properties, rings in buildings:
+        if limit and total_count >= limit:
+            break
+        vertex_count = 0
+        for coords, is_hole in rings:
+            vertex_count += batch.add_ring_array(coords, is_hole)
+        batch.end_building()
+        chunk.append(properties)
+        total_count += 1
+
+        if progress is not None:
+            progress.advance('read', failed=0 if vertex_count >= 3 else 1)
+
+        # Yield chunk when it reaches chunk_size or the memory budget
+        face_count = max(vertex_count - 2 * len(rings), 0)
+        if budget.add(vertex_count, face_count, estimate_parse_bytes(vertex_count, face_count)):
+            assign_chunk_geometry(chunk, batch)
+            logger.info(f"Chunk {chunk_num} read: {budget.describe()}")
+            yield chunk_num, chunk
+            chunk = []
+            chunk_num += 1
+            budget.reset()
+            batch = RingBatch()
+            gc.collect()  # Force garbage collection
+
+    # Yield final chunk if any remaining
+    if chunk:
+        assign_chunk_geometry(chunk, batch)
+        logger.info(f"Chunk {chunk_num} read: {budget.describe()}")
+        yield chunk_num, chunk
+
+
+# CityGML
+
+def local_name(tag):
+    """Element name without the namespace"""
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def gml_ring_coordinates(ring):
+    """(n, 3) coordinates of a gml:LinearRing (posList, pos or GML 2 coordinates) without the closing point"""
+    values = []
+    dimension = 3
+    for elem in ring.iter():
+        name = local_name(elem.tag)
+        if name == 'posList' and elem.text:
+            dimension = int(elem.get('srsDimension', elem.get('dimension', 3)))
+            values.extend(elem.text.split())
+        elif name == 'pos' and elem.text:
+            values.extend(elem.text.split())
+        elif name == 'coordinates' and elem.text:
+            values.extend(elem.text.replace(',', ' ').split())
+    coords = np.array(values, dtype=np.float64)
+    if dimension == 2:
+        coords = np.column_stack([coords.reshape(-1, 2), np.zeros(len(coords) // 2)])
+    coords = coords.reshape(-1, 3)
+    if len(coords) > 1 and np.array_equal(coords[0], coords[-1]):
+        coords = coords[:-1]
+    return coords
+
+
+def gml_polygon_rings(polygon):
+    """(coordinates, is_hole) rings of a gml:Polygon or gml:Triangle"""
+    rings = []
+    for child in polygon:
+        name = local_name(child.tag)
+        if name in ('exterior', 'interior', 'outerBoundaryIs', 'innerBoundaryIs'):
+            for ring in child:
+                coords = gml_ring_coordinates(ring)
+                if len(coords):
+                    rings.append((coords, name in ('interior', 'innerBoundaryIs')))
+    return rings
+
+
+def citygml_building_geometry(building):
+    """Rings of the highest LOD of a building including its parts - returns (lod property name, rings)"""
+    by_lod = {}
+
+    def walk(elem, lod_property):
+        name = local_name(elem.tag)
+        if name in SKIPPED_GEOMETRY:
+            return
+        if name.startswith('lod') and name[3:4].isdigit():
+            lod_property = name
+        if name in ('Polygon', 'Triangle'):
+            if lod_property is not None:
+                by_lod.setdefault(lod_property, []).extend(gml_polygon_rings(elem))
+            return
+        for child in elem:
+            walk(child, lod_property)
+
+    walk(building, None)
+    if not by_lod:
+        return None, []
+    # Highest LOD; a solid with its own coordinates already contains the boundary surfaces
+    lod = max(int(name[3]) for name in by_lod)
+    names = [name for name in by_lod if int(name[3]) == lod]
+    solids = [name for name in names if name.endswith('Solid')]
+    names = solids or names
+    return names[0], [ring for name in names for ring in by_lod[name]]
+
+
+def citygml_attributes(building):
+    """Identifier, generic attributes and simple thematic attributes of a building"""
+    properties = {'object_id': next((value for key, value in building.attrib.items() if local_name(key) == 'id'),
+                                    None),
+                  'object_type': local_name(building.tag)}
+    for child in building:
+        name = local_name(child.tag)
+        if name in GENERIC_ATTRIBUTES:
+            # CityGML 2: <gen:stringAttribute name="..."><gen:value>; CityGML 3: <gen:name> and <gen:value> elements
+            key = child.get('name') or next((e.text for e in child if local_name(e.tag) == 'name'), None)
+            value = next((e.text for e in child if local_name(e.tag) == 'value'), None)
+            if key:
+                properties[key] = parse_value(value) if value is not None else None
+        elif len(child) == 0 and child.text and child.text.strip():
+            properties[name] = parse_value(child.text.strip())
+    return properties
+
+
+def citygml_buildings(path):
+    """Yield (properties, rings) per building while parsing, keeping only the current building in memory"""
+    import xml.etree.ElementTree as ET
+
+    root = None
+    depth = 0
+    for event, elem in ET.iterparse(str(path), events=('start', 'end')):
+        name = local_name(elem.tag)
+        if event == 'start':
+            if root is None:
+                root = elem
+            if name == 'Building':
+                depth += 1
+            continue
+
+        if name == 'Building':
+            depth -= 1
+            if depth == 0:
+                properties = citygml_attributes(elem)
+                lod_property, rings = citygml_building_geometry(elem)
+                properties['_geometry_type'] = lod_property
+                yield properties, rings
+                elem.clear()
+        elif depth == 0 and name in ('cityObjectMember', 'featureMember'):
+            root.clear()  # Drop the finished city objects
+
+
+def read_citygml_buildings_chunked(path, layer_name=None, chunk_size=None, limit=None, progress=None,
+                                   max_chunk_bytes=None):
+    """Read buildings from a CityGML file in chunks (layer_name is ignored)"""
+    logging.getLogger(__name__).info(f"Reading buildings from {path} (CityGML reader)")
+    yield from pack_chunks(citygml_buildings(path), chunk_size or CHUNK_SIZE, limit, progress, max_chunk_bytes)
+
+
+# CityJSON
+
+def cityjson_vertices(vertices, transform=None):
+    """Real (n, 3) coordinates of a CityJSON vertex list (integers with scale and translate)"""
+    coords = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    if transform:
+        coords = coords * np.asarray(transform['scale'], dtype=np.float64) + np.asarray(transform['translate'],
+                                                                                         dtype=np.float64)
+    return coords
+
+
+def cityjson_surfaces(geometry):
+    """Surfaces (lists of rings of vertex indices) of a CityJSON geometry"""
+    depth = {'MultiSurface': 0, 'CompositeSurface': 0, 'Solid': 1, 'MultiSolid': 2, 'CompositeSolid': 2}
+    surfaces = geometry.get('boundaries') or []
+    levels = depth.get(geometry.get('type'))
+    if levels is None:
+        return []
+    for _ in range(levels):
+        surfaces = [surface for part in surfaces for surface in part]
+    return surfaces
+
+
+def cityjson_building(object_id, city_object, vertices):
+    """(properties, rings) of a CityJSON building object using its highest LOD geometry"""
+    properties = {'object_id': object_id, 'object_type': city_object.get('type')}
+    parents = city_object.get('parents')
+    if parents:
+        properties['parent_id'] = parents[0]
+    for key, value in (city_object.get('attributes') or {}).items():
+        properties[key] = json.dumps(value) if isinstance(value, (dict, list)) else value
+
+    geometries = [g for g in city_object.get('geometry') or [] if g.get('type') != 'GeometryInstance']
+    rings = []
+    if geometries:
+        geometry = max(geometries, key=lambda g: float(g.get('lod', 0) or 0))
+        properties['_geometry_type'] = geometry.get('type')
+        for surface in cityjson_surfaces(geometry):
+            for ring_idx, ring in enumerate(surface):
+                if ring:
+                    rings.append((vertices[np.asarray(ring, dtype=np.int64)], ring_idx > 0))
+    else:
+        properties['_geometry_type'] = None
+    return properties, rings
+
+
+def emitted(city_object):
+    """Whether a city object becomes a result row: buildings and parts, not parents of parts without geometry"""
+    if city_object.get('type') not in BUILDING_TYPES:
+        return False
+    return bool(city_object.get('geometry')) or not city_object.get('children')
+
+
+def cityjson_seq_buildings(path):
+    """Yield (properties, rings) from CityJSONSeq, one feature (with its own vertices) at a time"""
+    transform = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            feature = json.loads(line)
+            if feature.get('type') == 'CityJSON':
+                transform = feature.get('transform')
+                continue
+            vertices = cityjson_vertices(feature.get('vertices') or [], transform)
+            for object_id, city_object in (feature.get('CityObjects') or {}).items():
+                if emitted(city_object):
+                    yield cityjson_building(object_id, city_object, vertices)
+
+
+def cityjson_file_buildings(path):
+    """Yield (properties, rings) from a CityJSON file
+
+    With ijson the shared vertex list is decoded in a first pass into one NumPy array and
+    the city objects are streamed in a second; without it the whole file is loaded.
+    """
+    if ijson is None:
+        logging.getLogger(__name__).warning("ijson not installed, loading the whole CityJSON file")
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        vertices = cityjson_vertices(data.get('vertices') or [], data.get('transform'))
+        for object_id, city_object in (data.get('CityObjects') or {}).items():
+            if emitted(city_object):
+                yield cityjson_building(object_id, city_object, vertices)
+        return
+
+    # Pass 1: transform and the shared vertex list
+    transform = {'scale': [], 'translate': []}
+    coords = array('d')
+    with open(path, 'rb') as f:
+        for prefix, _, value in ijson.parse(f, use_float=True):
+            if prefix == 'vertices.item.item':
+                coords.append(value)
+            elif prefix in ('transform.scale.item', 'transform.translate.item'):
+                transform[prefix.split('.')[1]].append(value)
+    vertices = cityjson_vertices(np.frombuffer(coords, dtype=np.float64), transform if transform['scale'] else None)
+    del coords
+
+    # Pass 2: city objects one at a time
+    with open(path, 'rb') as f:
+        for object_id, city_object in ijson.kvitems(f, 'CityObjects', use_float=True):
+            if emitted(city_object):
+                yield cityjson_building(object_id, city_object, vertices)
+
+
+def read_cityjson_buildings_chunked(path, layer_name=None, chunk_size=None, limit=None, progress=None,
+                                    max_chunk_bytes=None):
+    """Read buildings from a CityJSON or CityJSONSeq file in chunks (layer_name is ignored)"""
+    logging.getLogger(__name__).info(f"Reading buildings from {path} (CityJSON reader)")
+    # CityJSONSeq: a CityJSON header line followed by one CityJSONFeature per line
+    with open(path, 'rb') as f:
+        first, second = f.readline(), f.readline()
+    sequence = Path(path).suffix.lower() == '.jsonl' or (b'"CityJSON"' in first and second.lstrip().startswith(b'{'))
+    buildings = cityjson_seq_buildings(path) if sequence else cityjson_file_buildings(path)
+    yield from pack_chunks(buildings, chunk_size or CHUNK_SIZE, limit, progress, max_chunk_bytes)
@@ -0,0 +1,297 @@
+"""
+Test dataset generator module
+Writes a synthetic swissBUILDINGS3D-like building layer (closed 3D solids as multipatch
+style MultiPolygon Z) with LV95 coordinates clustered in settlements and a configurable
+mix of simple, complex and broken solids, plus a JSON sidecar with the expected totals
+"""
+
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import logging
+from pathlib import Path
+
+DEFAULT_COUNT = 100000
+DEFAULT_MIX = 'simple=0.6,complex=0.3,broken=0.1'
+DEFAULT_LAYER = 'Building_solid'
+WRITE_BATCH = 10000
+
+# LV95 extent of Switzerland
+LV95_BOUNDS = (2485000.0, 1075000.0, 2834000.0, 1296000.0)
+SETTLEMENTS = 400  # Cluster centers the buildings are spread around
+SETTLEMENT_RADIUS = (300.0, 3000.0)  # Meters (standard deviation of a settlement)
+CANTONS = ['ZH', 'BE', 'LU', 'UR', 'SZ', 'OW', 'NW', 'GL', 'ZG', 'FR', 'SO', 'BS', 'BL', 'SH', 'AR', 'AI',
+           'SG', 'GR', 'AG', 'TG', 'TI', 'VD', 'VS', 'NE', 'GE', 'JU']
+
+# Building kinds per category
+KINDS = {
+    'simple': ['box'],
+    'complex': ['gable', 'l_shape', 'polygon', 'courtyard'],
+    'broken': ['open', 'flipped', 'gap', 'sliver', 'empty'],
+}
+
+DRIVERS = {'.gpkg': 'GPKG', '.gdb': 'OpenFileGDB', '.fgb': 'FlatGeobuf', '.shp': 'ESRI Shapefile'}
+
+SCHEMA = {
+    'geometry': 'MultiPolygon',
+    'properties': {
+        'UUID': 'str',
+        'EGID': 'int',
+        'OBJEKTART': 'str',
+        'GEBAEUDE_NUTZUNG': 'str',
+        'DACH_MAX': 'float',
+        'DACH_MIN': 'float',
+        'KT': 'str',
+        'SYNTH_KIND': 'str',  # Generator bookkeeping, lets the benchmark check the results
+        'SYNTH_VOLUME': 'float',
+    },
+}
+OBJEKTART = ['Gebaeude Einzelhaus', 'Gebaeude Einzelhaus', 'Gebaeude Einzelhaus', 'Offenes Gebaeude',
+             'Flugdach', 'Mauer gross', 'Lagertank']
+NUTZUNG = ['Wohnen', 'Wohnen', 'Gewerbe', 'Landwirtschaft', 'Industrie', None]
+
+
+def parse_mix(text):
+    """Parse a category mix such as 'simple=0.6,complex=0.3,broken=0.1' into normalized weights"""
+    mix = {}
+    for part in str(text).split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in KINDS:
+            raise ValueError(f"Unknown category '{name}' (choose from {', '.join(KINDS)})")
+        mix[name] = float(weight)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("The mix needs a positive weight")
+    return {name: weight / total for name, weight in mix.items()}
+
+
+def closed(ring):
+    """Ring with the first vertex repeated at the end"""
+    return list(ring) + [ring[0]]
+
+
+def prism(footprint, z0, height, floor=True):
+    """Polygons of a flat-roofed prism over a counter-clockwise footprint (outward winding)"""
+    bottom = [(x, y, z0) for x, y in footprint]
+    top = [(x, y, z0 + height) for x, y in footprint]
+    polygons = [[closed(top)]]
+    if floor:
+        polygons.append([closed(bottom[::-1])])
+    for i in range(len(footprint)):
+        j = (i + 1) % len(footprint)
+        polygons.append([closed([bottom[i], bottom[j], top[j], top[i]])])
+    return polygons
+
+
+def footprint_area(footprint):
+    """Shoelace area of a footprint"""
+    return 0.5 * abs(sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(footprint, footprint[1:] + footprint[:1])))
+
+
+def place(points, x, y, angle):
+    """Rotate local (x, y) points by angle and move them to (x, y)"""
+    c, s = math.cos(angle), math.sin(angle)
+    return [(x + px * c - py * s, y + px * s + py * c) for px, py in points]
+
+
+def make_building(kind, rng, x, y, z0):
+    """Geometry polygons and expected (volume, footprint) of one building (None when not defined)"""
+    angle = rng.uniform(0, math.pi)
+    w, d, h = rng.uniform(6, 30), rng.uniform(6, 20), rng.uniform(3, 25)
+    rectangle = place([(0, 0), (w, 0), (w, d), (0, d)], x, y, angle)
+
+    if kind == 'box':
+        return prism(rectangle, z0, h), w * d * h, w * d
+
+    if kind == 'gable':
+        ridge = rng.uniform(2, 6)
+        p = [(px, py, z0) for px, py in rectangle]
+        q = [(px, py, z0 + h) for px, py in rectangle]
+        r0, r1 = [(px, py, z0 + h + ridge) for px, py in place([(0, d / 2), (w, d / 2)], x, y, angle)]
+        polygons = [
+            [closed(p[::-1])],
+            [closed([p[0], p[1], q[1], q[0]])],
+            [closed([p[1], p[2], q[2], r1, q[1]])],
+            [closed([p[2], p[3], q[3], q[2]])],
+            [closed([p[3], p[0], q[0], r0, q[3]])],
+            [closed([q[0], q[1], r1, r0])],
+            [closed([q[2], q[3], r0, r1])],
+        ]
+        return polygons, w * d * (h + ridge / 2), w * d
+
+    if kind == 'l_shape':
+        a, b = rng.uniform(0.3, 0.7) * d, rng.uniform(0.3, 0.7) * w
+        local = [(0, 0), (w, 0), (w, a), (b, a), (b, d), (0, d)]
+        area = footprint_area(local)  # Before placing: large LV95 coordinates cancel in the shoelace sum
+        return prism(place(local, x, y, angle), z0, h), area * h, area
+
+    if kind == 'polygon':
+        n = rng.randint(5, 24)
+        radius = rng.uniform(5, 15)
+        local = [(radius * math.cos(2 * math.pi * i / n), radius * math.sin(2 * math.pi * i / n)) for i in range(n)]
+        area = footprint_area(local)
+        return prism(place(local, x, y, angle), z0, h), area * h, area
+
+    if kind == 'courtyard':
+        w, d = rng.uniform(20, 50), rng.uniform(20, 50)
+        margin = rng.uniform(5, 8)
+        outer = place([(0, 0), (w, 0), (w, d), (0, d)], x, y, angle)
+        inner = place([(margin, margin), (w - margin, margin), (w - margin, d - margin), (margin, d - margin)],
+                      x, y, angle)
+        po, qo = [(px, py, z0) for px, py in outer], [(px, py, z0 + h) for px, py in outer]
+        pi, qi = [(px, py, z0) for px, py in inner], [(px, py, z0 + h) for px, py in inner]
+        polygons = [[closed(po[::-1]), closed(pi)], [closed(qo), closed(qi[::-1])]]
+        for i in range(4):
+            j = (i + 1) % 4
+            polygons.append([closed([po[i], po[j], qo[j], qo[i]])])
+            polygons.append([closed([pi[j], pi[i], qi[i], qi[j]])])  # Facing into the courtyard
+        area = w * d - (w - 2 * margin) * (d - 2 * margin)
+        return polygons, area * h, area
+
+    # Broken solids: volume and footprint are not checked
+    if kind == 'open':
+        return prism(rectangle, z0, h, floor=False), None, None
+    if kind == 'flipped':
+        polygons = prism(rectangle, z0, h)
+        polygons[2] = [polygons[2][0][::-1]]
+        return polygons, None, None
+    if kind == 'gap':
+        polygons = prism(rectangle, z0, h)
+        polygons[0] = [[(px + 0.002, py, pz) for px, py, pz in polygons[0][0]]]  # Roof 2 mm off the walls
+        return polygons, None, None
+    if kind == 'sliver':
+        polygons = prism(rectangle, z0, h)
+        (x0, y0), (x1, y1) = rectangle[0], rectangle[1]
+        polygons.append([closed([(x0, y0, z0), ((x0 + x1) / 2, (y0 + y1) / 2, z0), (x1, y1, z0)])])
+        return polygons, None, None
+    return None, None, None  # 'empty'
+
+
+def settlements(rng):
+    """Settlement centers (x, y, radius, base elevation, canton)"""
+    xmin, ymin, xmax, ymax = LV95_BOUNDS
+    result = []
+    for _ in range(SETTLEMENTS):
+        x, y = rng.uniform(xmin, xmax), rng.uniform(ymin, ymax)
+        radius = math.exp(rng.uniform(*map(math.log, SETTLEMENT_RADIUS)))
+        elevation = 300 + 900 * (0.5 + 0.5 * math.sin(x / 40000.0) * math.cos(y / 30000.0))
+        column, row = int((x - xmin) / (xmax - xmin) * 6), int((y - ymin) / (ymax - ymin) * 4)
+        canton = CANTONS[(column * 4 + row) % len(CANTONS)]
+        result.append((x, y, radius, elevation, canton))
+    return result
+
+
+def generate_features(count, mix, seed=0):
+    """Yield (feature, kind, volume, footprint) for count synthetic buildings"""
+    rng = random.Random(seed)
+    centers = settlements(rng)
+    weights = [1.0 / center[2] ** 0.5 for center in centers]  # Dense towns hold more buildings
+    categories = list(mix)
+    category_weights = [mix[name] for name in categories]
+
+    for i in range(count):
+        cx, cy, radius, elevation, canton = rng.choices(centers, weights)[0]
+        x, y = rng.gauss(cx, radius), rng.gauss(cy, radius)
+        z0 = elevation + rng.uniform(-20, 20)
+        kind = rng.choice(KINDS[rng.choices(categories, category_weights)[0]])
+        polygons, volume, footprint = make_building(kind, rng, x, y, z0)
+
+        heights = [pz for polygon in polygons or [] for ring in polygon for _, _, pz in ring]
+        feature = {
+            'geometry': {'type': 'MultiPolygon', 'coordinates': polygons} if polygons else None,
+            'properties': {
+                'UUID': '{' + str(uuid.UUID(int=rng.getrandbits(128), version=4)).upper() + '}',
+                'EGID': rng.randint(1, 999999999) if rng.random() < 0.9 else None,
+                'OBJEKTART': rng.choice(OBJEKTART),
+                'GEBAEUDE_NUTZUNG': rng.choice(NUTZUNG),
+                'DACH_MAX': max(heights) if heights else None,
+                'DACH_MIN': min(heights) if heights else None,
+                'KT': canton,
+                'SYNTH_KIND': kind,
+                'SYNTH_VOLUME': volume,
+            },
+        }
+        yield feature, kind, volume, footprint
+
+
+def generate_dataset(output_path, count=DEFAULT_COUNT, mix=None, seed=0, layer=DEFAULT_LAYER):
+    """Write the synthetic layer and its sidecar - returns the sidecar summary"""
+    import fiona
+    logger = logging.getLogger(__name__)
+
+    output_path = Path(output_path)
+    driver = DRIVERS.get(output_path.suffix.lower())
+    if driver is None:
+        raise ValueError(f"Unsupported output format {output_path.suffix} (use {', '.join(DRIVERS)})")
+    mix = mix or parse_mix(DEFAULT_MIX)
+
+    summary = {
+        'count': count,
+        'seed': seed,
+        'mix': mix,
+        'layer': layer,
+        'kinds': {},
+        'expected_volume': 0.0,  # Buildings with a known closed solid only
+        'expected_footprint': 0.0,
+        'checked_buildings': 0,
+    }
+    start = time.perf_counter()
+    batch = []
+    with fiona.open(output_path, 'w', driver=driver, layer=layer, schema=SCHEMA, crs='EPSG:2056') as dst:
+        for feature, kind, volume, footprint in generate_features(count, mix, seed):
+            batch.append(feature)
+            summary['kinds'][kind] = summary['kinds'].get(kind, 0) + 1
+            if volume is not None:
+                summary['expected_volume'] += volume
+                summary['expected_footprint'] += footprint
+                summary['checked_buildings'] += 1
+            if len(batch) >= WRITE_BATCH:
+                dst.writerecords(batch)
+                batch = []
+                logger.info(f"Written {sum(summary['kinds'].values())}/{count} buildings")
+        if batch:
+            dst.writerecords(batch)
+
+    summary['seconds'] = time.perf_counter() - start
+    with open(sidecar_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def sidecar_path(dataset_path):
+    """Path of the JSON sidecar with the expected totals of a generated dataset"""
+    dataset_path = Path(dataset_path)
+    return dataset_path.with_name(dataset_path.name + '.json')
+
+
+def main(argv=None):
+    """Command line entry point of the generate subcommand"""
+    parser = argparse.ArgumentParser(prog='main.py generate',
+                                     description='Write a synthetic building layer for load tests')
+    parser.add_argument('output', help=f"Output dataset ({', '.join(DRIVERS)})")
+    parser.add_argument('--count', type=int, default=DEFAULT_COUNT,
+                        help=f'Number of buildings (default: {DEFAULT_COUNT})')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'Share of simple, complex and broken solids (default: {DEFAULT_MIX})')
+    parser.add_argument('--layer', default=DEFAULT_LAYER, help=f'Layer name (default: {DEFAULT_LAYER})')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    summary = generate_dataset(args.output, args.count, args.mix, args.seed, args.layer)
+    print(f"Wrote {summary['count']} buildings to {args.output} in {summary['seconds']:.1f}s "
+          f"({', '.join(f'{kind} {n}' for kind, n in sorted(summary['kinds'].items()))})")
+    print(f"Expected totals of {summary['checked_buildings']} closed solids: volume "
+          f"{summary['expected_volume']:,.0f} m3, footprint {summary['expected_footprint']:,.0f} m2")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
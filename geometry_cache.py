@@ -0,0 +1,317 @@
+"""
+Geometry cache module
+One-time conversion of a layer into memory-mappable packed arrays: triangulated local
+vertices and faces with per-building offsets and origins, plus one .npy file per
+attribute column. Runs on the cache skip the decoding and triangulation of the input,
+and workers map the geometry of their batch themselves instead of receiving it pickled
+"""
+
+import sys
+import json
+import time
+import shutil
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from chunking import CHUNK_SIZE, ROW_BYTES, estimate_geometry_bytes, parse_size
+from triangulation import VERTEX_DTYPE, FACE_DTYPE
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = '.geocache'
+META_FILE = 'meta.json'
+
+# Packed geometry files (raw arrays, shapes in the meta file) and their dtypes
+GEOMETRY_FILES = {
+    'vertices': VERTEX_DTYPE,  # (n, 3) local coordinates of all buildings
+    'faces': FACE_DTYPE,  # (m, 3) vertex indices per building
+    'origins': np.float64,  # (buildings, 3) local origin of every building
+}
+
+
+def is_geometry_cache(path):
+    """Whether a path is a geometry cache directory"""
+    return (Path(path) / META_FILE).is_file() and Path(path).suffix.lower() == CACHE_SUFFIX
+
+
+def default_cache_path(input_path):
+    """Cache directory next to an input (city.gdb -> city.geocache)"""
+    return Path(input_path).with_suffix(CACHE_SUFFIX)
+
+
+class GeometryCacheWriter:
+    """Writes a geometry cache from the chunks of a reader
+
+    Geometry is appended to the raw array files as chunks arrive; attribute columns are
+    spilled per chunk and concatenated by finish(), one column at a time.
+    """
+
+    def __init__(self, path, source=None):
+        self.path = Path(path)
+        self.source = source or {}
+        self.runs_path = self.path / '_runs'
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        self.runs_path.mkdir(parents=True)
+        self.files = {name: open(self.path / f'{name}.bin', 'wb') for name in GEOMETRY_FILES}
+        self.vertex_counts = []
+        self.face_counts = []
+        self.columns = []
+        self.run_lengths = []
+
+    def write_chunk(self, chunk_data):
+        """Append the geometry and spill the attributes of one chunk"""
+        import pandas as pd
+        from results_store import storable, null_run
+
+        vertex_counts = [len(row['_vertices']) for row in chunk_data]
+        face_counts = [len(row['_faces']) for row in chunk_data]
+        if sum(vertex_counts):
+            np.concatenate([row['_vertices'] for row in chunk_data]).astype(VERTEX_DTYPE).tofile(
+                self.files['vertices'])
+        if sum(face_counts):
+            np.concatenate([row['_faces'] for row in chunk_data]).astype(FACE_DTYPE).tofile(self.files['faces'])
+        np.array([row['_origin'] for row in chunk_data], dtype=np.float64).reshape(-1, 3).tofile(
+            self.files['origins'])
+        self.vertex_counts.extend(vertex_counts)
+        self.face_counts.extend(face_counts)
+
+        # Attributes keep the geometry type; nulls are kept in a mask
+        df = pd.DataFrame([{key: value for key, value in row.items()
+                            if not key.startswith('_') or key == '_geometry_type'} for row in chunk_data])
+        run = len(self.run_lengths)
+        for name in df.columns:
+            if name not in self.columns:
+                self.columns.append(name)
+            if null_run(df[name]):
+                continue  # Typed by the runs with values, see finish()
+            np.save(self.runs_path / f'{run}_{name}.npy', storable(df[name]))
+            if df[name].isna().any():
+                np.save(self.runs_path / f'{run}_{name}.null.npy', df[name].isna().to_numpy())
+        self.run_lengths.append(len(df))
+
+    def run_column(self, run, name):
+        """Values and null mask of one attribute column of a run (values None if the run has none)"""
+        path = self.runs_path / f'{run}_{name}.npy'
+        if not path.exists():
+            return None, np.ones(self.run_lengths[run], dtype=bool)
+        null_path = self.runs_path / f'{run}_{name}.null.npy'
+        values = np.load(path)
+        return values, np.load(null_path) if null_path.exists() else None
+
+    def finish(self):
+        """Write the offsets, the attribute columns and the meta file"""
+        from results_store import column_dtype, conform_run
+        logger = logging.getLogger(__name__)
+        for f in self.files.values():
+            f.close()
+        count = len(self.vertex_counts)
+        vertex_offsets = np.zeros(count + 1, dtype=np.int64)
+        face_offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(self.vertex_counts, out=vertex_offsets[1:])
+        np.cumsum(self.face_counts, out=face_offsets[1:])
+        np.save(self.path / 'vertex_offsets.npy', vertex_offsets)
+        np.save(self.path / 'face_offsets.npy', face_offsets)
+
+        # Attribute columns, typed by the runs with values (numbers stay numeric)
+        dtypes = {}
+        nullable = []
+        for name in self.columns:
+            runs = [self.run_column(run, name) for run in range(len(self.run_lengths))]
+            dtype = column_dtype([values for values, _ in runs]) if runs else np.dtype('float64')
+            values = np.concatenate([conform_run(values, dtype, length) for (values, _), length
+                                     in zip(runs, self.run_lengths)]) if runs else np.zeros(0, dtype=dtype)
+            np.save(self.path / f'{name}.npy', values)
+            dtypes[name] = values.dtype.str
+            if any(nulls is not None for _, nulls in runs):
+                np.save(self.path / f'{name}.null.npy', np.concatenate(
+                    [nulls if nulls is not None else np.zeros(length, dtype=bool) for (_, nulls), length
+                     in zip(runs, self.run_lengths)]))
+                nullable.append(name)
+
+        meta = {
+            'version': CACHE_VERSION,
+            'buildings': count,
+            'vertices': int(vertex_offsets[-1]),
+            'faces': int(face_offsets[-1]),
+            'geometry_dtypes': {name: np.dtype(dtype).str for name, dtype in GEOMETRY_FILES.items()},
+            'columns': self.columns,
+            'dtypes': dtypes,
+            'nullable': nullable,
+            'source': self.source,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with open(self.path / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        shutil.rmtree(self.runs_path)
+        logger.info(f"Saved geometry cache with {count} buildings, {meta['vertices']} vertices and "
+                    f"{meta['faces']} faces to {self.path}")
+
+
+class GeometryCache:
+    """Read access to a geometry cache (arrays are memory-mapped on first use)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / META_FILE, encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != CACHE_VERSION:
+            raise ValueError(f"Geometry cache {self.path} has version {self.meta.get('version')}, "
+                             f"expected {CACHE_VERSION} - convert the input again")
+        self.columns = self.meta['columns']
+        self._arrays = {}
+
+    def __len__(self):
+        return self.meta['buildings']
+
+    def array(self, name):
+        """Memory-mapped geometry, offset or attribute array"""
+        if name not in self._arrays:
+            if name in GEOMETRY_FILES:
+                rows = self.meta['buildings'] if name == 'origins' else self.meta[name]
+                dtype = np.dtype(self.meta['geometry_dtypes'][name])
+                self._arrays[name] = (np.memmap(self.path / f'{name}.bin', dtype=dtype, mode='r', shape=(rows, 3))
+                                      if rows else np.zeros((0, 3), dtype=dtype))
+            else:
+                self._arrays[name] = np.load(self.path / f'{name}.npy', mmap_mode='r')
+        return self._arrays[name]
+
+    def geometry(self, row):
+        """(vertices, faces, origin) of one building as views into the mapped arrays"""
+        vertex_offsets = self.array('vertex_offsets')
+        face_offsets = self.array('face_offsets')
+        return (self.array('vertices')[vertex_offsets[row]:vertex_offsets[row + 1]],
+                self.array('faces')[face_offsets[row]:face_offsets[row + 1]],
+                np.asarray(self.array('origins')[row]))
+
+    def attributes(self, start, stop):
+        """Attribute rows start..stop as dicts (text decoded, nulls as None)"""
+        data = {}
+        for name in self.columns:
+            values = self.array(name)[start:stop]
+            if values.dtype.kind == 'S':
+                values = np.char.decode(values, 'utf-8').astype(object)
+            else:
+                values = values.astype(object)
+            if name in self.meta['nullable']:
+                values[self.array(f'{name}.null')[start:stop]] = None
+            data[name] = values
+        return [{name: data[name][i] for name in self.columns} for i in range(stop - start)]
+
+    def source_changed(self):
+        """Whether the input the cache was converted from has changed since (False if it is gone)"""
+        from job_queue import input_size
+
+        source = self.meta.get('source') or {}
+        path = Path(source.get('input', ''))
+        if not source.get('input') or not path.exists():
+            return False
+        return input_size(path) != source.get('size') or path.stat().st_mtime != source.get('mtime')
+
+
+def chunk_ranges(cache, chunk_size=None, limit=None, max_chunk_bytes=None):
+    """(start, stop) building ranges of the chunks - ends at chunk_size or the memory budget"""
+    count = min(len(cache), limit) if limit else len(cache)
+    vertex_offsets = np.asarray(cache.array('vertex_offsets')[:count + 1])
+    face_offsets = np.asarray(cache.array('face_offsets')[:count + 1])
+    row_bytes = estimate_geometry_bytes(np.diff(vertex_offsets), np.diff(face_offsets)) + ROW_BYTES
+    cumulative = np.cumsum(row_bytes)
+
+    start = 0
+    while start < count:
+        stop = min(start + chunk_size, count) if chunk_size else count
+        if max_chunk_bytes:
+            # Same rule as ChunkBudget: the building reaching the budget closes the chunk
+            base = cumulative[start - 1] if start else 0
+            stop = min(stop, int(np.searchsorted(cumulative, base + max_chunk_bytes, side='left')) + 1)
+        yield start, stop
+        start = stop
+
+
+def read_cached_buildings_chunked(cache_path, layer_name=None, chunk_size=None, limit=None, progress=None,
+                                  max_chunk_bytes=None):
+    """Read buildings from a geometry cache in chunks (layer_name is ignored, the cache holds one layer)"""
+    logger = logging.getLogger(__name__)
+    cache = GeometryCache(cache_path)
+    source = cache.meta.get('source') or {}
+    logger.info(f"Reading buildings from geometry cache {cache_path} ({len(cache)} buildings from "
+                f"{source.get('input')}, layer {source.get('layer')}, created {cache.meta.get('created')})")
+    if cache.source_changed():
+        logger.warning(f"{source['input']} changed after the cache was created - convert it again "
+                       f"to include the changes")
+
+    if progress is not None:
+        progress.set_total(min(len(cache), limit) if limit else len(cache))
+
+    # Rows carry views into the mapped arrays; batches are sent to the workers as row ranges
+    path = str(Path(cache_path).resolve())
+    vertex_offsets = cache.array('vertex_offsets')
+    face_offsets = cache.array('face_offsets')
+    for chunk_num, (start, stop) in enumerate(chunk_ranges(cache, chunk_size, limit, max_chunk_bytes)):
+        chunk = cache.attributes(start, stop)
+        for i, properties in enumerate(chunk):
+            vertices, faces, origin = cache.geometry(start + i)
+            properties['_vertices'] = vertices
+            properties['_faces'] = faces
+            properties['_origin'] = origin
+            properties['_cache_path'] = path
+            properties['_cache_row'] = start + i
+        if progress is not None:
+            failed = int((np.diff(vertex_offsets[start:stop + 1]) < 3).sum())
+            progress.advance('read', count=len(chunk), failed=failed)
+        logger.info(f"Chunk {chunk_num} read: {len(chunk)} buildings, "
+                    f"{vertex_offsets[stop] - vertex_offsets[start]} vertices, "
+                    f"{face_offsets[stop] - face_offsets[start]} faces (mapped)")
+        yield chunk_num, chunk
+
+
+def convert(input_path, cache_path, layer_name='Building_solid', reader=None, chunk_size=None, limit=None,
+            max_chunk_bytes=None):
+    """Convert a layer into a geometry cache - returns the number of buildings"""
+    from readers import select_reader
+    from job_queue import input_size
+
+    input_path = Path(input_path)
+    source = {'input': str(input_path.resolve()), 'size': input_size(input_path),
+              'mtime': input_path.stat().st_mtime, 'layer': layer_name, 'reader': reader, 'limit': limit}
+    writer = GeometryCacheWriter(cache_path, source)
+    read_chunks = select_reader(input_path, reader)
+    count = 0
+    for _, chunk_data in read_chunks(input_path, layer_name, chunk_size or CHUNK_SIZE, limit, None, max_chunk_bytes):
+        writer.write_chunk(chunk_data)
+        count += len(chunk_data)
+    writer.finish()
+    return count
+
+
+def main(argv=None):
+    """Command line entry point of the convert subcommand"""
+    from readers import READERS
+
+    parser = argparse.ArgumentParser(prog='main.py convert',
+                                     description='Convert a layer into a memory-mapped geometry cache; pass the '
+                                                 'cache directory instead of the input to later runs')
+    parser.add_argument('input', help='Input dataset (GDB, GeoPackage, CityGML, CityJSON, ...)')
+    parser.add_argument('cache', nargs='?', help=f'Cache directory (default: input with {CACHE_SUFFIX} suffix)')
+    parser.add_argument('--layer', default='Building_solid', help='Layer name')
+    parser.add_argument('--reader', choices=READERS,
+                        help='Input reader (default: by file type)')
+    parser.add_argument('--limit', type=int, help='Limit number of buildings to convert')
+    parser.add_argument('--chunk-size', type=int, help='Buildings read per chunk')
+    parser.add_argument('--max-chunk-mem', type=parse_size, help='Memory budget per chunk read, e.g. 2G')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    cache_path = Path(args.cache) if args.cache else default_cache_path(args.input)
+    if cache_path.suffix.lower() != CACHE_SUFFIX:
+        cache_path = cache_path.with_name(cache_path.name + CACHE_SUFFIX)
+    start = time.perf_counter()
+    count = convert(args.input, cache_path, args.layer, args.reader, args.chunk_size, args.limit, args.max_chunk_mem)
+    print(f"Converted {count} buildings to {cache_path} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Dataset inspection and planning module
+Reports feature count, bounds, schema and vertex/face histograms of a layer from a sample
+Estimates run time and memory for a given chunk size and worker count
+"""
+
+import json
+import time
+import random
+import argparse
+import logging
+
+from progress import format_duration
+from chunking import CHUNK_SIZE, estimate_parse_bytes, ROW_BYTES
+from metrics import ALL_STAGES, parse_metrics, plan_metrics, describe_plan
+
+DEFAULT_SAMPLE_SIZE = 1000
+DEFAULT_TIME_SAMPLE = 50
+HISTOGRAM_EDGES = [0, 8, 16, 32, 64, 128, 256, 512, 1024, 2048]
+WORKER_BASE_BYTES = 150 * 1024 ** 2  # Rough RSS of an idle worker with numpy and trimesh loaded
+PARALLEL_EFFICIENCY = 0.85  # Assumed scaling of the process pool
+
+
+def count_rings(geometry):
+    """Count vertices and fan-triangulated faces without converting coordinates"""
+    vertices = 0
+    faces = 0
+    if not geometry:
+        return 0, 0
+
+    geom_type = geometry.get('type', '')
+    coords = geometry.get('coordinates', [])
+    if geom_type == 'Polygon':
+        coords = [coords]
+    elif geom_type != 'MultiPolygon':
+        return 0, 0
+
+    for polygon in coords:
+        for ring in polygon:
+            ring_vertices = len(ring) - 1  # Skip duplicate last point
+            vertices += max(ring_vertices, 0)
+            if ring_vertices >= 3:
+                faces += ring_vertices - 2
+    return vertices, faces
+
+
+def histogram(values, edges=HISTOGRAM_EDGES):
+    """Count values per bucket [edge_i, edge_i+1) with an open last bucket"""
+    counts = [0] * len(edges)
+    for value in values:
+        bucket = 0
+        for i, edge in enumerate(edges):
+            if value >= edge:
+                bucket = i
+        counts[bucket] += 1
+
+    labels = [f"{edges[i]}-{edges[i + 1] - 1}" for i in range(len(edges) - 1)] + [f"{edges[-1]}+"]
+    return dict(zip(labels, counts))
+
+
+def time_processing(features, stages=ALL_STAGES):
+    """Measure single-core seconds per building for parse + processing"""
+    from triangulation import parse_multipatch_geometry
+    from worker import process_single_building
+
+    durations = []
+    for i, feature in enumerate(features):
+        start = time.perf_counter()
+        vertices, faces, origin = parse_multipatch_geometry(feature.get('geometry'))
+        process_single_building((i, vertices, faces, origin), stages=stages)
+        durations.append(time.perf_counter() - start)
+
+    # Drop the first building, it pays for lazy imports and caches
+    if len(durations) > 1:
+        durations = durations[1:]
+    return sum(durations) / len(durations) if durations else None
+
+
+def inspect_layer(gdb_path, layer_name='Building_solid', sample_size=DEFAULT_SAMPLE_SIZE,
+                  time_sample=DEFAULT_TIME_SAMPLE, chunk_size=None, num_workers=None, seed=0,
+                  metrics=None):
+    """Inspect a layer from a random sample of features and build a processing plan"""
+    import fiona
+    from readers import resolve_layer_name
+    from worker import default_worker_count
+
+    chunk_size = chunk_size or CHUNK_SIZE
+    num_workers = max(num_workers or default_worker_count(), 1)
+    metric_plan = plan_metrics(metrics)
+    actual_layer = resolve_layer_name(gdb_path, layer_name)
+
+    with fiona.open(gdb_path, layer=actual_layer) as src:
+        report = {
+            'path': str(gdb_path),
+            'layer': actual_layer,
+            'crs': str(src.crs),
+            'bounds': list(src.bounds),
+            'feature_count': len(src),
+            'geometry_type': src.schema.get('geometry'),
+            'attributes': dict(src.schema.get('properties', {})),
+        }
+
+        # Sample feature IDs uniformly over the whole layer, not just the first N
+        start = time.perf_counter()
+        fids = list(src.keys())
+        rng = random.Random(seed)
+        sample_fids = sorted(rng.sample(fids, min(sample_size, len(fids))))
+        features = [src[fid] for fid in sample_fids]
+        report['sample_read_seconds'] = time.perf_counter() - start
+
+    counts = [count_rings(feature.get('geometry')) for feature in features]
+    vertex_counts = [c[0] for c in counts]
+    face_counts = [c[1] for c in counts]
+    sampled = len(counts)
+
+    report['sample'] = {
+        'size': sampled,
+        'empty_geometries': sum(1 for c in counts if c[1] == 0),
+        'mean_vertices': sum(vertex_counts) / sampled if sampled else 0.0,
+        'mean_faces': sum(face_counts) / sampled if sampled else 0.0,
+        'max_vertices': max(vertex_counts, default=0),
+        'max_faces': max(face_counts, default=0),
+        'vertex_histogram': histogram(vertex_counts),
+        'face_histogram': histogram(face_counts),
+    }
+
+    # Memory plan: parsed chunk + result rows + idle workers
+    mean_bytes = (sum(estimate_parse_bytes(v, f) for v, f in counts) / sampled) if sampled else 0.0
+    chunk_bytes = chunk_size * (mean_bytes + ROW_BYTES)
+    plan = {
+        'chunk_size': chunk_size,
+        'workers': num_workers,
+        'chunks': -(-report['feature_count'] // chunk_size),
+        'mean_building_bytes': mean_bytes,
+        'estimated_chunk_mb': chunk_bytes / 1024 ** 2,
+        'estimated_peak_mb': (chunk_bytes + num_workers * WORKER_BASE_BYTES) / 1024 ** 2,
+        'metrics': describe_plan(metric_plan),
+        'seconds_per_building': None,
+        'estimated_runtime_seconds': None,
+    }
+
+    # Run time plan from processing a few sampled buildings on one core
+    if time_sample:
+        seconds = time_processing(features[:time_sample], metric_plan['stages'])
+        if seconds:
+            plan['seconds_per_building'] = seconds
+            plan['estimated_runtime_seconds'] = (report['feature_count'] * seconds
+                                                 / (num_workers * PARALLEL_EFFICIENCY))
+    report['plan'] = plan
+    return report
+
+
+def format_report(report):
+    """Format an inspection report as readable text"""
+    sample = report['sample']
+    plan = report['plan']
+    lines = [
+        f"Layer: {report['layer']} ({report['geometry_type']}, {report['crs']})",
+        f"Feature count: {report['feature_count']}",
+        f"Bounds: {report['bounds']}",
+        "Attributes:",
+    ]
+    lines += [f"  {name}: {field_type}" for name, field_type in report['attributes'].items()]
+    lines += [
+        f"Sample: {sample['size']} buildings ({sample['empty_geometries']} without geometry), "
+        f"read in {report['sample_read_seconds']:.1f}s",
+        f"Vertices per building: mean {sample['mean_vertices']:.1f}, max {sample['max_vertices']}",
+        f"Faces per building: mean {sample['mean_faces']:.1f}, max {sample['max_faces']}",
+        "Vertex / face histogram:",
+    ]
+    for label in sample['vertex_histogram']:
+        lines.append(f"  {label:>10}: {sample['vertex_histogram'][label]:>7} / {sample['face_histogram'][label]:>7}")
+
+    lines += [
+        f"Plan: {plan['chunks']} chunks of {plan['chunk_size']} buildings with {plan['workers']} workers",
+        f"Estimated memory: {plan['estimated_chunk_mb']:.0f} MB per chunk, "
+        f"{plan['estimated_peak_mb']:.0f} MB peak",
+    ]
+    if plan['estimated_runtime_seconds'] is not None:
+        lines.append(f"Estimated run time: {format_duration(plan['estimated_runtime_seconds'])} "
+                     f"({plan['seconds_per_building'] * 1000:.1f} ms per building on one core, "
+                     f"metrics {plan['metrics']})")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Command line entry point of the inspect subcommand"""
+    parser = argparse.ArgumentParser(prog='main.py inspect',
+                                     description='Inspect a building layer and estimate a processing plan')
+    parser.add_argument('input_gdb', help='Path to input GDB file')
+    parser.add_argument('--layer', default='Building_solid', help='GDB layer name')
+    parser.add_argument('--sample', type=int, default=DEFAULT_SAMPLE_SIZE,
+                        help=f'Number of randomly sampled buildings (default: {DEFAULT_SAMPLE_SIZE})')
+    parser.add_argument('--time-sample', type=int, default=DEFAULT_TIME_SAMPLE,
+                        help=f'Sampled buildings processed to time the run (default: {DEFAULT_TIME_SAMPLE}, 0 to skip)')
+    parser.add_argument('--chunk-size', type=int, help='Planned number of buildings per chunk')
+    parser.add_argument('--workers', type=int, help='Planned number of parallel workers')
+    parser.add_argument('--metrics', type=parse_metrics, default=None,
+                        help='Planned metrics, as for a processing run (default: all)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the sample')
+    parser.add_argument('--json', help='Also write the report as JSON to this path')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    report = inspect_layer(args.input_gdb, args.layer, args.sample, args.time_sample,
+                           args.chunk_size, args.workers, args.seed, args.metrics)
+    print(format_report(report))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
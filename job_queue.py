@@ -0,0 +1,408 @@
+"""
+Batch job queue module
+Processes many inputs (a directory of tile GDBs, globs or a list) with one shared worker
+pool: inputs run largest first and the chunks of the next input are read while the last
+batches of the current one are still in the pool, so the workers never wait between
+inputs. Every input keeps its own output directory and progress file, and inputs that
+are already done are skipped on the next run
+"""
+
+import sys
+import glob
+import json
+import time
+import argparse
+import logging
+from pathlib import Path
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from chunking import IN_FLIGHT_PER_WORKER, parse_size
+from metrics import parse_metrics, plan_metrics, describe_plan
+from welding import DEFAULT_WELD_TOLERANCE
+from progress import ProgressTracker, STATUS_FILE_NAME, DEFAULT_INTERVAL
+from citymodel_readers import is_cityjson
+
+INPUT_SUFFIXES = ('.gdb', '.gpkg', '.shp', '.fgb', '.geojson', '.gml', '.jsonl', '.json', '.geocache')
+JOB_FILE_NAME = 'job.json'  # Done marker and summary of one input
+BATCH_STATUS_FILE_NAME = 'batch_status.json'
+DEFAULT_OPEN_CHUNKS = 2  # Chunks held in memory at once across all inputs
+
+
+def expand_inputs(patterns):
+    """Input datasets from paths, globs and directories of datasets (a .gdb directory is one input)"""
+    inputs = []
+    for pattern in patterns:
+        paths = [Path(p) for p in sorted(glob.glob(pattern))] if glob.has_magic(pattern) else [Path(pattern)]
+        for path in paths:
+            if path.is_dir() and path.suffix.lower() not in ('.gdb', '.geocache'):
+                # .json files only when they are CityJSON (not e.g. the sidecars of generated datasets)
+                inputs.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in INPUT_SUFFIXES
+                                     and (p.suffix.lower() != '.json' or is_cityjson(p))))
+            elif path.exists():
+                inputs.append(path)
+            else:
+                raise FileNotFoundError(f"Input not found: {path}")
+
+    unique = []
+    for path in inputs:
+        if path.resolve() not in {p.resolve() for p in unique}:
+            unique.append(path)
+    return unique
+
+
+def input_size(path):
+    """Size of an input on disk in bytes (a GDB is a directory of files)"""
+    path = Path(path)
+    if path.is_dir():
+        return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+    return path.stat().st_size
+
+
+def input_signature(path, plan):
+    """What a finished job must match to be skipped: input size, modification time and metrics"""
+    path = Path(path)
+    return {'input': str(path.resolve()), 'size': input_size(path), 'mtime': path.stat().st_mtime,
+            'metrics': describe_plan(plan)}
+
+
+def job_names(inputs):
+    """Output directory name per input (the file name stem, numbered when stems repeat)"""
+    names = []
+    for path in inputs:
+        name, number = path.stem, 1
+        while name in names:
+            name = f"{path.stem}_{number}"
+            number += 1
+        names.append(name)
+    return names
+
+
+class Job:
+    """One input of the batch: its reader, open chunks, progress tracker and chunk summaries"""
+
+    def __init__(self, input_path, output_dir, signature):
+        self.input_path = Path(input_path)
+        self.output_dir = Path(output_dir)
+        self.name = self.output_dir.name
+        self.signature = signature
+        self.size = signature['size']
+        self.status = 'queued'
+        self.reader = None
+        self.exhausted = False
+        self.open_chunks = 0
+        self.summaries = []
+        self.progress = None
+        self.output_path = None
+        self.start_time = None
+        self.seconds = None
+        self.error = None
+
+    def is_done(self):
+        """Whether an earlier run already finished this input with the same settings"""
+        job_file = self.output_dir / JOB_FILE_NAME
+        if not job_file.exists():
+            return False
+        with open(job_file, encoding='utf-8') as f:
+            saved = json.load(f)
+        return saved.get('status') == 'done' and all(saved.get(k) == v for k, v in self.signature.items())
+
+    def start(self, args, plan, num_workers):
+        """Open the reader and the progress file of this input"""
+        from readers import select_reader
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        (self.output_dir / JOB_FILE_NAME).unlink(missing_ok=True)
+        self.output_path = self.output_dir / f'building_analysis_{time.strftime("%Y%m%d_%H%M%S")}'
+        self.progress = ProgressTracker(status_path=self.output_dir / STATUS_FILE_NAME,
+                                        interval=args.progress_interval, num_workers=num_workers,
+                                        metrics=describe_plan(plan), name=self.name)
+        read_chunks = select_reader(self.input_path, args.reader)
+        self.reader = read_chunks(self.input_path, args.layer, args.chunk_size, args.limit, self.progress,
+                                  args.max_chunk_mem)
+        self.start_time = time.time()
+        self.status = 'running'
+
+    def next_chunk(self):
+        """Next (chunk_num, chunk_data) of this input, None once it is read completely or failed"""
+        try:
+            return next(self.reader)
+        except StopIteration:
+            self.exhausted = True
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Reading {self.input_path} failed: {str(e)}", exc_info=True)
+            self.fail(e)
+        return None
+
+    def fail(self, error):
+        """Stop reading this input; its open chunks still finish"""
+        self.exhausted = True
+        self.error = str(error)
+
+    def summary(self):
+        """Status of this input for the batch status file"""
+        return {
+            'name': self.name,
+            'input': str(self.input_path),
+            'size_bytes': self.size,
+            'status': self.status,
+            'buildings': sum(summary['total'] for summary in self.summaries),
+            'seconds': self.seconds,
+            'error': self.error,
+        }
+
+
+class OpenChunk:
+    """A chunk read from one input whose batches are (partly) in the worker pool"""
+
+    def __init__(self, job, chunk_num, chunk_data, batches, max_in_flight):
+        self.job = job
+        self.chunk_num = chunk_num
+        self.chunk_data = chunk_data
+        self.records = [None] * len(chunk_data)
+        self.batches = batches
+        self.max_in_flight = max_in_flight
+        self.next_batch = 0
+        self.pending = 0
+        self.processed = 0
+
+    def unsubmitted(self):
+        """Batches not yet sent to the pool"""
+        return len(self.batches) - self.next_batch
+
+    def complete(self):
+        """Whether every batch of the chunk has returned"""
+        return self.next_batch == len(self.batches) and self.pending == 0
+
+
+class JobQueue:
+    """Schedules the chunks of many inputs onto one worker pool"""
+
+    def __init__(self, jobs, executor, args, plan, num_workers, status_path, monitor=None):
+        self.logger = logging.getLogger(__name__)
+        self.jobs = jobs
+        self.queue = [job for job in jobs if job.status == 'queued']
+        self.active = []
+        self.executor = executor
+        self.args = args
+        self.plan = plan
+        self.num_workers = num_workers
+        self.status_path = status_path
+        self.monitor = monitor
+        self.open_chunks = []
+        self.pending = {}
+
+    def write_status(self):
+        """Rewrite the batch status file with the state of every input"""
+        status = {
+            'updated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'jobs': [job.summary() for job in self.jobs],
+        }
+        for state in ('queued', 'running', 'done', 'skipped', 'failed'):
+            status[state] = sum(1 for job in self.jobs if job.status == state)
+        tmp_path = Path(f"{self.status_path}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, indent=2)
+        tmp_path.replace(self.status_path)
+
+    def open_next_chunk(self):
+        """Read the next chunk of the earliest input that has one, starting queued inputs as needed"""
+        from main import plan_chunk_batches
+
+        while True:
+            job = next((job for job in self.active if not job.exhausted), None)
+            if job is None:
+                if not self.queue:
+                    return None
+                job = self.queue.pop(0)
+                self.logger.info(f"Starting {job.name} ({job.input_path}, {job.size / 1024 ** 2:.0f} MB)")
+                try:
+                    job.start(self.args, self.plan, self.num_workers)
+                except Exception as e:
+                    self.logger.error(f"Starting {job.name} failed: {str(e)}")
+                    job.fail(e)
+                    job.status = 'failed'
+                    self.write_status()
+                    continue
+                self.active.append(job)
+                self.write_status()
+
+            chunk = job.next_chunk()
+            if chunk is None:
+                if job.open_chunks == 0:
+                    self.finish_job(job)
+                continue
+
+            chunk_num, chunk_data = chunk
+            batches, _, batch_size, max_in_flight = plan_chunk_batches(chunk_data, self.num_workers,
+                                                                       self.args.max_chunk_mem)
+            self.logger.info(f"{job.name}: chunk {chunk_num} with {len(chunk_data)} buildings "
+                             f"({len(batches)} batches of up to {batch_size})")
+            job.open_chunks += 1
+            if not batches:
+                self.close_chunk(OpenChunk(job, chunk_num, chunk_data, batches, max_in_flight))
+                continue
+            return OpenChunk(job, chunk_num, chunk_data, batches, max_in_flight)
+
+    def close_chunk(self, chunk):
+        """Save the results of a finished chunk and finish its input once that was the last chunk"""
+        from main import save_chunk_results
+
+        job = chunk.job
+        try:
+            job.summaries.append(save_chunk_results(chunk.chunk_data, chunk.records, job.output_path,
+                                                    chunk.chunk_num, job.progress, self.plan['columns']))
+        except Exception as e:
+            self.logger.error(f"Saving chunk {chunk.chunk_num} of {job.name} failed: {str(e)}", exc_info=True)
+            job.fail(e)
+        job.open_chunks -= 1
+        if job.exhausted and job.open_chunks == 0:
+            self.finish_job(job)
+
+    def finish_job(self, job):
+        """Merge the chunk files of an input and mark it done (or failed)"""
+        from main import merge_chunk_results
+
+        if job in self.active:
+            self.active.remove(job)
+        if job.error is None and job.summaries:
+            try:
+                merge_chunk_results(sorted(job.summaries, key=lambda s: s['chunk_num']), job.output_path,
+                                    self.args.readable)
+            except Exception as e:
+                self.logger.error(f"Merging {job.name} failed: {str(e)}", exc_info=True)
+                job.error = str(e)
+        job.progress.close()
+        job.seconds = time.time() - job.start_time
+        job.status = 'failed' if job.error else 'done'
+
+        with open(job.output_dir / JOB_FILE_NAME, 'w', encoding='utf-8') as f:
+            json.dump(dict(job.summary(), **job.signature, finished=time.strftime('%Y-%m-%dT%H:%M:%S')), f, indent=2)
+        buildings = job.summary()['buildings']
+        self.logger.info(f"{job.name} {job.status}: {buildings} buildings in {job.seconds:.1f}s"
+                         + (f" ({job.error})" if job.error else ''))
+        self.write_status()
+
+    def run(self):
+        """Process all queued inputs"""
+        from main import submit_batch, collect_batch_results
+
+        self.write_status()
+        default_in_flight = self.num_workers * IN_FLIGHT_PER_WORKER
+        while True:
+            # Step 1: Read more chunks while the pool would otherwise run out of work
+            in_flight = min((chunk.max_in_flight for chunk in self.open_chunks), default=default_in_flight)
+            while (len(self.open_chunks) < self.args.open_chunks
+                   and sum(chunk.unsubmitted() for chunk in self.open_chunks) < in_flight):
+                chunk = self.open_next_chunk()
+                if chunk is None:
+                    break
+                self.open_chunks.append(chunk)
+                in_flight = min(in_flight, chunk.max_in_flight)
+
+            # Step 2: Submit batches, oldest chunk first
+            if self.monitor is not None:
+                in_flight = self.monitor.throttle(in_flight)
+            for chunk in self.open_chunks:
+                while chunk.unsubmitted() and len(self.pending) < in_flight:
+                    batch = chunk.batches[chunk.next_batch]
+                    future = submit_batch(self.executor, batch, chunk.chunk_data, self.args.weld_tolerance,
+                                          self.plan['stages'])
+                    self.pending[future] = (chunk, batch)
+                    chunk.next_batch += 1
+                    chunk.pending += 1
+
+            if not self.pending:
+                break
+
+            # Step 3: Collect finished batches and save completed chunks
+            done, _ = wait(self.pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk, batch = self.pending.pop(future)
+                chunk.processed += collect_batch_results(future, batch, chunk.records, chunk.chunk_num,
+                                                         chunk.job.progress)
+                chunk.pending -= 1
+                if chunk.complete():
+                    self.open_chunks.remove(chunk)
+                    self.close_chunk(chunk)
+
+
+def main(argv=None):
+    """Command line entry point of the batch subcommand"""
+    from readers import READERS
+
+    parser = argparse.ArgumentParser(prog='main.py batch',
+                                     description='Process many inputs (tile GDBs, directories, globs) with one '
+                                                 'shared worker pool')
+    parser.add_argument('output_dir', help='Output directory, one subdirectory per input')
+    parser.add_argument('inputs', nargs='+', help='Input datasets, directories of datasets or glob patterns')
+    parser.add_argument('--layer', default='Building_solid', help='Layer name in every input')
+    parser.add_argument('--limit', type=int, help='Limit number of buildings per input')
+    parser.add_argument('--workers', type=int, help='Number of parallel workers')
+    parser.add_argument('--chunk-size', type=int, default=None, help='Number of buildings per chunk')
+    parser.add_argument('--max-chunk-mem', type=parse_size, help='Memory budget per chunk, e.g. 2G or 512M')
+    parser.add_argument('--open-chunks', type=int, default=DEFAULT_OPEN_CHUNKS,
+                        help=f'Chunks held in memory at once across inputs (default: {DEFAULT_OPEN_CHUNKS})')
+    parser.add_argument('--memory-limit', type=parse_size,
+                        help='Total RSS of orchestrator and workers to stay under, e.g. 16G')
+    parser.add_argument('--reader', choices=READERS,
+                        help='Input reader (default: by file type)')
+    parser.add_argument('--metrics', type=parse_metrics, default=None, help='Comma separated outputs to compute')
+    parser.add_argument('--weld-tolerance', type=float, default=DEFAULT_WELD_TOLERANCE,
+                        help=f'Vertex weld tolerance in meters (default: {DEFAULT_WELD_TOLERANCE:g})')
+    parser.add_argument('--readable', action='store_true', help='Write codes as text in the final CSVs')
+    parser.add_argument('--force', action='store_true', help='Process inputs again that are already done')
+    parser.add_argument('--progress-interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f'Seconds between progress reports (default: {DEFAULT_INTERVAL:g})')
+    args = parser.parse_args(argv)
+
+    from chunking import CHUNK_SIZE
+    from main import setup_logging, start_worker_pool, default_worker_count
+    from memory_monitor import MemoryMonitor
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    logger = setup_logging(output_dir)
+    args.chunk_size = args.chunk_size or CHUNK_SIZE
+    args.open_chunks = max(args.open_chunks, 1)
+    plan = plan_metrics(args.metrics)
+
+    # Step 1: Inputs, largest first so the small ones fill the end of the batch
+    inputs = expand_inputs(args.inputs)
+    jobs = [Job(path, output_dir / name, input_signature(path, plan))
+            for path, name in zip(inputs, job_names(inputs))]
+    jobs.sort(key=lambda job: job.size, reverse=True)
+    for job in jobs:
+        if not args.force and job.is_done():
+            job.status = 'skipped'
+    skipped = sum(1 for job in jobs if job.status == 'skipped')
+    logger.info(f"Batch of {len(jobs)} inputs ({skipped} already done), metrics {describe_plan(plan)}")
+    if skipped == len(jobs):
+        return 0
+
+    # Step 2: One pool for all inputs
+    start_time = time.time()
+    num_workers = args.workers or default_worker_count()
+    monitor = MemoryMonitor(args.memory_limit)
+    executor = start_worker_pool(num_workers)
+    monitor.attach(executor)
+    queue = JobQueue(jobs, executor, args, plan, num_workers, output_dir / BATCH_STATUS_FILE_NAME, monitor)
+    try:
+        queue.run()
+    finally:
+        monitor.sample()
+        executor.shutdown()
+        monitor.log_summary()
+
+    # Step 3: Summary
+    elapsed = time.time() - start_time
+    buildings = sum(job.summary()['buildings'] for job in jobs if job.status == 'done')
+    failed = [job.name for job in jobs if job.status == 'failed']
+    logger.info(f"Batch completed in {elapsed:.1f}s: {buildings} buildings"
+                + (f" ({buildings / elapsed:.1f} buildings/s)" if elapsed > 0 else ''))
+    if failed:
+        logger.error(f"Failed inputs: {', '.join(failed)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
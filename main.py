@@ -5,26 +5,47 @@ Reads GDB multipatch data, calculates volumes and surface areas
 Processes in chunks to handle large datasets without memory issues
 """
 
-import os
-import sys
 import time
+_IMPORT_START = time.perf_counter()
+
+import sys
 import argparse
 import logging
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
-import pandas as pd
-import fiona
-from fiona.crs import from_epsg
-import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import gc
 import warnings
 warnings.filterwarnings('ignore')
 
-# Import our modules
-from mesh_repair_volume import process_building_mesh
-from surface_analysis import analyze_building_surfaces
+# Import our modules - pandas, fiona and the geometry modules are imported lazily
+# so the orchestrator starts fast and workers only load what they need
+from worker import (init_worker, process_building_batch, process_cached_batch, start_worker_pool,
+                    default_worker_count)
+from chunking import CHUNK_SIZE, building_bytes, plan_parallelism, parse_size
+from readers import READERS, resolve_layer_name, read_gdb_buildings_chunked, select_reader, input_attributes
+from welding import DEFAULT_WELD_TOLERANCE
+from metrics import ALL_STAGES, parse_metrics, plan_metrics, describe_plan
+from aggregation import GroupAggregator, parse_group_keys, validate_group_keys
+from result_schema import Status, ErrorCode, RESULT_DTYPES, failed_record
+from memory_monitor import MemoryMonitor
+from progress import ProgressTracker, STATUS_FILE_NAME, DEFAULT_INTERVAL
+
 
-CHUNK_SIZE = 100000  # Process and save every 100000 buildings
+# Subcommands and the modules implementing them (imported on demand)
+SUBCOMMANDS = {
+    'inspect': 'inspect_dataset',
+    'decode': 'result_schema',
+    'bench-repair': 'bench_repair',
+    'sample': 'sampling',
+    'query': 'results_store',
+    'autotune': 'autotune',
+    'generate': 'generate_test_dataset',
+    'bench': 'bench_pipeline',
+    'batch': 'job_queue',
+    'serve': 'service',
+    'convert': 'geometry_cache',
+    'sweep': 'surface_sweep',
+}
 
 def setup_logging(output_dir):
     """Setup logging configuration"""
@@ -39,266 +60,132 @@ def setup_logging(output_dir):
     )
     return logging.getLogger(__name__)
 
-def parse_multipatch_geometry(geometry):
-    """Parse multipatch geometry from GDB"""
-    vertices = []
-    faces = []
-    
-    try:
-        if not geometry:
-            return [], []
-            
-        geom_type = geometry.get('type', '')
-        coords = geometry.get('coordinates', [])
-        
-        if not coords:
-            return [], []
-        
-        # Multipatch geometry structure in GDB
-        if geom_type == 'MultiPolygon':
-            # For each polygon in the multipatch
-            for polygon in coords:
-                if not isinstance(polygon, list):
-                    continue
-                    
-                for ring in polygon:
-                    if not isinstance(ring, list):
-                        continue
-                        
-                    # Add vertices from this ring
-                    start_idx = len(vertices)
-                    valid_vertices = 0
-                    
-                    for coord in ring[:-1]:  # Skip duplicate last point
-                        if isinstance(coord, (list, tuple)) and len(coord) >= 2:
-                            if len(coord) >= 3:
-                                vertices.append([float(coord[0]), float(coord[1]), float(coord[2])])
-                            else:
-                                vertices.append([float(coord[0]), float(coord[1]), 0.0])
-                            valid_vertices += 1
-                    
-                    # Create faces (fan triangulation)
-                    if valid_vertices >= 3:
-                        for i in range(1, valid_vertices - 1):
-                            faces.append([
-                                start_idx,
-                                start_idx + i,
-                                start_idx + i + 1
-                            ])
-        
-        elif geom_type == 'Polygon':
-            # Single polygon
-            if not isinstance(coords, list):
-                return [], []
-                
-            for ring in coords:
-                if not isinstance(ring, list):
-                    continue
-                    
-                start_idx = len(vertices)
-                valid_vertices = 0
-                
-                for coord in ring[:-1]:
-                    if isinstance(coord, (list, tuple)) and len(coord) >= 2:
-                        if len(coord) >= 3:
-                            vertices.append([float(coord[0]), float(coord[1]), float(coord[2])])
-                        else:
-                            vertices.append([float(coord[0]), float(coord[1]), 0.0])
-                        valid_vertices += 1
-                
-                if valid_vertices >= 3:
-                    for i in range(1, valid_vertices - 1):
-                        faces.append([
-                            start_idx,
-                            start_idx + i,
-                            start_idx + i + 1
-                        ])
-        
-        return vertices, faces
-        
-    except Exception as e:
-        logging.debug(f"Error parsing geometry: {str(e)}")
-        return [], []
+def plan_chunk_batches(chunk_data, num_workers, max_chunk_bytes=None, batch_size=None):
+    """Split the geometry of a chunk into worker batches - returns (batches, active workers, batch size, max in flight)"""
+    # Only the geometry goes to the workers, attributes stay in this process
+    row_data = [(idx, row['_vertices'], row['_faces'], row.get('_origin')) for idx, row in enumerate(chunk_data)]
+    
+    # Scale batch size and in-flight batches to the memory budget
+    chunk_bytes = sum(building_bytes(vertices, faces) for _, vertices, faces, _ in row_data)
+    active_workers, planned_batch_size, max_in_flight = plan_parallelism(chunk_bytes, len(row_data), num_workers,
+                                                                         max_chunk_bytes)
+    # A calibrated batch size is used as long as the memory budget allows it
+    if batch_size is None or (max_chunk_bytes and batch_size > planned_batch_size):
+        batch_size = planned_batch_size
+    batches = [row_data[i:i + batch_size] for i in range(0, len(row_data), batch_size)]
+    return batches, active_workers, batch_size, max_in_flight
 
-def read_gdb_buildings_chunked(gdb_path, layer_name='Building_solid', chunk_size=CHUNK_SIZE, limit=None):
-    """Read buildings from GDB file in chunks using Fiona"""
-    logger = logging.getLogger(__name__)
-    logger.info(f"Reading buildings from {gdb_path}, layer: {layer_name}")
-    
-    try:
-        # List available layers
-        layers = fiona.listlayers(gdb_path)
-        logger.info(f"Available layers: {layers}")
-        
-        # Find the correct layer name
-        actual_layer = None
-        for layer in layers:
-            if layer_name in layer or layer in layer_name:
-                actual_layer = layer
-                break
-        
-        if not actual_layer:
-            logger.error(f"Layer '{layer_name}' not found. Available: {layers}")
-            raise ValueError(f"Layer not found")
-        
-        logger.info(f"Using layer: {actual_layer}")
-        
-        # Read features in chunks
-        with fiona.open(gdb_path, layer=actual_layer) as src:
-            logger.info(f"Layer CRS: {src.crs}")
-            logger.info(f"Layer bounds: {src.bounds}")
-            
-            chunk = []
-            chunk_num = 0
-            total_count = 0
-            
-            for feature in src:
-                if limit and total_count >= limit:
-                    if chunk:  # Yield remaining chunk
-                        yield chunk_num, chunk
-                    break
-                
-                # Extract properties and geometry
-                properties = dict(feature['properties'])
-                geometry = feature.get('geometry')
-                
-                # Parse multipatch geometry
-                vertices, faces = parse_multipatch_geometry(geometry)
-                
-                # Store parsed data
-                properties['_vertices'] = vertices
-                properties['_faces'] = faces
-                properties['_geometry_type'] = geometry.get('type') if geometry else None
-                
-                chunk.append(properties)
-                total_count += 1
-                
-                if total_count % 100 == 0:
-                    logger.info(f"Read {total_count} buildings...")
-                
-                # Yield chunk when it reaches chunk_size
-                if len(chunk) >= chunk_size:
-                    yield chunk_num, chunk
-                    chunk = []
-                    chunk_num += 1
-                    gc.collect()  # Force garbage collection
-            
-            # Yield final chunk if any remaining
-            if chunk:
-                yield chunk_num, chunk
-        
-    except Exception as e:
-        logger.error(f"Error reading GDB: {str(e)}")
-        raise
+def submit_batch(executor, batch, chunk_data, weld_tolerance=DEFAULT_WELD_TOLERANCE, stages=ALL_STAGES):
+    """Submit a worker batch - buildings of a geometry cache go as a row range the worker maps itself"""
+    first = chunk_data[batch[0][0]]
+    if first.get('_cache_row') is not None:
+        return executor.submit(process_cached_batch, first['_cache_path'], first['_cache_row'], batch[0][0],
+                               len(batch), weld_tolerance, stages)
+    return executor.submit(process_building_batch, batch, weld_tolerance, stages)
 
-def process_single_building(row_data):
-    """Process a single building - runs in parallel"""
-    idx, row = row_data
-    result = dict(row)
-    
+def collect_batch_results(future, batch, records, chunk_num, progress=None):
+    """Store the records of a finished batch (failed records if the task raised) - returns the count"""
     try:
-        # Get pre-parsed geometry data
-        vertices = row.get('_vertices', [])
-        faces = row.get('_faces', [])
-        
-        # Validate that vertices and faces are lists
-        if not isinstance(vertices, list):
-            result['processing_status'] = 'failed'
-            result['processing_error'] = f'Invalid vertices type: {type(vertices).__name__}'
-            result['mesh_process_error'] = 'Vertices must be a list'
-            return idx, result
-            
-        if not isinstance(faces, list):
-            result['processing_status'] = 'failed'
-            result['processing_error'] = f'Invalid faces type: {type(faces).__name__}'
-            result['mesh_process_error'] = 'Faces must be a list'
-            return idx, result
-        
-        if not vertices or not faces:
-            result['processing_status'] = 'failed'
-            result['processing_error'] = 'No geometry data'
-            result['mesh_process_error'] = f'Empty vertices ({len(vertices)}) or faces ({len(faces)})'
-            return idx, result
-        
-        # Step 1: Mesh repair and volume calculation
-        mesh_results = process_building_mesh(vertices, faces)
-        result.update(mesh_results)
-        
-        # Step 2: Surface analysis (only if mesh processing succeeded)
-        if mesh_results.get('mesh_volume') is not None:
-            surface_results = analyze_building_surfaces(vertices, faces)
-            result.update(surface_results)
-        
-        result['processing_status'] = 'success'
-        
+        results = future.result()
     except Exception as e:
-        result['processing_status'] = 'failed'
-        result['processing_error'] = str(e)
-        result['mesh_process_error'] = str(e)
-    
-    # Remove internal fields
-    result.pop('_vertices', None)
-    result.pop('_faces', None)
-    result.pop('_geometry_type', None)
-    
-    return idx, result
+        logging.getLogger(__name__).error(f"Error processing batch in chunk {chunk_num}, idx {batch[0][0]}: {str(e)}")
+        for idx, _, _, _ in batch:
+            records[idx] = failed_record(ErrorCode.WORKER_ERROR, str(e))
+        if progress is not None:
+            progress.advance('process', count=len(batch), failed=len(batch))
+        return 0
+    
+    for idx, record, busy_seconds in results:
+        records[idx] = record
+        if progress is not None:
+            progress.advance('process', failed=record[0] != Status.SUCCESS, busy_seconds=busy_seconds)
+    return len(results)
 
-def process_chunk_parallel(chunk_data, chunk_num, num_workers=None):
+def process_chunk_parallel(chunk_data, chunk_num, num_workers=None, progress=None, executor=None,
+                           max_chunk_bytes=None, weld_tolerance=DEFAULT_WELD_TOLERANCE, stages=ALL_STAGES,
+                           monitor=None, batch_size=None):
     """Process a chunk of buildings in parallel"""
     logger = logging.getLogger(__name__)
     
     if num_workers is None:
-        num_workers = min(os.cpu_count() - 1, 8)
-    
-    logger.info(f"Processing chunk {chunk_num} with {len(chunk_data)} buildings using {num_workers} workers")
+        num_workers = default_worker_count()
     
-    results = {}
     total = len(chunk_data)
+    records = [None] * total
     processed = 0
+    batches, active_workers, batch_size, max_in_flight = plan_chunk_batches(chunk_data, num_workers,
+                                                                            max_chunk_bytes, batch_size)
     
-    # Prepare data for parallel processing - chunk_data is already a list of dicts
-    row_data = [(idx, row) for idx, row in enumerate(chunk_data)]
+    logger.info(f"Processing chunk {chunk_num} with {total} buildings using {active_workers} workers "
+                f"({len(batches)} batches of up to {batch_size}, max {max_in_flight} in flight)")
+    if progress is not None:
+        progress.set_workers(active_workers)
     
-    with ProcessPoolExecutor(max_workers=num_workers) as executor:
-        # Submit all tasks
-        future_to_idx = {executor.submit(process_single_building, data): data[0] 
-                        for data in row_data}
+    # Reuse the caller's pool, otherwise start one for this chunk only
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=active_workers, initializer=init_worker)
+        if monitor is not None:
+            monitor.attach(executor)
+    
+    try:
+        pending = {}
+        next_batch = 0
         
-        # Process completed tasks
-        for future in as_completed(future_to_idx):
-            idx = future_to_idx[future]
-            try:
-                idx, result = future.result()
-                results[idx] = result
-                processed += 1
-                
-                if processed % 1000 == 0:
-                    logger.info(f"Chunk {chunk_num}: Processed {processed}/{total} buildings")
-                    
-            except Exception as e:
-                logger.error(f"Error processing building in chunk {chunk_num}, idx {idx}: {str(e)}")
-                results[idx] = {'processing_status': 'failed', 'processing_error': str(e)}
-    
-    return results
+        while next_batch < len(batches) or pending:
+            # Keep at most max_in_flight batches submitted (fewer while the watchdog throttles)
+            in_flight_limit = monitor.throttle(max_in_flight) if monitor is not None else max_in_flight
+            while next_batch < len(batches) and len(pending) < in_flight_limit:
+                batch = batches[next_batch]
+                pending[submit_batch(executor, batch, chunk_data, weld_tolerance, stages)] = batch
+                next_batch += 1
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                processed += collect_batch_results(future, pending.pop(future), records, chunk_num, progress)
+    finally:
+        if own_executor:
+            executor.shutdown()
+    
+    logger.info(f"Chunk {chunk_num}: Processed {processed}/{total} buildings")
+    
+    return records
 
-def save_chunk_results(results, output_path, chunk_num):
-    """Save chunk results to CSV"""
+def save_chunk_results(chunk_data, records, output_path, chunk_num, progress=None, columns=None,
+                       aggregators=None, writers=None):
+    """Save chunk attributes and result records to CSV"""
+    from result_schema import build_results_frame
     logger = logging.getLogger(__name__)
     
-    # Convert results to DataFrame
-    df_results = pd.DataFrame.from_dict(results, orient='index')
+    # Convert results to a typed DataFrame (only the columns of the requested metrics)
+    df_results = build_results_frame(chunk_data, records, columns)
+    
+    # Merge this chunk into the running aggregates
+    if aggregators:
+        from aggregation import building_centroids
+        centroids = None
+        if any(aggregator.needs_centroids() for aggregator in aggregators):
+            centroids = building_centroids(chunk_data)
+        for aggregator in aggregators:
+            aggregator.update(df_results, centroids)
+    
+    # Pass the chunk to the additional outputs (results store, database, partitions)
+    for writer in writers or []:
+        writer.write_chunk(df_results, chunk_data)
     
     # Save as CSV
     csv_path = output_path.parent / f"{output_path.stem}_chunk_{chunk_num:04d}.csv"
     df_results.to_csv(csv_path, index=False)
     logger.info(f"Saved chunk {chunk_num} with {len(df_results)} records to {csv_path}")
+    if progress is not None:
+        progress.advance('write', count=len(df_results))
     
     # Return summary statistics with safe field access
     successful = 0
     volumes_calculated = 0
     
     if 'processing_status' in df_results.columns:
-        successful = df_results['processing_status'].value_counts().get('success', 0)
+        successful = int((df_results['processing_status'] == Status.SUCCESS).sum())
     
     if 'mesh_volume' in df_results.columns:
         volumes_calculated = df_results['mesh_volume'].notna().sum()
@@ -311,8 +198,10 @@ def save_chunk_results(results, output_path, chunk_num):
         'csv_path': csv_path
     }
 
-def merge_chunk_results(chunk_summaries, output_path):
+def merge_chunk_results(chunk_summaries, output_path, readable=False):
     """Merge all chunk CSVs into final CSV file"""
+    import pandas as pd
+    from result_schema import decode_results, result_read_dtypes
     logger = logging.getLogger(__name__)
     logger.info("Merging all chunks into final CSV file...")
     
@@ -320,7 +209,8 @@ def merge_chunk_results(chunk_summaries, output_path):
     all_data = []
     for summary in chunk_summaries:
         csv_path = summary['csv_path']
-        chunk_df = pd.read_csv(csv_path)
+        header = pd.read_csv(csv_path, nrows=0).columns
+        chunk_df = pd.read_csv(csv_path, dtype=result_read_dtypes(header))
         all_data.append(chunk_df)
         logger.info(f"Loaded {len(chunk_df)} records from {csv_path.name}")
     
@@ -329,7 +219,7 @@ def merge_chunk_results(chunk_summaries, output_path):
     
     # Save complete CSV
     final_csv_path = output_path.with_suffix('.csv')
-    final_df.to_csv(final_csv_path, index=False)
+    (decode_results(final_df) if readable else final_df).to_csv(final_csv_path, index=False)
     logger.info(f"Saved complete CSV with {len(final_df)} records to {final_csv_path}")
     
     # Calculate final statistics with safe field access
@@ -338,7 +228,7 @@ def merge_chunk_results(chunk_summaries, output_path):
     volumes_calculated = 0
     
     if 'processing_status' in final_df.columns:
-        successful = final_df['processing_status'].value_counts().get('success', 0)
+        successful = int((final_df['processing_status'] == Status.SUCCESS).sum())
     
     if 'mesh_volume' in final_df.columns:
         volumes_calculated = final_df['mesh_volume'].notna().sum()
@@ -367,19 +257,76 @@ def merge_chunk_results(chunk_summaries, output_path):
 
 def main():
     """Main processing function"""
-    parser = argparse.ArgumentParser(description='Process Swisstopo 3D building data')
-    parser.add_argument('input_gdb', help='Path to input GDB file')
+    # Dispatch subcommands, everything else is a processing run
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        import importlib
+        command = importlib.import_module(SUBCOMMANDS[sys.argv[1]])
+        sys.exit(command.main(sys.argv[2:]))
+    
+    parser = argparse.ArgumentParser(description='Process Swisstopo 3D building data',
+                                     epilog=f"Subcommands: {', '.join(SUBCOMMANDS)} (see main.py <subcommand> --help)")
+    parser.add_argument('input_gdb', help='Path to input GDB file (or a geometry cache, see main.py convert --help)')
     parser.add_argument('output_dir', help='Output directory for results')
     parser.add_argument('--layer', default='Building_solid', help='GDB layer name')
     parser.add_argument('--limit', type=int, help='Limit number of buildings to process')
     parser.add_argument('--workers', type=int, help='Number of parallel workers')
     parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, 
                        help=f'Number of buildings per chunk (default: {CHUNK_SIZE})')
+    parser.add_argument('--max-chunk-mem', type=parse_size,
+                       help='Memory budget per chunk, e.g. 2G or 512M; chunks end at whichever of '
+                            '--chunk-size and this budget is reached first')
     parser.add_argument('--keep-chunks', action='store_true', 
                        help='Keep individual chunk CSV files after merging')
+    parser.add_argument('--readable', action='store_true',
+                       help='Write status, error and repair steps as text instead of codes in the final CSV')
+    parser.add_argument('--reader', choices=READERS,
+                       help='Input reader: fiona, arrow (pyogrio Arrow batches with WKB geometry), citygml or '
+                            'cityjson (default: by file type, fiona for GDB and other GDAL formats)')
+    parser.add_argument('--metrics', type=parse_metrics, default=None,
+                       help='Comma separated outputs to compute: volume, footprint, roof, walls, area, faces, '
+                            'height, or the groups surfaces and all (default: all)')
+    parser.add_argument('--aggregate', type=parse_group_keys, action='append', default=[],
+                       help='Aggregate the metrics per group while processing, e.g. GEMEINDE, tile:1000 '
+                            '(LV95 tiles in meters) or size (footprint size class); keys can be combined '
+                            'with commas and the option repeated')
+    parser.add_argument('--store', action='store_true',
+                       help='Also write an indexed, memory-mapped results store for ID and location queries '
+                            '(see main.py query --help)')
+    parser.add_argument('--database', choices=('gpkg', 'sqlite'),
+                       help='Also write the results into a GeoPackage (with centroid points) or SQLite database')
+    parser.add_argument('--partition-by', type=parse_group_keys,
+                       help='Also write Hive-style partitioned Parquet files by these keys, e.g. KT, GEMEINDE, '
+                            'tile:10000 or size')
+    parser.add_argument('--memory-limit', type=parse_size,
+                       help='Total RSS of orchestrator and workers to stay under, e.g. 16G; in-flight work '
+                            'is lowered near the limit and raised again afterwards')
+    parser.add_argument('--tracemalloc', type=int, default=0, metavar='N',
+                       help='Log the top N allocators of the orchestrator after every chunk (slower)')
+    parser.add_argument('--autotune', action='store_true',
+                       help='Use the saved calibration of this machine for worker count and batch size, '
+                            'or calibrate on a sample of the layer first (see main.py autotune --help)')
+    parser.add_argument('--retune', action='store_true', help='Calibrate again even if settings are saved')
+    parser.add_argument('--tune-file', help='Calibration settings file (default: ~/.swissbuildings3d/autotune.json)')
+    parser.add_argument('--weld-tolerance', type=float, default=DEFAULT_WELD_TOLERANCE,
+                       help=f'Distance in meters below which vertices are welded (default: {DEFAULT_WELD_TOLERANCE:g})')
+    parser.add_argument('--progress-interval', type=float, default=DEFAULT_INTERVAL,
+                       help=f'Seconds between progress reports (default: {DEFAULT_INTERVAL:g})')
     
     args = parser.parse_args()
     
+    # Groupings that would put every building in one group are rejected up front
+    attributes = None
+    if args.aggregate or args.partition_by:
+        try:
+            attributes = input_attributes(Path(args.input_gdb), args.layer, args.reader)
+        except Exception:
+            attributes = None  # Unreadable inputs are reported by the run itself
+        try:
+            for keys in args.aggregate + ([args.partition_by] if args.partition_by else []):
+                validate_group_keys(keys, plan_metrics(args.metrics)['columns'], attributes)
+        except ValueError as e:
+            parser.error(str(e))
+    
     # Setup paths
     input_path = Path(args.input_gdb)
     output_dir = Path(args.output_dir)
@@ -391,47 +338,120 @@ def main():
     logger.info(f"Input: {input_path}")
     logger.info(f"Output: {output_dir}")
     logger.info(f"Chunk size: {args.chunk_size}")
+    if args.max_chunk_mem:
+        logger.info(f"Chunk memory budget: {args.max_chunk_mem / 1024 ** 2:.0f} MB")
+    if args.memory_limit:
+        logger.info(f"Memory limit: {args.memory_limit / 1024 ** 2:.0f} MB")
+    logger.info(f"Weld tolerance: {args.weld_tolerance:g} m")
+    plan = plan_metrics(args.metrics)
+    logger.info(f"Metrics: {describe_plan(plan)} (stages: {', '.join(plan['stages'])})")
+    logger.info(f"Orchestrator startup: {time.perf_counter() - _IMPORT_START:.2f}s")
     
     start_time = time.time()
+    batch_size = None
+    if args.autotune or args.retune:
+        from autotune import tuned_settings, DEFAULT_TUNE_FILE
+        settings = tuned_settings(input_path, args.layer, args.tune_file or DEFAULT_TUNE_FILE, args.retune,
+                                  stages=plan['stages'], weld_tolerance=args.weld_tolerance,
+                                  reader=args.reader)
+        num_workers = args.workers or settings['workers']
+        batch_size = settings['batch_size']
+    else:
+        num_workers = args.workers or default_worker_count()
+    logger.info(f"Workers: {num_workers}")
+    progress = ProgressTracker(status_path=output_dir / STATUS_FILE_NAME,
+                               interval=args.progress_interval, num_workers=num_workers,
+                               metrics=describe_plan(plan))
+    monitor = MemoryMonitor(args.memory_limit, args.tracemalloc)
+    executor = None
+    chunk_summaries = []
+    
+    # Streaming aggregates of the float metric columns, one per --aggregate grouping
+    aggregate_columns = [name for name in plan['columns'] if RESULT_DTYPES[name].startswith('float')]
+    aggregators = [GroupAggregator(keys, aggregate_columns) for keys in args.aggregate]
+    writers = []
     
     try:
+        # Start the worker pool once and reuse it for every chunk
+        executor = start_worker_pool(num_workers)
+        monitor.attach(executor)
+        
         # Process chunks
-        chunk_summaries = []
         output_path = output_dir / f'building_analysis_{time.strftime("%Y%m%d_%H%M%S")}'
         
+        if args.store:
+            from results_store import ResultsStoreWriter
+            writers.append(ResultsStoreWriter(output_path.parent / f"{output_path.name}_store"))
+        if args.database:
+            from sqlite_writer import SqliteResultsWriter
+            writers.append(SqliteResultsWriter(output_path.with_suffix(f'.{args.database}'),
+                                               geopackage=args.database == 'gpkg'))
+        if args.partition_by:
+            from partitioned_writer import PartitionedWriter
+            writers.append(PartitionedWriter(output_path.parent / f"{output_path.name}_partitioned",
+                                             args.partition_by, attribute_types=attributes))
+        
+        # Select the reader backend
+        read_chunks = select_reader(input_path, args.reader)
+        
         # Process each chunk
-        for chunk_num, chunk_data in read_gdb_buildings_chunked(
-            input_path, args.layer, args.chunk_size, args.limit
+        for chunk_num, chunk_data in read_chunks(
+            input_path, args.layer, args.chunk_size, args.limit, progress, args.max_chunk_mem
         ):
             logger.info(f"\n=== Processing chunk {chunk_num} ===")
+            monitor.mark('read')
             
             # Process chunk directly without DataFrame conversion
-            results = process_chunk_parallel(chunk_data, chunk_num, args.workers)
+            records = process_chunk_parallel(chunk_data, chunk_num, num_workers, progress, executor,
+                                             args.max_chunk_mem, args.weld_tolerance, plan['stages'],
+                                             monitor, batch_size)
+            monitor.mark('process')
             
             # Save chunk results
-            summary = save_chunk_results(results, output_path, chunk_num)
+            summary = save_chunk_results(chunk_data, records, output_path, chunk_num, progress,
+                                         plan['columns'], aggregators, writers)
             chunk_summaries.append(summary)
+            monitor.mark('write')
             
             # Force garbage collection
             del chunk_data
-            del results
+            del records
             gc.collect()
+            monitor.log_chunk(chunk_num)
+            progress.set_memory(monitor.summary())
             
             logger.info(f"Chunk {chunk_num} complete. Memory cleaned.")
         
         # Merge all chunks into final output
         if chunk_summaries:
-            merge_chunk_results(chunk_summaries, output_path)
+            merge_chunk_results(chunk_summaries, output_path, args.readable)
             
             if args.keep_chunks:
                 logger.info("Keeping individual chunk files as requested")
         
+        for aggregator in aggregators:
+            suffix = '_'.join(key.replace(':', '') for key in aggregator.keys)
+            aggregator.write(output_path.parent / f"{output_path.name}_aggregates_{suffix}.csv")
+        
+        for writer in writers:
+            writer.finish()
+        
     except Exception as e:
         logger.error(f"Processing failed: {str(e)}", exc_info=True)
         sys.exit(1)
+    finally:
+        if executor is not None:
+            monitor.sample()
+            executor.shutdown()
+        monitor.log_summary()
+        progress.set_memory(monitor.summary())
+        progress.close()
     
     elapsed_time = time.time() - start_time
     logger.info(f"\nProcessing completed in {elapsed_time:.1f} seconds ({elapsed_time/60:.1f} minutes)")
+    processed = sum(summary['total'] for summary in chunk_summaries)
+    if elapsed_time > 0:
+        logger.info(f"Throughput for metrics {describe_plan(plan)}: {processed / elapsed_time:.1f} buildings/s")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+Memory monitoring module
+Samples the resident memory (RSS) and peak RSS of the orchestrator and the pool workers
+at every stage of a chunk, optionally lists the top tracemalloc allocators, and throttles
+the batches in flight when the total RSS approaches a configured limit
+"""
+
+import os
+import gc
+import sys
+import time
+import logging
+
+HIGH_WATER = 0.90  # Share of the limit above which in-flight work is halved
+LOW_WATER = 0.70  # Share of the limit below which it is raised again
+SAMPLE_INTERVAL = 1.0  # Seconds between watchdog samples
+ADJUST_COOLDOWN = 5.0  # Seconds between two watchdog decisions
+DEFAULT_TRACEMALLOC_FRAMES = 1  # Allocation site only, keeps tracing overhead low
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def read_proc_status(pid):
+    """(rss, peak rss) in bytes from /proc/<pid>/status (Linux) - None values when unavailable"""
+    values = {}
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    key, amount = line.split(':', 1)
+                    values[key] = int(amount.split()[0]) * 1024
+    except OSError:
+        return None, None
+    return values.get('VmRSS'), values.get('VmHWM')
+
+
+def process_memory(pid=None):
+    """(rss, peak rss) in bytes of a process (this one by default) - None values when unknown"""
+    pid = pid or os.getpid()
+    rss, peak = read_proc_status(pid)
+    if rss is None and psutil is not None:
+        try:
+            info = psutil.Process(pid).memory_info()
+            rss, peak = info.rss, getattr(info, 'peak_wset', None)  # peak_wset on Windows
+        except psutil.Error:
+            pass
+    if peak is None and pid == os.getpid() and sys.platform != 'win32':
+        import resource
+        scale = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    return rss, peak
+
+
+def format_bytes(value):
+    """Human readable size"""
+    if value is None:
+        return '?'
+    if value >= 1024 ** 3:
+        return f"{value / 1024 ** 3:.2f} GB"
+    return f"{value / 1024 ** 2:.0f} MB"
+
+
+class MemoryMonitor:
+    """Per-stage memory instrumentation and RSS watchdog for one run
+
+    limit is the total RSS (orchestrator plus workers) to stay under; without a limit
+    only the instrumentation runs. tracemalloc_top > 0 logs the top allocators of the
+    orchestrator after every chunk.
+    """
+
+    def __init__(self, limit=None, tracemalloc_top=0):
+        self.logger = logging.getLogger(__name__)
+        self.limit = limit
+        self.tracemalloc_top = tracemalloc_top
+        self.executor = None
+        self.stages = {}  # stage -> latest sample of the current chunk
+        self.worker_peaks = {}  # pid -> highest RSS seen
+        self.parent_peak = 0
+        self.in_flight = None  # Throttled in-flight limit, None when not throttled
+        self._last_sample = 0.0
+        self._last_adjust = 0.0
+        self._last_total = None
+
+        if tracemalloc_top:
+            import tracemalloc
+            tracemalloc.start(DEFAULT_TRACEMALLOC_FRAMES)
+        if psutil is None and not os.path.exists(f'/proc/{os.getpid()}/status'):
+            self.logger.warning("psutil not installed, worker memory is not monitored")
+
+    def attach(self, executor):
+        """Monitor the worker processes of a pool"""
+        self.executor = executor
+
+    def worker_pids(self):
+        """PIDs of the pool workers (ProcessPoolExecutor keeps them in _processes)"""
+        processes = getattr(self.executor, '_processes', None) or {}
+        return list(processes)
+
+    def sample(self):
+        """Current memory of the orchestrator and the workers"""
+        parent_rss, parent_peak = process_memory()
+        workers = {}
+        for pid in self.worker_pids():
+            rss, peak = process_memory(pid)
+            if rss is None:
+                continue
+            self.worker_peaks[pid] = max(self.worker_peaks.get(pid, 0), peak or rss)
+            workers[pid] = rss
+        self.parent_peak = max(self.parent_peak, parent_peak or parent_rss or 0)
+        total = (parent_rss or 0) + sum(workers.values())
+        self._last_total = total
+        return {
+            'parent_rss': parent_rss,
+            'parent_peak': parent_peak,
+            'workers_rss': sum(workers.values()),
+            'worker_max_rss': max(workers.values()) if workers else None,
+            'total_rss': total,
+        }
+
+    def mark(self, stage):
+        """Sample memory at the end of a stage of the current chunk"""
+        self.stages[stage] = self.sample()
+
+    def log_chunk(self, chunk_num):
+        """Log the stage samples of a chunk (and the top allocators) and start the next chunk"""
+        parts = []
+        for stage, sample in self.stages.items():
+            text = f"{stage}: parent {format_bytes(sample['parent_rss'])}"
+            if sample['worker_max_rss'] is not None:
+                text += (f", workers {format_bytes(sample['workers_rss'])} "
+                         f"(max {format_bytes(sample['worker_max_rss'])})")
+            parts.append(text)
+        if parts:
+            self.logger.info(f"Memory chunk {chunk_num} - " + " | ".join(parts))
+        self.stages = {}
+
+        if self.tracemalloc_top:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ])
+            lines = [f"Top {self.tracemalloc_top} allocators after chunk {chunk_num}:"]
+            for stat in snapshot.statistics('lineno')[:self.tracemalloc_top]:
+                frame = stat.traceback[0]
+                lines.append(f"  {frame.filename}:{frame.lineno} - {format_bytes(stat.size)} in {stat.count} blocks")
+            self.logger.info("\n".join(lines))
+
+    def throttle(self, planned):
+        """In-flight batch limit to use now - the planned value unless memory is close to the limit"""
+        if not self.limit:
+            return planned
+        now = time.time()
+        if now - self._last_sample >= SAMPLE_INTERVAL:
+            self._last_sample = now
+            self.sample()
+        if now - self._last_adjust < ADJUST_COOLDOWN or self._last_total is None:
+            return min(self.in_flight or planned, planned)
+
+        current = min(self.in_flight or planned, planned)
+        usage = self._last_total / self.limit
+        if usage >= HIGH_WATER and current > 1:
+            lowered = max(current // 2, 1)
+            gc.collect()
+            self.logger.warning(f"Memory {format_bytes(self._last_total)} of {format_bytes(self.limit)} limit: "
+                                f"lowering in-flight batches {current} -> {lowered}")
+            self.in_flight = lowered
+            self._last_adjust = now
+        elif usage <= LOW_WATER and self.in_flight is not None:
+            raised = min(self.in_flight * 2, planned)
+            self.logger.info(f"Memory {format_bytes(self._last_total)} of {format_bytes(self.limit)} limit: "
+                             f"raising in-flight batches {current} -> {raised}")
+            self.in_flight = None if raised >= planned else raised
+            self._last_adjust = now
+        return min(self.in_flight or planned, planned)
+
+    def summary(self):
+        """Peak memory so far, for the progress file"""
+        return {
+            'parent_peak_bytes': self.parent_peak,
+            'worker_peak_bytes': {str(pid): peak for pid, peak in self.worker_peaks.items()},
+            'total_rss_bytes': self._last_total,
+            'limit_bytes': self.limit,
+            'in_flight_limit': self.in_flight,
+        }
+
+    def log_summary(self):
+        """Log the peak memory of the run"""
+        worker_peaks = list(self.worker_peaks.values())
+        text = f"Peak memory: orchestrator {format_bytes(self.parent_peak)}"
+        if worker_peaks:
+            text += (f", workers max {format_bytes(max(worker_peaks))} "
+                     f"(sum of peaks {format_bytes(sum(worker_peaks))})")
+        self.logger.info(text)
@@ -7,9 +7,19 @@ import numpy as np
 import trimesh
 import logging
 
-def repair_mesh(mesh):
-    """Repair mesh to make it watertight"""
-    repair_steps = []
+from result_schema import RepairStep
+from boundary_repair import cap_boundary_loops
+
+def remove_degenerate_faces(mesh):
+    """Remove zero-area faces (trimesh 4 replaced remove_degenerate_faces)"""
+    if hasattr(mesh, 'nondegenerate_faces'):
+        mesh.update_faces(mesh.nondegenerate_faces())
+    else:
+        mesh.remove_degenerate_faces()
+
+def repair_mesh(mesh, cap_holes=True):
+    """Repair mesh to make it watertight - returns (is_watertight, volume, RepairStep flags)"""
+    repair_steps = RepairStep(0)
     
     try:
         # Skip visual processing
@@ -20,69 +30,81 @@ def repair_mesh(mesh):
             volume = float(mesh.volume)
             # Handle negative volume (inside-out mesh)
             if volume < 0:
-                repair_steps.append("Mesh is inside-out, taking absolute value")
+                repair_steps |= RepairStep.INSIDE_OUT
                 volume = abs(volume)
-            return True, volume, ["Already watertight"]
+            return True, volume, repair_steps | RepairStep.ALREADY_WATERTIGHT
         
-        # Step 1: Merge duplicate vertices
-        initial_vertices = len(mesh.vertices)
-        mesh.merge_vertices(digits=5)
-        merged = initial_vertices - len(mesh.vertices)
-        if merged > 0:
-            repair_steps.append(f"Merged {merged} duplicate vertices")
+        # Step 1: Duplicate vertices are already welded by welding.weld_vertices
         
-        # Step 2: Remove degenerate faces
+        # Step 2: Cap planar boundary loops (missing floor slabs, roof patches)
+        if cap_holes:
+            faces, capped, _ = cap_boundary_loops(mesh.vertices, mesh.faces)
+            if capped:
+                mesh.faces = faces
+                repair_steps |= RepairStep.CAPPED_HOLES
+                
+                # Caps follow the winding of their neighbors, so the other steps can be skipped
+                if mesh.is_watertight and mesh.is_winding_consistent:
+                    repair_steps |= RepairStep.WATERTIGHT_AFTER_FULL
+                    volume = float(mesh.volume)
+                    if volume < 0:
+                        repair_steps |= RepairStep.INSIDE_OUT
+                        volume = abs(volume)
+                    return True, volume, repair_steps
+        
+        # Step 3: Remove degenerate faces
         initial_faces = len(mesh.faces)
-        mesh.remove_degenerate_faces()
+        remove_degenerate_faces(mesh)
         removed = initial_faces - len(mesh.faces)
         if removed > 0:
-            repair_steps.append(f"Removed {removed} degenerate faces")
+            repair_steps |= RepairStep.REMOVED_DEGENERATE
         
-        # Step 3: Fix normals
+        # Step 4: Fix normals
         mesh.fix_normals()
-        repair_steps.append("Fixed normals")
+        repair_steps |= RepairStep.FIXED_NORMALS
         
         # Check if watertight now
         if mesh.is_watertight:
-            repair_steps.append("Watertight after basic repairs")
+            repair_steps |= RepairStep.WATERTIGHT_AFTER_BASIC
             volume = float(mesh.volume)
             # Handle negative volume
             if volume < 0:
-                repair_steps.append("Mesh is inside-out, taking absolute value")
+                repair_steps |= RepairStep.INSIDE_OUT
                 volume = abs(volume)
             return True, volume, repair_steps
         
-        # Step 4: Fill holes
+        # Step 5: Fill remaining small holes
         mesh.fill_holes()
-        repair_steps.append("Filled holes")
+        repair_steps |= RepairStep.FILLED_HOLES
         
-        # Step 5: Final cleanup
-        mesh.remove_degenerate_faces()
+        # Step 6: Final cleanup
+        remove_degenerate_faces(mesh)
         mesh.remove_unreferenced_vertices()
         
         # Final check
         if mesh.is_watertight:
-            repair_steps.append("Watertight after full repair")
+            repair_steps |= RepairStep.WATERTIGHT_AFTER_FULL
             volume = float(mesh.volume)
             # Handle negative volume
             if volume < 0:
-                repair_steps.append("Mesh is inside-out, taking absolute value")
+                repair_steps |= RepairStep.INSIDE_OUT
                 volume = abs(volume)
             return True, volume, repair_steps
         else:
-            repair_steps.append("Still not watertight after repair")
+            repair_steps |= RepairStep.NOT_WATERTIGHT
             # Try to get volume anyway - trimesh can sometimes calculate volume for non-watertight meshes
             try:
                 volume = float(mesh.volume)
                 if volume < 0:
                     volume = abs(volume)
-                repair_steps.append(f"Calculated volume despite non-watertight: {volume:.2f} m³")
+                repair_steps |= RepairStep.VOLUME_NOT_WATERTIGHT
                 return False, volume, repair_steps
             except:
                 return False, None, repair_steps
             
     except Exception as e:
-        repair_steps.append(f"Repair error: {str(e)}")
+        repair_steps |= RepairStep.REPAIR_ERROR
+        logging.debug(f"Mesh repair error: {str(e)}")
         return False, None, repair_steps
 
 def process_building_mesh(vertices, faces):
@@ -93,22 +115,22 @@ def process_building_mesh(vertices, faces):
         'mesh_vertex_count': None,
         'mesh_face_count': None,
         'mesh_repair_applied': False,
-        'mesh_repair_steps': None,
+        'mesh_repair_flags': None,
         'mesh_process_error': None,
         'mesh_orientation_fixed': False
     }
     
     try:
         # Validate input
-        if not vertices or not faces:
+        if len(vertices) == 0 or len(faces) == 0:
             result['mesh_process_error'] = "No vertices or faces provided"
             return result
         
-        # Create trimesh
+        # Create trimesh (vertices are welded beforehand)
         mesh = trimesh.Trimesh(
-            vertices=np.array(vertices),
-            faces=np.array(faces),
-            process=True  # Merge duplicate vertices
+            vertices=np.asarray(vertices, dtype=np.float64),
+            faces=np.asarray(faces, dtype=np.int64),
+            process=False
         )
         
         # Store mesh statistics
@@ -122,10 +144,10 @@ def process_building_mesh(vertices, faces):
             if volume < 0:
                 result['mesh_volume'] = abs(volume)
                 result['mesh_orientation_fixed'] = True
-                result['mesh_repair_steps'] = "Already watertight - fixed inside-out orientation"
+                result['mesh_repair_flags'] = int(RepairStep.ALREADY_WATERTIGHT | RepairStep.INSIDE_OUT)
             else:
                 result['mesh_volume'] = volume
-                result['mesh_repair_steps'] = "Already watertight - no repair needed"
+                result['mesh_repair_flags'] = int(RepairStep.ALREADY_WATERTIGHT)
             result['mesh_is_watertight'] = True
         else:
             # Attempt repair
@@ -134,10 +156,10 @@ def process_building_mesh(vertices, faces):
             
             result['mesh_is_watertight'] = is_watertight
             result['mesh_volume'] = volume
-            result['mesh_repair_steps'] = " | ".join(repair_steps)
+            result['mesh_repair_flags'] = int(repair_steps)
             
             # Check if orientation was fixed
-            if volume is not None and "inside-out" in result['mesh_repair_steps']:
+            if volume is not None and repair_steps & RepairStep.INSIDE_OUT:
                 result['mesh_orientation_fixed'] = True
         
     except Exception as e:
@@ -0,0 +1,79 @@
+"""
+Metric selection module
+Maps the requested output metrics to the processing stages and result columns they need,
+so a run only builds meshes, repairs or classifies faces when its outputs require it
+"""
+
+# Stages a worker can run for a building
+STAGE_MESH = 'mesh'  # trimesh construction, repair and volume
+STAGE_SURFACES = 'surfaces'  # Face classification and areas
+STAGE_ELEVATION = 'elevation'  # Heights from the vertices only
+ALL_STAGES = (STAGE_MESH, STAGE_SURFACES)
+
+# Metric name -> (stage, result columns)
+METRICS = {
+    'volume': (STAGE_MESH, ['mesh_volume', 'mesh_is_watertight', 'mesh_vertex_count', 'mesh_face_count',
+                            'mesh_merged_vertices', 'mesh_repair_applied', 'mesh_repair_flags', 'mesh_orientation_fixed']),
+    'footprint': (STAGE_SURFACES, ['surf_footprint_area']),
+    'roof': (STAGE_SURFACES, ['surf_roof_area', 'surf_sloped_area', 'surf_roof_complexity']),
+    'walls': (STAGE_SURFACES, ['surf_wall_area', 'surf_wall_perimeter']),
+    'area': (STAGE_SURFACES, ['surf_total_area']),
+    'faces': (STAGE_SURFACES, ['surf_horizontal_faces', 'surf_vertical_faces', 'surf_sloped_faces']),
+    'height': (STAGE_ELEVATION, ['surf_building_height', 'surf_min_elevation', 'surf_max_elevation']),
+}
+
+# Shorthands for several metrics
+METRIC_GROUPS = {
+    'all': list(METRICS),
+    'surfaces': ['footprint', 'roof', 'walls', 'area', 'faces', 'height'],
+}
+
+STATUS_COLUMNS = ['processing_status', 'error_code']
+DETAIL_COLUMNS = ['error_detail']
+
+
+def parse_metrics(text):
+    """Parse a comma separated metric list such as 'volume' or 'footprint,roof'"""
+    names = []
+    for name in str(text).lower().split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name in METRIC_GROUPS:
+            names.extend(METRIC_GROUPS[name])
+        elif name in METRICS:
+            names.append(name)
+        else:
+            choices = ', '.join(list(METRIC_GROUPS) + list(METRICS))
+            raise ValueError(f"Unknown metric '{name}' (choose from {choices})")
+    if not names:
+        raise ValueError("No metrics given")
+    return [name for name in METRICS if name in names]
+
+
+def plan_metrics(names=None):
+    """Build the execution plan for a metric list - returns {'metrics', 'stages', 'columns'}"""
+    names = names or METRIC_GROUPS['all']
+    stages = {METRICS[name][0] for name in names}
+
+    # Elevation comes for free with the surface analysis
+    if STAGE_SURFACES in stages:
+        stages.discard(STAGE_ELEVATION)
+
+    columns = list(STATUS_COLUMNS)
+    for name in names:
+        columns.extend(METRICS[name][1])
+    columns.extend(DETAIL_COLUMNS)
+
+    return {
+        'metrics': list(names),
+        'stages': tuple(stage for stage in (STAGE_MESH, STAGE_SURFACES, STAGE_ELEVATION) if stage in stages),
+        'columns': columns,
+    }
+
+
+def describe_plan(plan):
+    """Short label of a plan for logs and the progress file"""
+    if plan['metrics'] == METRIC_GROUPS['all']:
+        return 'all'
+    return ','.join(plan['metrics'])
@@ -0,0 +1,158 @@
+"""
+Partitioned output module
+Writes the results into a Hive-style directory layout (key=value/...), rows buffered
+per partition so a file covers many chunks; DuckDB, pyarrow or pandas readers can
+prune partitions instead of scanning one large CSV
+"""
+
+import shutil
+import logging
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+
+from aggregation import building_centroids, group_key_columns, TILE_PREFIX, SIZE_KEY, MISSING_LABEL
+
+DEFAULT_PARTITION_VALUE = '__HIVE_DEFAULT_PARTITION__'  # Missing key values, as Hive and DuckDB name them
+FLUSH_ROWS = 200000  # Rows buffered across all partitions before their files are written
+
+
+def partition_column_name(key):
+    """Directory name of a partition key ('tile:1000' -> 'tile_1000', 'size' -> 'size_class')"""
+    if key.startswith(TILE_PREFIX):
+        return f"tile_{key[len(TILE_PREFIX):]}"
+    if key == SIZE_KEY:
+        return 'size_class'
+    return key
+
+
+def partition_value(value):
+    """Path-safe partition value"""
+    text = str(value)
+    if text in ('', MISSING_LABEL):
+        return DEFAULT_PARTITION_VALUE
+    return quote(text, safe=' -_.')
+
+
+class PartitionedWriter:
+    """Writes the chunks into their partitions, buffering rows per partition
+
+    Rows are buffered until FLUSH_ROWS are held across all partitions, so every flush
+    writes one file per partition instead of one per chunk and partition. All files
+    share one schema: the input layer types of the attributes (see readers.input_attributes)
+    and the types of all rows of the first flush for the rest, text only for columns that
+    are empty and of unknown type; rows that cannot be cast to it fail loudly. Attribute
+    keys are dropped from the files since the directory names carry them. Parquet
+    needs pyarrow; without it the partitions are written as CSV.
+    """
+
+    def __init__(self, path, keys, flush_rows=FLUSH_ROWS, attribute_types=None):
+        self.path = Path(path)
+        self.keys = list(keys)
+        self.attribute_types = attribute_types or {}
+        self.names = [partition_column_name(key) for key in self.keys]
+        self.flush_rows = flush_rows
+        self.buffers = {}  # partition label -> list of DataFrames
+        self.buffered_rows = 0
+        self.flushes = 0
+        self.files = 0
+        self.partitions = set()
+        self.schema = None
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        self.path.mkdir(parents=True)
+
+        try:
+            import pyarrow  # noqa: F401
+            self.format = 'parquet'
+        except ImportError:
+            logging.getLogger(__name__).warning("pyarrow not installed, writing partitions as CSV")
+            self.format = 'csv'
+
+    def set_schema(self, df):
+        """File schema from the input attribute types and the rows of the first flush"""
+        import pyarrow as pa
+
+        types = {'int': pa.int64(), 'float': pa.float64(), 'bool': pa.bool_(), 'str': pa.string()}
+        fields = []
+        for field in pa.Schema.from_pandas(df, preserve_index=False):
+            if field.name in self.attribute_types:
+                field = field.with_type(types[self.attribute_types[field.name]])
+            elif pa.types.is_null(field.type):
+                field = field.with_type(pa.string())  # Empty in every row so far and of unknown type
+            fields.append(field)
+        self.schema = pa.schema(fields)
+
+    def conform(self, df):
+        """Cast a partition's rows to the file schema"""
+        import pyarrow as pa
+
+        extra = [name for name in df.columns if name not in self.schema.names]
+        if extra:
+            raise ValueError(f"Columns {', '.join(extra)} are not in the partition schema")
+        df = df.reindex(columns=self.schema.names)
+        for field in self.schema:
+            column = df[field.name]
+            try:
+                if pa.types.is_integer(field.type):
+                    df[field.name] = column.astype('Int64')  # Integers with nulls arrive as float
+                elif pa.types.is_boolean(field.type):
+                    df[field.name] = column.astype('boolean')
+                elif pa.types.is_floating(field.type):
+                    df[field.name] = column.astype('float64')
+                elif pa.types.is_string(field.type) and column.dtype.kind != 'O':
+                    df[field.name] = column.astype('string')
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Column {field.name} ({column.dtype}) does not match the partition "
+                                 f"schema type {field.type}: {e}") from e
+        return pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+
+    def write_table(self, df, file_path):
+        """Write one partition file with the schema shared by all files"""
+        if self.format == 'csv':
+            df.to_csv(file_path, index=False)
+            return
+
+        import pyarrow.parquet as pq
+        pq.write_table(self.conform(df), file_path)
+
+    def write_chunk(self, df, chunk_data):
+        """Split one chunk by the partition keys into the partition buffers"""
+        centroids = building_centroids(chunk_data) if any(k.startswith(TILE_PREFIX) for k in self.keys) else None
+        key_columns = group_key_columns(df, self.keys, centroids)
+        data = df.drop(columns=[key for key in self.keys if key in df.columns])
+
+        labels = np.array(['/'.join(f"{name}={partition_value(value)}" for name, value in zip(self.names, values))
+                           for values in zip(*key_columns)], dtype=object)
+        for label in np.unique(labels) if len(labels) else []:
+            self.buffers.setdefault(label, []).append(data[labels == label])
+        self.buffered_rows += len(data)
+        if self.buffered_rows >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        """Write one file per buffered partition"""
+        import pandas as pd
+
+        if self.schema is None and self.format == 'parquet' and self.buffers:
+            self.set_schema(pd.concat([part for parts in self.buffers.values() for part in parts],
+                                      ignore_index=True))
+        for label, parts in self.buffers.items():
+            directory = self.path / label
+            directory.mkdir(parents=True, exist_ok=True)
+            part = pd.concat(parts, ignore_index=True)
+            self.write_table(part, directory / f"part-{self.flushes:05d}.{self.format}")
+            self.partitions.add(label)
+            self.files += 1
+        self.buffers = {}
+        self.buffered_rows = 0
+        self.flushes += 1
+
+    def finish(self):
+        """Write the remaining rows and log the layout of the partitioned output"""
+        if self.buffers:
+            self.flush()
+        logging.getLogger(__name__).info(
+            f"Saved {len(self.partitions)} partitions by {', '.join(self.names)} "
+            f"({self.files} {self.format} files) to {self.path}")
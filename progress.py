@@ -0,0 +1,177 @@
+"""
+Progress and throughput telemetry module
+Rate-limited reporting of per-stage rates, ETA, failure rate and worker utilization
+Writes a console/log line and a machine-readable JSON status file
+"""
+
+import os
+import json
+import time
+import logging
+
+STATUS_FILE_NAME = 'progress.json'
+DEFAULT_INTERVAL = 10.0  # Seconds between two reports
+CLOCK_CHECK_EVERY = 64  # Hot-path calls between two clock reads
+
+
+class StageStats:
+    """Counters for a single pipeline stage"""
+
+    __slots__ = ('name', 'count', 'failed', 'busy_seconds', 'started', 'last_count', 'last_time')
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.started = None
+        self.last_count = 0
+        self.last_time = None
+
+
+class ProgressTracker:
+    """Collects per-stage counters and reports them at most once per interval"""
+
+    def __init__(self, total=None, status_path=None, interval=DEFAULT_INTERVAL, num_workers=None,
+                 metrics=None, name=None):
+        self.logger = logging.getLogger(__name__)
+        self.name = name  # Shown in the log lines when several inputs are tracked at once
+        self.total = total
+        self.status_path = status_path
+        self.interval = interval
+        self.num_workers = num_workers
+        self.metrics = metrics
+        self.memory = None
+        self.start_time = time.time()
+        self.stages = {}
+        self._calls = 0
+        self._next_report = self.start_time + interval
+
+    def stage(self, name):
+        """Get (or create) the counters of a stage"""
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = StageStats(name)
+            stats.started = time.time()
+            stats.last_time = stats.started
+            self.stages[name] = stats
+        return stats
+
+    def set_total(self, total):
+        """Set the expected number of buildings used for the ETA"""
+        self.total = total
+
+    def set_workers(self, num_workers):
+        """Set the number of workers used for the utilization estimate"""
+        self.num_workers = num_workers
+
+    def set_memory(self, memory):
+        """Set the memory summary (see memory_monitor.MemoryMonitor.summary) for the status file"""
+        self.memory = memory
+
+    def advance(self, stage_name, count=1, failed=0, busy_seconds=0.0):
+        """Record progress of a stage - cheap enough for the per-building hot path"""
+        stats = self.stages.get(stage_name)
+        if stats is None:
+            stats = self.stage(stage_name)
+        stats.count += count
+        stats.failed += failed
+        stats.busy_seconds += busy_seconds
+
+        # Only look at the clock every few calls
+        self._calls += 1
+        if self._calls >= CLOCK_CHECK_EVERY:
+            self._calls = 0
+            if time.time() >= self._next_report:
+                self.report()
+
+    def snapshot(self):
+        """Build a JSON-serializable view of the current state"""
+        now = time.time()
+        elapsed = now - self.start_time
+        stages = {}
+
+        for name, stats in self.stages.items():
+            stage_elapsed = max(now - stats.started, 1e-9)
+            window = max(now - stats.last_time, 1e-9)
+            rate = stats.count / stage_elapsed
+            stage = {
+                'count': stats.count,
+                'failed': stats.failed,
+                'failure_rate': stats.failed / stats.count if stats.count else 0.0,
+                'rate_per_s': rate,
+                'recent_rate_per_s': (stats.count - stats.last_count) / window,
+                'eta_seconds': None,
+                'percent': None,
+                'worker_utilization': None,
+            }
+            if self.total:
+                remaining = max(self.total - stats.count, 0)
+                stage['percent'] = min(stats.count / self.total * 100.0, 100.0)
+                stage['eta_seconds'] = remaining / rate if rate > 0 else None
+            if stats.busy_seconds > 0 and self.num_workers:
+                stage['worker_utilization'] = min(stats.busy_seconds / (stage_elapsed * self.num_workers), 1.0)
+            stages[name] = stage
+
+        return {
+            'updated': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(now)),
+            'elapsed_seconds': elapsed,
+            'total': self.total,
+            'workers': self.num_workers,
+            'metrics': self.metrics,
+            'memory': self.memory,
+            'stages': stages,
+        }
+
+    def report(self, final=False):
+        """Log one summary line and rewrite the status file"""
+        status = self.snapshot()
+        status['finished'] = final
+
+        parts = []
+        for name, stage in status['stages'].items():
+            text = f"{name}: {stage['count']}"
+            if stage['percent'] is not None:
+                text += f" ({stage['percent']:.1f}%)"
+            text += f" {stage['recent_rate_per_s']:.1f}/s"
+            if stage['failed']:
+                text += f" failed {stage['failure_rate'] * 100:.1f}%"
+            if stage['worker_utilization'] is not None:
+                text += f" util {stage['worker_utilization'] * 100:.0f}%"
+            if stage['eta_seconds'] is not None and not final:
+                text += f" ETA {format_duration(stage['eta_seconds'])}"
+            parts.append(text)
+        if parts:
+            label = f"Progress [{self.name}]" if self.name else "Progress"
+            self.logger.info(f"{label} - " + " | ".join(parts))
+
+        if self.status_path:
+            write_status_file(self.status_path, status)
+
+        # Start a new rate window
+        now = time.time()
+        for stats in self.stages.values():
+            stats.last_count = stats.count
+            stats.last_time = now
+        self._next_report = now + self.interval
+
+    def close(self):
+        """Write the final report"""
+        self.report(final=True)
+
+
+def format_duration(seconds):
+    """Format seconds as H:MM:SS"""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def write_status_file(status_path, status):
+    """Atomically replace the JSON status file"""
+    tmp_path = f"{status_path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, indent=2)
+        os.replace(tmp_path, status_path)
+    except OSError as e:
+        logging.getLogger(__name__).debug(f"Could not write status file: {e}")
@@ -0,0 +1,155 @@
+"""
+Input readers module
+Reader names, GDB layer lookup, the fiona reader for GDB and other GDAL formats, and the
+choice of chunk reader by input type (geometry cache, CityGML, CityJSON, Arrow)
+"""
+
+import gc
+import time
+import logging
+
+from chunking import CHUNK_SIZE, ChunkBudget, estimate_parse_bytes
+from triangulation import RingBatch, add_multipatch_geometry, assign_chunk_geometry
+
+READERS = ('fiona', 'arrow', 'citygml', 'cityjson')
+
+
+def resolve_layer_name(gdb_path, layer_name, layers=None):
+    """Find the GDB layer matching the requested layer name"""
+    logger = logging.getLogger(__name__)
+
+    # List available layers
+    if layers is None:
+        import fiona
+        layers = fiona.listlayers(gdb_path)
+    logger.info(f"Available layers: {layers}")
+
+    # Find the correct layer name
+    actual_layer = None
+    for layer in layers:
+        if layer_name in layer or layer in layer_name:
+            actual_layer = layer
+            break
+
+    if not actual_layer:
+        logger.error(f"Layer '{layer_name}' not found. Available: {layers}")
+        raise ValueError(f"Layer not found")
+
+    logger.info(f"Using layer: {actual_layer}")
+    return actual_layer
+
+
+def read_gdb_buildings_chunked(gdb_path, layer_name='Building_solid', chunk_size=CHUNK_SIZE, limit=None,
+                               progress=None, max_chunk_bytes=None):
+    """Read buildings from GDB file in chunks using Fiona"""
+    logger = logging.getLogger(__name__)
+    logger.info(f"Reading buildings from {gdb_path}, layer: {layer_name}")
+
+    try:
+        import_start = time.perf_counter()
+        import fiona
+        logger.info(f"Imported fiona in {time.perf_counter() - import_start:.2f}s")
+
+        actual_layer = resolve_layer_name(gdb_path, layer_name)
+
+        # Read features in chunks
+        with fiona.open(gdb_path, layer=actual_layer) as src:
+            logger.info(f"Layer CRS: {src.crs}")
+            logger.info(f"Layer bounds: {src.bounds}")
+
+            # Expected feature count for the progress ETA
+            if progress is not None:
+                feature_count = len(src)
+                progress.set_total(min(feature_count, limit) if limit else feature_count)
+
+            chunk = []
+            chunk_num = 0
+            total_count = 0
+            budget = ChunkBudget(max_chunk_bytes, chunk_size)
+            batch = RingBatch()
+
+            for feature in src:
+                if limit and total_count >= limit:
+                    break
+
+                # Extract properties and geometry
+                properties = dict(feature['properties'])
+                geometry = feature.get('geometry')
+
+                # Collect the rings, they are triangulated per chunk
+                vertex_count, ring_count = add_multipatch_geometry(batch, geometry)
+                batch.end_building()
+                properties['_geometry_type'] = geometry.get('type') if geometry else None
+
+                chunk.append(properties)
+                total_count += 1
+
+                if progress is not None:
+                    progress.advance('read', failed=0 if vertex_count >= 3 else 1)
+
+                # Yield chunk when it reaches chunk_size or the memory budget
+                face_count = max(vertex_count - 2 * ring_count, 0)
+                if budget.add(vertex_count, face_count, estimate_parse_bytes(vertex_count, face_count)):
+                    assign_chunk_geometry(chunk, batch)
+                    logger.info(f"Chunk {chunk_num} read: {budget.describe()}")
+                    yield chunk_num, chunk
+                    chunk = []
+                    chunk_num += 1
+                    budget.reset()
+                    batch = RingBatch()
+                    gc.collect()  # Force garbage collection
+
+            # Yield final chunk if any remaining
+            if chunk:
+                assign_chunk_geometry(chunk, batch)
+                logger.info(f"Chunk {chunk_num} read: {budget.describe()}")
+                yield chunk_num, chunk
+
+    except Exception as e:
+        logger.error(f"Error reading GDB: {str(e)}")
+        raise
+
+
+def select_reader(input_path, reader=None):
+    """Chunk reader function for an input - the named reader, or by type (geometry cache, CityGML, CityJSON, else fiona)"""
+    if reader == 'arrow':
+        from wkb_reader import read_gdb_buildings_arrow
+        return read_gdb_buildings_arrow
+    if reader in ('citygml', 'cityjson'):
+        from citymodel_readers import read_citygml_buildings_chunked, read_cityjson_buildings_chunked
+        return read_citygml_buildings_chunked if reader == 'citygml' else read_cityjson_buildings_chunked
+    if reader is None:
+        from geometry_cache import is_geometry_cache, read_cached_buildings_chunked
+        if is_geometry_cache(input_path):
+            return read_cached_buildings_chunked
+        from citymodel_readers import city_model_reader
+        return city_model_reader(input_path) or read_gdb_buildings_chunked
+    return read_gdb_buildings_chunked
+
+
+def attribute_type(name):
+    """Attribute type ('int', 'float', 'bool' or 'str') of a fiona field type or NumPy dtype kind"""
+    name = name.split(':')[0]
+    if name in ('int', 'int32', 'int64', 'i', 'u'):
+        return 'int'
+    if name in ('float', 'f'):
+        return 'float'
+    if name in ('bool', 'b'):
+        return 'bool'
+    return 'str'  # Text, dates and times
+
+
+def input_attributes(input_path, layer_name, reader=None):
+    """Attribute names and types of the input layer - None for readers that only know them per building"""
+    read_chunks = select_reader(input_path, reader)
+    if read_chunks.__module__ == 'geometry_cache':
+        import numpy as np
+        from geometry_cache import GeometryCache
+        cache = GeometryCache(input_path)
+        return {name: attribute_type(np.dtype(cache.meta['dtypes'][name]).kind) for name in cache.columns
+                if not name.startswith('_')}
+    if read_chunks.__module__ == 'citymodel_readers':
+        return None
+    import fiona
+    with fiona.open(input_path, layer=resolve_layer_name(input_path, layer_name)) as src:
+        return {name: attribute_type(field) for name, field in src.schema['properties'].items()}
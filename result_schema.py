@@ -0,0 +1,204 @@
+"""
+Result schema module
+Compact, typed per-building result records: status and error codes, repair step bitflags
+and fixed-width metric columns, plus a decoder for readable output
+"""
+
+import sys
+import argparse
+from enum import IntEnum, IntFlag
+
+
+class Status(IntEnum):
+    """Processing status of a building"""
+    FAILED = 0
+    SUCCESS = 1
+
+
+class ErrorCode(IntEnum):
+    """Why a building failed or is incomplete"""
+    NONE = 0
+    NO_GEOMETRY = 1
+    INVALID_GEOMETRY = 2
+    MESH_ERROR = 3
+    NO_VOLUME = 4
+    SURFACE_ERROR = 5
+    WORKER_ERROR = 6
+
+
+class RepairStep(IntFlag):
+    """Mesh repair steps applied to a building"""
+    ALREADY_WATERTIGHT = 1
+    INSIDE_OUT = 2
+    REMOVED_DEGENERATE = 8
+    FIXED_NORMALS = 16
+    WATERTIGHT_AFTER_BASIC = 32
+    FILLED_HOLES = 64
+    WATERTIGHT_AFTER_FULL = 128
+    NOT_WATERTIGHT = 256
+    VOLUME_NOT_WATERTIGHT = 512
+    REPAIR_ERROR = 1024
+    CAPPED_HOLES = 2048
+
+
+STATUS_LABELS = {Status.FAILED: 'failed', Status.SUCCESS: 'success'}
+
+ERROR_LABELS = {
+    ErrorCode.NONE: '',
+    ErrorCode.NO_GEOMETRY: 'No geometry data',
+    ErrorCode.INVALID_GEOMETRY: 'Invalid vertices or faces',
+    ErrorCode.MESH_ERROR: 'Mesh processing failed',
+    ErrorCode.NO_VOLUME: 'Volume could not be calculated',
+    ErrorCode.SURFACE_ERROR: 'Surface analysis failed',
+    ErrorCode.WORKER_ERROR: 'Worker error',
+}
+
+REPAIR_LABELS = {
+    RepairStep.ALREADY_WATERTIGHT: 'Already watertight',
+    RepairStep.INSIDE_OUT: 'Mesh is inside-out, taking absolute value',
+    RepairStep.REMOVED_DEGENERATE: 'Removed degenerate faces',
+    RepairStep.FIXED_NORMALS: 'Fixed normals',
+    RepairStep.WATERTIGHT_AFTER_BASIC: 'Watertight after basic repairs',
+    RepairStep.FILLED_HOLES: 'Filled holes',
+    RepairStep.WATERTIGHT_AFTER_FULL: 'Watertight after full repair',
+    RepairStep.NOT_WATERTIGHT: 'Still not watertight after repair',
+    RepairStep.VOLUME_NOT_WATERTIGHT: 'Calculated volume despite non-watertight',
+    RepairStep.REPAIR_ERROR: 'Repair error',
+    RepairStep.CAPPED_HOLES: 'Capped boundary loops',
+}
+
+# Result columns in record order with their fixed dtypes
+# Integer counts use -1 for "not computed", floats use NaN, nullable booleans NA
+RESULT_COLUMNS = [
+    ('processing_status', 'int8'),
+    ('error_code', 'int8'),
+    ('mesh_volume', 'float64'),
+    ('mesh_is_watertight', 'boolean'),
+    ('mesh_vertex_count', 'int32'),
+    ('mesh_face_count', 'int32'),
+    ('mesh_merged_vertices', 'int32'),
+    ('mesh_repair_applied', 'bool'),
+    ('mesh_repair_flags', 'int32'),
+    ('mesh_orientation_fixed', 'bool'),
+    ('surf_roof_area', 'float64'),
+    ('surf_footprint_area', 'float64'),
+    ('surf_wall_area', 'float64'),
+    ('surf_sloped_area', 'float64'),
+    ('surf_total_area', 'float64'),
+    ('surf_building_height', 'float32'),
+    ('surf_wall_perimeter', 'float32'),
+    ('surf_roof_complexity', 'float32'),
+    ('surf_min_elevation', 'float32'),
+    ('surf_max_elevation', 'float32'),
+    ('surf_horizontal_faces', 'int32'),
+    ('surf_vertical_faces', 'int32'),
+    ('surf_sloped_faces', 'int32'),
+    ('error_detail', 'object'),
+]
+
+RESULT_NAMES = [name for name, _ in RESULT_COLUMNS]
+RESULT_DTYPES = dict(RESULT_COLUMNS)
+MISSING_VALUES = {'float64': float('nan'), 'float32': float('nan'), 'int32': -1, 'int8': 0,
+                  'bool': False, 'boolean': None, 'object': None}
+RECORD_DEFAULTS = tuple(MISSING_VALUES[dtype] for _, dtype in RESULT_COLUMNS)
+
+
+def pack_record(result):
+    """Pack a result dict into a tuple in RESULT_COLUMNS order"""
+    record = []
+    for (name, _), default in zip(RESULT_COLUMNS, RECORD_DEFAULTS):
+        value = result.get(name)
+        record.append(default if value is None else value)
+    return tuple(record)
+
+
+def failed_record(error_code, error_detail=None):
+    """Record of a building that could not be processed"""
+    return pack_record({'processing_status': Status.FAILED, 'error_code': error_code,
+                        'error_detail': error_detail})
+
+
+def unpack_record(record):
+    """Unpack a record tuple into a result dict (missing values become None)"""
+    result = {}
+    for (name, dtype), value in zip(RESULT_COLUMNS, record):
+        if value is None or value != value or (dtype == 'int32' and value == -1):
+            value = None
+        result[name] = value
+    return result
+
+
+def decode_record(record, columns=None):
+    """Readable result dict of one record (labels as in decode_results, plain Python values)"""
+    result = {}
+    for name, value in unpack_record(record).items():
+        if columns is not None and name not in columns:
+            continue
+        result[name] = value.item() if hasattr(value, 'item') else value
+    if 'processing_status' in result:
+        result['processing_status'] = STATUS_LABELS.get(result['processing_status'])
+    if 'error_code' in result:
+        result['processing_error'] = ERROR_LABELS.get(result.pop('error_code')) or None
+    if 'mesh_repair_flags' in result:
+        result['mesh_repair_steps'] = decode_repair_flags(result.pop('mesh_repair_flags'))
+    return result
+
+
+def build_results_frame(attribute_rows, records, columns=None):
+    """Build a typed DataFrame from input attributes and result records in the same order
+
+    columns restricts the result columns to a metric plan (see metrics.plan_metrics).
+    """
+    import pandas as pd
+
+    attributes = pd.DataFrame.from_records(
+        [{k: v for k, v in row.items() if not k.startswith('_')} for row in attribute_rows])
+    metrics = pd.DataFrame.from_records(records, columns=RESULT_NAMES).astype(RESULT_DTYPES)
+    if columns is not None:
+        metrics = metrics[[name for name in RESULT_NAMES if name in columns]]
+    return pd.concat([attributes, metrics], axis=1)
+
+
+def result_read_dtypes(columns):
+    """dtype mapping for reading result columns back from CSV"""
+    return {name: dtype for name, dtype in RESULT_COLUMNS if name in columns and dtype != 'object'}
+
+
+def decode_repair_flags(flags):
+    """Readable repair step description of a bitflag value"""
+    if flags is None or flags < 0:
+        return ''
+    return " | ".join(label for step, label in REPAIR_LABELS.items() if flags & step)
+
+
+def decode_results(df):
+    """Replace status, error and repair codes with readable text columns"""
+    df = df.copy()
+    if 'processing_status' in df.columns:
+        df['processing_status'] = df['processing_status'].map(
+            {int(k): v for k, v in STATUS_LABELS.items()}).astype('category')
+    if 'error_code' in df.columns:
+        df['error_code'] = df['error_code'].map(
+            {int(k): v for k, v in ERROR_LABELS.items()}).astype('category')
+        df = df.rename(columns={'error_code': 'processing_error'})
+    if 'mesh_repair_flags' in df.columns:
+        df['mesh_repair_steps'] = df['mesh_repair_flags'].map(decode_repair_flags)
+        df = df.drop(columns=['mesh_repair_flags'])
+    return df
+
+
+def main(argv=None):
+    """Command line entry point of the decode subcommand"""
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(prog='main.py decode',
+                                     description='Decode status, error and repair codes of a result CSV')
+    parser.add_argument('input_csv', help='Result CSV written by main.py')
+    parser.add_argument('output_csv', help='Readable CSV to write')
+    args = parser.parse_args(argv)
+
+    header = pd.read_csv(args.input_csv, nrows=0).columns
+    df = pd.read_csv(args.input_csv, dtype=result_read_dtypes(header))
+    decode_results(df).to_csv(args.output_csv, index=False)
+    print(f"Decoded {len(df)} records to {args.output_csv}", file=sys.stderr)
+    return 0
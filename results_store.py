@@ -0,0 +1,345 @@
+"""
+Results store module
+Indexed, memory-mapped columnar results: one .npy file per column, rows sorted by the
+Morton key of the building centroid, sorted indexes on the ID columns and a small query
+API for ID, point and bounding box lookups without loading the whole dataset
+"""
+
+import sys
+import json
+import time
+import shutil
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+
+STORE_VERSION = 1
+META_FILE = 'meta.json'
+DEFAULT_ID_COLUMNS = ('UUID', 'EGID')
+MORTON_BITS = 32  # Bits per axis
+MAX_QUERY_CELLS = 64  # Morton ranges scanned for one bounding box
+
+# Geometry columns added to every store
+GEOMETRY_COLUMNS = ['centroid_x', 'centroid_y', 'bbox_xmin', 'bbox_ymin', 'bbox_xmax', 'bbox_ymax']
+
+
+def spread_bits(values):
+    """Interleave zero bits into 32-bit integers (x -> x0x0x0...)"""
+    v = values.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def morton_keys(qx, qy):
+    """Morton (Z-order) key of quantized coordinates"""
+    return spread_bits(qx) | (spread_bits(qy) << np.uint64(1))
+
+
+def building_bounds(chunk_data):
+    """Centroid and plan bounding box of each building - NaN without geometry"""
+    bounds = np.full((len(chunk_data), 6), np.nan)
+    for i, row in enumerate(chunk_data):
+        vertices = row.get('_vertices')
+        if vertices is not None and len(vertices):
+            xy = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)[:, :2]
+            if row.get('_origin') is not None:
+                xy = xy + row['_origin'][:2]
+            bounds[i, :2] = xy.mean(axis=0)
+            bounds[i, 2:4] = xy.min(axis=0)
+            bounds[i, 4:] = xy.max(axis=0)
+    return bounds
+
+
+def storable(series):
+    """Column values as a NumPy array that can be memory-mapped (text as UTF-8 bytes, nullable booleans as int8 with -1)"""
+    if series.dtype.name == 'boolean':
+        return series.astype('Int8').fillna(-1).to_numpy(dtype=np.int8)
+    if series.dtype.kind not in 'biuf':
+        text = series.astype(object).where(series.notna(), '').astype(str).to_numpy(dtype=str)
+        return np.char.encode(text, 'utf-8') if len(text) else np.zeros(0, dtype='S1')
+    return series.to_numpy()
+
+
+def null_run(series):
+    """True if a chunk column holds no values at all - its dtype then says nothing about the column"""
+    return series.dtype.kind not in 'biuf' and bool(series.isna().all())
+
+
+def text_values(values):
+    """Values as UTF-8 bytes"""
+    return values if values.dtype.kind == 'S' else np.char.encode(values.astype(str), 'utf-8')
+
+
+def column_dtype(runs):
+    """dtype of a column from its runs (None for runs without values)
+
+    Numbers stay numeric, as float with NaN if some runs have no values; the column is
+    only text if a run holds text.
+    """
+    typed = [values for values in runs if values is not None]
+    if not typed:
+        return np.dtype('S1')
+    if any(values.dtype.kind == 'S' for values in typed):
+        return np.dtype(f"S{max(text_values(values).dtype.itemsize for values in typed)}")
+    dtype = np.result_type(*[values.dtype for values in typed])
+    if len(typed) < len(runs) and dtype.kind != 'f':
+        dtype = np.result_type(dtype, np.float64)
+    return dtype
+
+
+def conform_run(values, dtype, length):
+    """Values of one run in the column dtype (NaN or empty text for a run without values)"""
+    if values is None:
+        return np.full(length, np.nan if dtype.kind == 'f' else b'', dtype=dtype)
+    if dtype.kind == 'S':
+        values = text_values(values)
+    return values.astype(dtype, copy=False)
+
+
+class ResultsStoreWriter:
+    """Builds a results store from result chunks
+
+    Chunks are spilled to run files; finish() sorts all rows by Morton key and writes the
+    final columns one at a time, so memory stays at one column plus the sort keys.
+    """
+
+    def __init__(self, path, id_columns=DEFAULT_ID_COLUMNS):
+        self.path = Path(path)
+        self.id_columns = list(id_columns)
+        self.runs_path = self.path / '_runs'
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        self.runs_path.mkdir(parents=True)
+        self.columns = None
+        self.run_lengths = []
+
+    def write_chunk(self, df, chunk_data):
+        """Spill one chunk of results with the geometry columns"""
+        bounds = building_bounds(chunk_data)
+        if self.columns is None:
+            self.columns = list(df.columns)
+        run = len(self.run_lengths)
+        for name in self.columns:
+            if not null_run(df[name]):
+                np.save(self.runs_path / f'{run}_{name}.npy', storable(df[name]))
+        for i, name in enumerate(GEOMETRY_COLUMNS):
+            np.save(self.runs_path / f'{run}_{name}.npy', bounds[:, i])
+        self.run_lengths.append(len(df))
+
+    def run_column(self, run, name):
+        """Memory-mapped column of one run, None if the run has no values in it"""
+        path = self.runs_path / f'{run}_{name}.npy'
+        return np.load(path, mmap_mode='r') if path.exists() else None
+
+    def finish(self):
+        """Sort by Morton key, write the final columns and the ID indexes"""
+        logger = logging.getLogger(__name__)
+        start = time.perf_counter()
+        count = sum(self.run_lengths)
+        offsets = np.concatenate([[0], np.cumsum(self.run_lengths)]).astype(np.int64)
+        columns = (self.columns or []) + GEOMETRY_COLUMNS
+
+        # Step 1: Morton keys of the centroids (buildings without geometry sort last)
+        x = np.concatenate([self.run_column(run, 'centroid_x') for run in range(len(self.run_lengths))] or [[]])
+        y = np.concatenate([self.run_column(run, 'centroid_y') for run in range(len(self.run_lengths))] or [[]])
+        valid = ~(np.isnan(x) | np.isnan(y))
+        origin = [float(x[valid].min()), float(y[valid].min())] if valid.any() else [0.0, 0.0]
+        extent = max(float(x[valid].max()) - origin[0], float(y[valid].max()) - origin[1], 1.0) if valid.any() else 1.0
+        scale = (2 ** MORTON_BITS - 1) / extent
+        qx = np.where(valid, (np.nan_to_num(x) - origin[0]) * scale, 0).astype(np.uint64)
+        qy = np.where(valid, (np.nan_to_num(y) - origin[1]) * scale, 0).astype(np.uint64)
+        keys = np.where(valid, morton_keys(qx, qy), np.uint64(2 ** 64 - 1))
+        order = np.argsort(keys, kind='stable')
+        np.save(self.path / 'morton.npy', keys[order])
+        position = np.empty(count, dtype=np.int64)
+        position[order] = np.arange(count)
+        del x, y, qx, qy, keys
+
+        # Step 2: Scatter every column into its sorted position, one column at a time
+        dtypes = {}
+        for name in columns:
+            runs = [self.run_column(run, name) for run in range(len(self.run_lengths))]
+            dtype = column_dtype(runs) if runs else np.dtype('float64')
+            out = np.lib.format.open_memmap(self.path / f'{name}.npy', mode='w+', dtype=dtype, shape=(count,))
+            for run, values in enumerate(runs):
+                out[position[offsets[run]:offsets[run + 1]]] = conform_run(values, dtype, self.run_lengths[run])
+            out.flush()
+            dtypes[name] = dtype.str
+            del out
+
+        # Step 3: Sorted indexes on the ID columns
+        indexed = []
+        for name in self.id_columns:
+            if name not in (self.columns or []):
+                continue
+            values = np.load(self.path / f'{name}.npy', mmap_mode='r')
+            rows = np.argsort(values, kind='stable')
+            np.save(self.path / f'index_{name}_keys.npy', values[rows])
+            np.save(self.path / f'index_{name}_rows.npy', rows)
+            indexed.append(name)
+
+        max_half_extent = 0.0
+        if count:
+            bbox = [np.load(self.path / f'{name}.npy', mmap_mode='r') for name in GEOMETRY_COLUMNS[2:]]
+            half = np.fmax((bbox[2] - bbox[0]) / 2, (bbox[3] - bbox[1]) / 2)
+            max_half_extent = float(np.nanmax(half)) if np.isfinite(half).any() else 0.0
+
+        meta = {
+            'version': STORE_VERSION,
+            'rows': count,
+            'columns': columns,
+            'dtypes': dtypes,
+            'id_columns': indexed,
+            'origin': origin,
+            'scale': scale,
+            'max_half_extent': max_half_extent,
+        }
+        with open(self.path / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        shutil.rmtree(self.runs_path)
+        logger.info(f"Saved results store with {count} buildings to {self.path} "
+                    f"(indexes: {', '.join(indexed) or 'none'}) in {time.perf_counter() - start:.1f}s")
+
+
+class ResultsStore:
+    """Read-only query access to a results store (columns are memory-mapped on first use)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / META_FILE, encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.columns = self.meta['columns']
+        self._arrays = {}
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def column(self, name):
+        """Memory-mapped column array"""
+        if name not in self._arrays:
+            self._arrays[name] = np.load(self.path / f'{name}.npy', mmap_mode='r')
+        return self._arrays[name]
+
+    def rows(self, indices, columns=None):
+        """Rows as a list of dicts (text columns decoded)"""
+        indices = np.sort(np.asarray(indices, dtype=np.int64))
+        columns = columns or self.columns
+        data = {name: self.column(name)[indices] for name in columns}
+        result = []
+        for i in range(len(indices)):
+            row = {}
+            for name in columns:
+                value = data[name][i]
+                row[name] = value.decode('utf-8') if isinstance(value, bytes) else value.item()
+            result.append(row)
+        return result
+
+    def by_id(self, value, column=None, columns=None):
+        """Rows whose ID column equals value (first indexed column by default)"""
+        column = column or (self.meta['id_columns'] or [None])[0]
+        if column not in self.meta['id_columns']:
+            raise ValueError(f"No index on column {column}")
+        keys = self.column(f'index_{column}_keys')
+        if keys.dtype.kind == 'S':
+            value = str(value).encode('utf-8')
+        else:
+            value = np.array(value).astype(keys.dtype)
+        lo = np.searchsorted(keys, value, side='left')
+        hi = np.searchsorted(keys, value, side='right')
+        return self.rows(self.column(f'index_{column}_rows')[lo:hi], columns)
+
+    def morton_ranges(self, xmin, ymin, xmax, ymax):
+        """Contiguous Morton key ranges of aligned cells covering a box"""
+        origin = self.meta['origin']
+        scale = self.meta['scale']
+        limit = 2 ** MORTON_BITS - 1
+        qx0, qx1 = (int(np.clip((v - origin[0]) * scale, 0, limit)) for v in (xmin, xmax))
+        qy0, qy1 = (int(np.clip((v - origin[1]) * scale, 0, limit)) for v in (ymin, ymax))
+
+        # Coarsest cell level that covers the box with at most MAX_QUERY_CELLS cells
+        level = 0
+        while ((qx1 >> level) - (qx0 >> level) + 1) * ((qy1 >> level) - (qy0 >> level) + 1) > MAX_QUERY_CELLS:
+            level += 1
+
+        ranges = []
+        for cx in range(qx0 >> level, (qx1 >> level) + 1):
+            for cy in range(qy0 >> level, (qy1 >> level) + 1):
+                start = int(morton_keys(np.array([cx << level]), np.array([cy << level]))[0])
+                ranges.append((start, start + (1 << (2 * level))))
+        return ranges
+
+    def in_bbox(self, xmin, ymin, xmax, ymax):
+        """Row indices of buildings with their centroid inside a box"""
+        if len(self) == 0 or xmax < xmin or ymax < ymin:
+            return np.zeros(0, dtype=np.int64)
+        keys = self.column('morton')
+        candidates = []
+        for start, stop in self.morton_ranges(xmin, ymin, xmax, ymax):
+            lo = np.searchsorted(keys, np.uint64(start), side='left')
+            hi = np.searchsorted(keys, np.uint64(min(stop, 2 ** 64 - 1)), side='left')
+            if hi > lo:
+                candidates.append(np.arange(lo, hi))
+        if not candidates:
+            return np.zeros(0, dtype=np.int64)
+        candidates = np.concatenate(candidates)
+        x = self.column('centroid_x')[candidates]
+        y = self.column('centroid_y')[candidates]
+        return candidates[(x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)]
+
+    def bbox(self, xmin, ymin, xmax, ymax, columns=None):
+        """Rows of buildings with their centroid inside a box"""
+        return self.rows(self.in_bbox(xmin, ymin, xmax, ymax), columns)
+
+    def at_point(self, x, y, columns=None):
+        """Rows of buildings whose plan bounding box contains a point"""
+        margin = self.meta['max_half_extent']
+        candidates = self.in_bbox(x - margin, y - margin, x + margin, y + margin)
+        inside = ((self.column('bbox_xmin')[candidates] <= x) & (self.column('bbox_xmax')[candidates] >= x)
+                  & (self.column('bbox_ymin')[candidates] <= y) & (self.column('bbox_ymax')[candidates] >= y))
+        return self.rows(candidates[inside], columns)
+
+
+def parse_floats(text, count):
+    """Parse a comma separated list of count numbers"""
+    values = [float(v) for v in str(text).split(',')]
+    if len(values) != count:
+        raise ValueError(f"Expected {count} comma separated numbers")
+    return values
+
+
+def main(argv=None):
+    """Command line entry point of the query subcommand"""
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(prog='main.py query', description='Query a results store')
+    parser.add_argument('store', help='Results store directory written with --store')
+    lookup = parser.add_mutually_exclusive_group(required=True)
+    lookup.add_argument('--id', help='ID value to look up')
+    lookup.add_argument('--point', type=lambda t: parse_floats(t, 2), help='x,y in LV95')
+    lookup.add_argument('--bbox', type=lambda t: parse_floats(t, 4), help='xmin,ymin,xmax,ymax in LV95')
+    parser.add_argument('--id-column', help='Indexed ID column for --id (default: first indexed column)')
+    parser.add_argument('--columns', help='Comma separated columns to print (default: all)')
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.store)
+    columns = args.columns.split(',') if args.columns else None
+    start = time.perf_counter()
+    if args.id is not None:
+        rows = store.by_id(args.id, args.id_column, columns)
+    elif args.point is not None:
+        rows = store.at_point(*args.point, columns=columns)
+    else:
+        rows = store.bbox(*args.bbox, columns=columns)
+    elapsed = time.perf_counter() - start
+
+    pd.DataFrame(rows, columns=columns or store.columns).to_csv(sys.stdout, index=False)
+    print(f"{len(rows)} buildings in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""
+Statistical sampling module
+Draws a stratified random sample of feature IDs (by tile or by size class), processes
+only those buildings and estimates totals and means with confidence intervals
+"""
+
+import sys
+import time
+import random
+import argparse
+import logging
+from pathlib import Path
+from statistics import NormalDist
+
+from metrics import parse_metrics, plan_metrics, describe_plan
+
+DEFAULT_SAMPLE_SIZE = 2000
+DEFAULT_TILE_SIZE = 10000  # Meters (LV95)
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_METRICS = 'volume,footprint'
+MIN_PER_STRATUM = 2  # Needed for a within-stratum variance
+POOLED_STRATUM = 'pooled'  # Small strata merged when the sample cannot cover all of them
+STRATA = ('tile', 'size')
+
+# Size classes by bounding box plan area in m²
+SIZE_CLASS_EDGES = [0, 50, 150, 500, 2000, 10000]
+
+
+def read_feature_bounds(gdb_path, layer_name):
+    """FIDs and (xmin, ymin, xmax, ymax) of every feature - returns (fids, bounds)"""
+    import numpy as np
+    logger = logging.getLogger(__name__)
+
+    try:
+        import pyogrio
+    except ImportError:
+        pyogrio = None
+
+    if pyogrio is not None:
+        fids, bounds = pyogrio.read_bounds(gdb_path, layer=layer_name)
+        return np.asarray(fids, dtype=np.int64), np.asarray(bounds, dtype=np.float64).T
+
+    # Without pyogrio every geometry is read once (slow on large layers)
+    import fiona
+    logger.warning("pyogrio not installed, reading all geometries for their bounds")
+    fids = []
+    bounds = []
+    with fiona.open(gdb_path, layer=layer_name) as src:
+        for fid, feature in src.items():
+            if feature.get('geometry') is None:
+                continue
+            fids.append(fid)
+            bounds.append(fiona.bounds(feature))
+    return np.asarray(fids, dtype=np.int64), np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+
+
+def size_class_labels(areas):
+    """Size class label of each plan area (empty for missing areas)"""
+    import numpy as np
+
+    areas = np.asarray(areas, dtype=np.float64)
+    labels = np.array([f"{SIZE_CLASS_EDGES[i]}-{SIZE_CLASS_EDGES[i + 1]}"
+                       for i in range(len(SIZE_CLASS_EDGES) - 1)] + [f"{SIZE_CLASS_EDGES[-1]}+"], dtype=object)
+    index = np.searchsorted(SIZE_CLASS_EDGES, np.nan_to_num(areas, nan=0.0), side='right') - 1
+    return np.where(np.isnan(areas), '', labels[np.clip(index, 0, len(labels) - 1)])
+
+
+def assign_strata(bounds, strata='tile', tile_size=DEFAULT_TILE_SIZE):
+    """Stratum label of every feature from its bounding box"""
+    import numpy as np
+
+    if strata == 'tile':
+        center_x = (bounds[:, 0] + bounds[:, 2]) / 2
+        center_y = (bounds[:, 1] + bounds[:, 3]) / 2
+        tile_x = np.floor(center_x / tile_size).astype(np.int64)
+        tile_y = np.floor(center_y / tile_size).astype(np.int64)
+        return np.char.add(np.char.add(tile_x.astype(str), '_'), tile_y.astype(str))
+
+    plan_area = (bounds[:, 2] - bounds[:, 0]) * (bounds[:, 3] - bounds[:, 1])
+    return size_class_labels(plan_area).astype(str)
+
+
+def pool_strata(labels, sample_size):
+    """Merge the smallest strata into POOLED_STRATUM so every stratum can get MIN_PER_STRATUM buildings"""
+    import numpy as np
+
+    strata, counts = np.unique(labels, return_counts=True)
+    max_strata = max(sample_size // MIN_PER_STRATUM, 1)
+    if len(strata) <= max_strata:
+        return labels
+    kept = strata[np.argsort(-counts, kind='stable')[:max_strata - 1]]
+    logging.getLogger(__name__).info(f"Pooling the {len(strata) - len(kept)} smallest of {len(strata)} strata "
+                                     f"so a sample of {sample_size} has {MIN_PER_STRATUM} buildings per stratum")
+    return np.where(np.isin(labels, kept), labels, POOLED_STRATUM)
+
+
+def allocate_sample(stratum_sizes, sample_size):
+    """Proportional allocation with at least MIN_PER_STRATUM per stratum (capped at its size)
+
+    The minimums are taken first and the rest of the sample is shared in proportion to the
+    stratum sizes, so the total is sample_size (or the population, if it is smaller).
+    """
+    allocation = {stratum: min(MIN_PER_STRATUM, size) for stratum, size in stratum_sizes.items()}
+    remaining = min(sample_size, sum(stratum_sizes.values())) - sum(allocation.values())
+    if remaining < 0:
+        logging.getLogger(__name__).warning(f"{len(stratum_sizes)} strata need {sum(allocation.values())} "
+                                            f"buildings, more than the sample size {sample_size}")
+    while remaining > 0:
+        open_sizes = {stratum: size for stratum, size in stratum_sizes.items() if allocation[stratum] < size}
+        total = sum(open_sizes.values())
+        shares = {stratum: remaining * size / total for stratum, size in open_sizes.items()}
+        granted = {stratum: min(int(share), stratum_sizes[stratum] - allocation[stratum])
+                   for stratum, share in shares.items()}
+        if not any(granted.values()):
+            # Less than one building per stratum left: largest shares first
+            for stratum in sorted(shares, key=lambda s: -shares[s])[:remaining]:
+                granted[stratum] = 1
+        for stratum, count in granted.items():
+            allocation[stratum] += count
+        remaining -= sum(granted.values())
+    return allocation
+
+
+def draw_sample(fids, labels, sample_size, seed=0):
+    """Stratified simple random sample - returns ({fid: stratum}, {stratum: population size})"""
+    import numpy as np
+
+    labels = pool_strata(labels, sample_size)
+    strata, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    stratum_sizes = {str(s): int(c) for s, c in zip(strata, counts)}
+    allocation = allocate_sample(stratum_sizes, sample_size)
+
+    rng = random.Random(seed)
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    sample = {}
+    for i, stratum in enumerate(strata):
+        members = fids[order[starts[i]:starts[i + 1]]].tolist()
+        for fid in rng.sample(members, allocation[str(stratum)]):
+            sample[fid] = str(stratum)
+    return sample, stratum_sizes
+
+
+def read_sample(gdb_path, layer_name, sample, reader=None):
+    """Read the sampled features into rows with packed geometry (as read_gdb_buildings_chunked)
+
+    reader 'arrow' reads them in one pyogrio Arrow table, otherwise fiona reads them by FID.
+    """
+    if reader == 'arrow':
+        return read_sample_arrow(gdb_path, layer_name, sample)
+
+    import fiona
+    from triangulation import RingBatch, add_multipatch_geometry, assign_chunk_geometry
+
+    rows = []
+    batch = RingBatch()
+    with fiona.open(gdb_path, layer=layer_name) as src:
+        for fid in sorted(sample):
+            feature = src[fid]
+            properties = dict(feature['properties'])
+            geometry = feature.get('geometry')
+            add_multipatch_geometry(batch, geometry)
+            batch.end_building()
+            properties['_geometry_type'] = geometry.get('type') if geometry else None
+            properties['sample_fid'] = fid
+            properties['sample_stratum'] = sample[fid]
+            rows.append(properties)
+    assign_chunk_geometry(rows, batch)
+    return rows
+
+
+def read_sample_arrow(gdb_path, layer_name, sample):
+    """Read the sampled features through pyogrio Arrow and WKB decoding (as read_gdb_buildings_arrow)"""
+    from pyogrio.raw import read_arrow
+    from triangulation import triangulate_local
+    from wkb_reader import decode_wkb_batch
+
+    meta, table = read_arrow(gdb_path, layer=layer_name, fids=sorted(sample), return_fids=True)
+    geometry_name = meta.get('geometry_name') or 'wkb_geometry'
+    fid_name = meta.get('fid_column') or 'fid'
+    fids = table.column(fid_name).to_pylist()
+    rows = table.select([name for name in table.schema.names if name not in (geometry_name, fid_name)]).to_pylist()
+    vertices, faces, vertex_offsets, face_offsets, origins = triangulate_local(
+        *decode_wkb_batch(table.column(geometry_name).to_pylist()))
+    for i, (fid, properties) in enumerate(zip(fids, rows)):
+        properties['_vertices'] = vertices[vertex_offsets[i]:vertex_offsets[i + 1]]
+        properties['_faces'] = faces[face_offsets[i]:face_offsets[i + 1]]
+        properties['_origin'] = origins[i]
+        properties['_geometry_type'] = meta.get('geometry_type')
+        properties['sample_fid'] = fid
+        properties['sample_stratum'] = sample[fid]
+    return rows
+
+
+def stratified_total(values, strata, stratum_sizes):
+    """Stratified estimate of a population total - returns (total, variance, population covered)
+
+    Missing values are left out, i.e. taken as missing at random within their stratum.
+    """
+    import numpy as np
+
+    total = 0.0
+    variance = 0.0
+    covered = 0
+    for stratum, size in stratum_sizes.items():
+        y = values[(strata == stratum) & ~np.isnan(values)]
+        n = len(y)
+        if n == 0:
+            continue
+        total += size * y.mean()
+        if n > 1:
+            variance += size ** 2 * (1 - n / size) * y.var(ddof=1) / n
+        covered += size
+    return total, variance, covered
+
+
+def estimate_metrics(df, columns, stratum_sizes, confidence=DEFAULT_CONFIDENCE, group_by=None):
+    """Totals and means per metric column (and per group) with normal confidence intervals"""
+    import numpy as np
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    strata = df['sample_stratum'].astype(str).to_numpy()
+    groups = [(None, np.ones(len(df), dtype=bool))]
+    if group_by:
+        groups += [(group, (df[group_by] == group).to_numpy()) for group in sorted(df[group_by].dropna().unique())]
+
+    rows = []
+    for group, member in groups:
+        # Domain estimates: values outside the group count as zero, not as missing
+        count, count_variance, _ = stratified_total(member.astype(float), strata, stratum_sizes)
+        for column in columns:
+            values = df[column].to_numpy(dtype=np.float64)
+            domain_values = np.where(member, values, np.where(np.isnan(values), np.nan, 0.0))
+            total, variance, covered = stratified_total(domain_values, strata, stratum_sizes)
+            margin = z * variance ** 0.5
+            # Group means use the estimated group size as if it were known
+            buildings = count if group is not None else covered
+            rows.append({
+                'group': group,
+                'metric': column,
+                'total': total,
+                'total_ci_low': total - margin,
+                'total_ci_high': total + margin,
+                'mean': total / buildings if buildings else np.nan,
+                'mean_ci_low': (total - margin) / buildings if buildings else np.nan,
+                'mean_ci_high': (total + margin) / buildings if buildings else np.nan,
+                'buildings': buildings,
+                'buildings_ci': z * count_variance ** 0.5 if group is not None else 0.0,
+                'sampled': int((member & ~np.isnan(values)).sum()),
+            })
+    return rows
+
+
+def format_estimates(estimates, confidence):
+    """Format estimates as readable text"""
+    lines = [f"Estimates ({confidence * 100:g}% confidence intervals):"]
+    for row in estimates:
+        label = row['metric'] if row['group'] is None else f"{row['metric']} [{row['group']}]"
+        lines.append(f"  {label}: total {row['total']:,.0f} ({row['total_ci_low']:,.0f} - "
+                     f"{row['total_ci_high']:,.0f}), mean {row['mean']:,.2f} ({row['mean_ci_low']:,.2f} - "
+                     f"{row['mean_ci_high']:,.2f}), n={row['sampled']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Command line entry point of the sample subcommand"""
+    import pandas as pd
+    from main import setup_logging, default_worker_count, start_worker_pool, process_chunk_parallel
+    from readers import READERS, resolve_layer_name, read_gdb_buildings_chunked, select_reader
+    from result_schema import build_results_frame, RESULT_DTYPES
+
+    parser = argparse.ArgumentParser(prog='main.py sample',
+                                     description='Estimate national totals from a stratified random sample')
+    parser.add_argument('input_gdb', help='Path to input GDB file')
+    parser.add_argument('output_dir', help='Output directory for the sample and the estimates')
+    parser.add_argument('--layer', default='Building_solid', help='GDB layer name')
+    parser.add_argument('--reader', choices=READERS,
+                        help='Input reader: fiona or arrow (default: by file type; CityGML, CityJSON and '
+                             'geometry caches cannot be sampled by feature ID)')
+    parser.add_argument('--size', type=int, default=DEFAULT_SAMPLE_SIZE,
+                        help=f'Number of sampled buildings (default: {DEFAULT_SAMPLE_SIZE})')
+    parser.add_argument('--strata', choices=STRATA, default='tile',
+                        help='Stratify by LV95 tile or by footprint size class (default: tile)')
+    parser.add_argument('--tile-size', type=float, default=DEFAULT_TILE_SIZE,
+                        help=f'Tile edge length in meters (default: {DEFAULT_TILE_SIZE})')
+    parser.add_argument('--metrics', type=parse_metrics, default=parse_metrics(DEFAULT_METRICS),
+                        help=f'Metrics to estimate, as for a processing run (default: {DEFAULT_METRICS})')
+    parser.add_argument('--group-by', help='Attribute for estimates per group, e.g. a canton field')
+    parser.add_argument('--confidence', type=float, default=DEFAULT_CONFIDENCE,
+                        help=f'Confidence level of the intervals (default: {DEFAULT_CONFIDENCE})')
+    parser.add_argument('--workers', type=int, help='Number of parallel workers')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the sample')
+    args = parser.parse_args(argv)
+
+    # The sample is drawn by feature ID, which only GDAL inputs (fiona or Arrow) provide
+    read_chunks = select_reader(Path(args.input_gdb), args.reader)
+    if read_chunks is not read_gdb_buildings_chunked and args.reader != 'arrow':
+        parser.error(f"{args.input_gdb} cannot be sampled by feature ID with the "
+                     f"{args.reader or read_chunks.__module__} reader, use a GDB or other GDAL input")
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    logger = setup_logging(output_dir)
+    start_time = time.time()
+    plan = plan_metrics(args.metrics)
+    actual_layer = resolve_layer_name(args.input_gdb, args.layer)
+
+    # Step 1: Strata from the bounding boxes of all features
+    fids, bounds = read_feature_bounds(args.input_gdb, actual_layer)
+    labels = assign_strata(bounds, args.strata, args.tile_size)
+    sample, stratum_sizes = draw_sample(fids, labels, args.size, args.seed)
+    logger.info(f"Population: {len(fids)} buildings in {len(stratum_sizes)} {args.strata} strata, "
+                f"sample: {len(sample)} buildings")
+
+    # Step 2: Process the sampled buildings
+    rows = read_sample(args.input_gdb, actual_layer, sample, args.reader)
+    num_workers = max(args.workers or default_worker_count(), 1)
+    executor = start_worker_pool(num_workers)
+    try:
+        records = process_chunk_parallel(rows, 0, num_workers, executor=executor, stages=plan['stages'])
+    finally:
+        executor.shutdown()
+    df = build_results_frame(rows, records, plan['columns'])
+
+    # Step 3: Estimates with confidence intervals
+    columns = [name for name in plan['columns'] if RESULT_DTYPES[name].startswith('float')]
+    estimates = estimate_metrics(df, columns, stratum_sizes, args.confidence, args.group_by)
+
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    sampled_per_stratum = df['sample_stratum'].value_counts()
+    df['sample_weight'] = [stratum_sizes[s] / sampled_per_stratum[s] for s in df['sample_stratum']]
+    df.to_csv(output_dir / f'sample_results_{stamp}.csv', index=False)
+    pd.DataFrame(estimates).to_csv(output_dir / f'sample_estimates_{stamp}.csv', index=False)
+
+    logger.info(format_estimates(estimates, args.confidence))
+    elapsed = time.time() - start_time
+    logger.info(f"Sample of {len(df)} buildings (metrics {describe_plan(plan)}) estimated in {elapsed:.1f} seconds")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
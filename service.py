@@ -0,0 +1,386 @@
+"""
+Local analysis service module
+Keeps a warm worker pool (geometry modules imported, caches primed) and answers per-building
+requests as JSON lines on stdin/stdout or over local HTTP. Requests that arrive while all
+workers are busy are merged into one pool task (micro-batching), and the p50/p99 latency
+is reported on request
+"""
+
+import sys
+import json
+import time
+import queue
+import argparse
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from metrics import parse_metrics, plan_metrics, describe_plan
+from welding import DEFAULT_WELD_TOLERANCE
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH = 64  # Buildings per pool task
+LATENCY_WINDOW = 10000  # Requests kept for the latency percentiles
+
+# Unit cube, processed once per worker at startup so the first request pays no first-call costs
+WARMUP_GEOMETRY = {'type': 'MultiPolygon', 'coordinates': [
+    [[[0, 0, 0], [0, 1, 0], [1, 1, 0], [1, 0, 0], [0, 0, 0]]],
+    [[[0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1], [0, 0, 1]]],
+    [[[0, 0, 0], [1, 0, 0], [1, 0, 1], [0, 0, 1], [0, 0, 0]]],
+    [[[1, 0, 0], [1, 1, 0], [1, 1, 1], [1, 0, 1], [1, 0, 0]]],
+    [[[1, 1, 0], [0, 1, 0], [0, 1, 1], [1, 1, 1], [1, 1, 0]]],
+    [[[0, 1, 0], [0, 0, 0], [0, 0, 1], [0, 1, 1], [0, 1, 0]]],
+]}
+
+
+def parse_buildings(buildings):
+    """Geometry tasks (vertices, faces, origin) of request buildings with GeoJSON 'geometry' or hex 'wkb'"""
+    from triangulation import RingBatch, add_multipatch_geometry, triangulate_local
+    from wkb_reader import decode_wkb_batch
+
+    tasks = [None] * len(buildings)
+
+    # GeoJSON geometries through the same ring batch as the GDB reader
+    geojson = [i for i, building in enumerate(buildings) if 'wkb' not in building]
+    if geojson:
+        batch = RingBatch()
+        for i in geojson:
+            add_multipatch_geometry(batch, buildings[i].get('geometry'))
+            batch.end_building()
+        vertices, faces, vertex_offsets, face_offsets, origins = batch.triangulate()
+        for n, i in enumerate(geojson):
+            tasks[i] = (vertices[vertex_offsets[n]:vertex_offsets[n + 1]], faces[face_offsets[n]:face_offsets[n + 1]],
+                        origins[n])
+
+    # WKB (hex) through the bulk WKB decoder
+    wkb = [i for i, building in enumerate(buildings) if 'wkb' in building]
+    if wkb:
+        values = []
+        for i in wkb:
+            try:
+                values.append(bytes.fromhex(buildings[i]['wkb']))
+            except (TypeError, ValueError):
+                values.append(None)
+        vertices, faces, vertex_offsets, face_offsets, origins = triangulate_local(*decode_wkb_batch(values))
+        for n, i in enumerate(wkb):
+            tasks[i] = (vertices[vertex_offsets[n]:vertex_offsets[n + 1]], faces[face_offsets[n]:face_offsets[n + 1]],
+                        origins[n])
+    return tasks
+
+
+class LatencyStats:
+    """Request latencies and pool task sizes of the running service"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.buildings = 0
+        self.pool_tasks = 0
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+
+    def add_request(self, seconds, buildings):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.requests += 1
+            self.buildings += buildings
+
+    def add_pool_task(self):
+        with self.lock:
+            self.pool_tasks += 1
+
+    def summary(self):
+        """Request count, buildings/s, latency percentiles in ms and mean buildings per pool task"""
+        import numpy as np
+
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            elapsed = time.time() - self.start_time
+            return {
+                'requests': self.requests,
+                'buildings': self.buildings,
+                'buildings_per_s': self.buildings / elapsed if elapsed > 0 else None,
+                'latency_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'latency_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+                'latency_max_ms': float(latencies.max()) if len(latencies) else None,
+                'buildings_per_pool_task': self.buildings / self.pool_tasks if self.pool_tasks else None,
+            }
+
+
+class PendingRequest:
+    """Buildings of one request waiting for their records"""
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.records = [None] * len(tasks)
+        self.remaining = len(tasks)
+        self.future = Future()
+
+
+class BuildingService:
+    """Warm worker pool with a dispatcher that micro-batches the queued requests
+
+    A pool task is only submitted when a worker is free; everything queued by then (up to
+    max_batch buildings) goes into that task, so batches grow with the load while a single
+    request on an idle service is sent on its own.
+    """
+
+    def __init__(self, num_workers, weld_tolerance=DEFAULT_WELD_TOLERANCE, metrics=None,
+                 max_batch=DEFAULT_MAX_BATCH):
+        from worker import start_worker_pool
+
+        self.logger = logging.getLogger(__name__)
+        self.num_workers = num_workers
+        self.weld_tolerance = weld_tolerance
+        self.plan = plan_metrics(metrics)
+        self.max_batch = max_batch
+        self.stats = LatencyStats()
+        self.lock = threading.Lock()
+        self.free_workers = threading.Semaphore(num_workers)
+        self.requests = queue.Queue()
+        self.executor = start_worker_pool(num_workers)
+        self.dispatcher = threading.Thread(target=self.dispatch, name='dispatcher', daemon=True)
+        self.dispatcher.start()
+        self.warm_up()
+
+    def warm_up(self):
+        """Process one small building per worker before the first request"""
+        start = time.perf_counter()
+        pending = [self.submit(parse_buildings([{'geometry': WARMUP_GEOMETRY}] * self.max_batch))
+                   for _ in range(self.num_workers)]
+        for request in pending:
+            request.future.result()
+        self.stats = LatencyStats()
+        self.logger.info(f"Service warm in {time.perf_counter() - start:.2f}s ({self.num_workers} workers, "
+                         f"metrics {describe_plan(self.plan)})")
+
+    def submit(self, tasks):
+        """Queue geometry tasks - returns the PendingRequest whose future yields the records"""
+        request = PendingRequest(tasks)
+        if not tasks:
+            request.future.set_result([])
+        else:
+            self.requests.put(request)
+        return request
+
+    def dispatch(self):
+        """Dispatcher thread: wait for a free worker, then send everything queued"""
+        from worker import process_building_batch
+
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            self.free_workers.acquire()
+
+            # Requests that arrived while waiting for a worker join this task
+            items = [(request, position) for position in range(len(request.tasks))]
+            while len(items) < self.max_batch:
+                try:
+                    request = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)
+                    break
+                items.extend((request, position) for position in range(len(request.tasks)))
+
+            # Large requests are split over several free workers
+            for start in range(0, len(items), self.max_batch):
+                piece = items[start:start + self.max_batch]
+                if start:
+                    self.free_workers.acquire()
+                batch = [(n,) + tuple(request.tasks[position]) for n, (request, position) in enumerate(piece)]
+                future = self.executor.submit(process_building_batch, batch, self.weld_tolerance,
+                                              self.plan['stages'])
+                future.add_done_callback(lambda future, piece=piece: self.complete(future, piece))
+                self.stats.add_pool_task()
+
+    def complete(self, future, piece):
+        """Hand the records of a finished pool task to their requests"""
+        from result_schema import ErrorCode, failed_record
+
+        self.free_workers.release()
+        error = None
+        try:
+            records = {idx: record for idx, record, _ in future.result()}
+        except Exception as e:
+            self.logger.error(f"Pool task failed: {str(e)}")
+            records = {}
+            error = failed_record(ErrorCode.WORKER_ERROR, str(e))
+        with self.lock:
+            for n, (request, position) in enumerate(piece):
+                request.records[position] = records.get(n, error)
+                request.remaining -= 1
+                if request.remaining == 0:
+                    request.future.set_result(request.records)
+
+    def handle(self, message):
+        """Answer one request dict (see README) - returns the response dict"""
+        from result_schema import decode_record
+
+        start = time.perf_counter()
+        if not isinstance(message, dict):
+            raise ValueError(f"A request must be a JSON object, got {type(message).__name__}")
+        if message.get('command') == 'stats':
+            return dict(self.stats.summary(), id=message.get('id'))
+
+        many = 'buildings' in message
+        buildings = message['buildings'] if many else [message]
+        if not isinstance(buildings, list) or not all(isinstance(b, dict) for b in buildings):
+            raise ValueError("'buildings' must be a list of objects")
+        request = self.submit(parse_buildings(buildings))
+        records = request.future.result()
+
+        results = []
+        for building, record in zip(buildings, records):
+            result = {'id': building.get('id')}
+            result.update(decode_record(record, self.plan['columns']))
+            results.append(result)
+        seconds = time.perf_counter() - start
+        self.stats.add_request(seconds, len(buildings))
+
+        if many:
+            return {'id': message.get('id'), 'results': results, 'latency_ms': seconds * 1000}
+        return dict(results[0], latency_ms=seconds * 1000)
+
+    def close(self):
+        """Stop the dispatcher and the worker pool"""
+        self.requests.put(None)
+        self.dispatcher.join()
+        self.executor.shutdown()
+        self.logger.info(f"Service stats: {json.dumps(self.stats.summary())}")
+
+
+def serve_stdio(service, stdin=None, stdout=None):
+    """Answer JSON-line requests from stdin in order; requests are pipelined, so batches form under load"""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    responses = queue.Queue()
+
+    def answer(message):
+        try:
+            return service.handle(message)
+        except Exception as e:
+            return {'id': message.get('id') if isinstance(message, dict) else None, 'error': str(e)}
+
+    def write():
+        while True:
+            response = responses.get()
+            if response is None:
+                return
+            stdout.write(json.dumps(response.result()) + "\n")
+            stdout.flush()
+
+    from concurrent.futures import ThreadPoolExecutor
+    writer = threading.Thread(target=write, name='writer', daemon=True)
+    writer.start()
+    # Enough handler threads to keep every worker busy with pipelined requests
+    with ThreadPoolExecutor(max_workers=service.num_workers * 4) as handlers:
+        for line in stdin:
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError as e:
+                done = Future()
+                done.set_result({'error': f"Invalid JSON: {e}"})
+                responses.put(done)
+                continue
+            responses.put(handlers.submit(answer, message))
+    responses.put(None)
+    writer.join()
+
+
+def serve_http(service, host, port):
+    """Answer POST /analyze with a JSON request; GET /stats and GET /health"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self.send_json(200, service.stats.summary())
+            elif self.path == '/health':
+                self.send_json(200, {'status': 'ok', 'workers': service.num_workers})
+            else:
+                self.send_json(404, {'error': f"Unknown path: {self.path}"})
+
+        def do_POST(self):
+            if self.path != '/analyze':
+                self.send_json(404, {'error': f"Unknown path: {self.path}"})
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                if self.headers.get('Content-Type') == 'application/octet-stream':
+                    message = {'wkb': body.hex()}  # A single raw WKB geometry
+                else:
+                    message = json.loads(body)
+                response = service.handle(message)
+            except (ValueError, KeyError, TypeError) as e:
+                self.send_json(400, {'error': str(e)})
+                return
+            except Exception as e:
+                # Worker or pool failures are answered too, the connection must not just drop
+                logging.getLogger(__name__).error(f"Request failed: {type(e).__name__}: {e}")
+                self.send_json(500, {'error': f"{type(e).__name__}: {e}"})
+                return
+            self.send_json(200, response)
+
+        def log_message(self, format, *args):
+            logging.getLogger(__name__).debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    logging.getLogger(__name__).info(f"Listening on http://{host}:{port} (POST /analyze, GET /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    """Command line entry point of the serve subcommand"""
+    parser = argparse.ArgumentParser(prog='main.py serve',
+                                     description='Analyze single buildings with low latency from a warm worker pool '
+                                                 '(JSON lines on stdin/stdout, or local HTTP)')
+    parser.add_argument('--http', type=int, nargs='?', const=DEFAULT_PORT, metavar='PORT',
+                        help=f'Serve HTTP instead of stdin/stdout (default port: {DEFAULT_PORT})')
+    parser.add_argument('--host', default='127.0.0.1', help='HTTP address to bind (default: 127.0.0.1)')
+    parser.add_argument('--workers', type=int, help='Number of parallel workers')
+    parser.add_argument('--metrics', type=parse_metrics, default=None, help='Comma separated outputs to compute')
+    parser.add_argument('--weld-tolerance', type=float, default=DEFAULT_WELD_TOLERANCE,
+                        help=f'Vertex weld tolerance in meters (default: {DEFAULT_WELD_TOLERANCE:g})')
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH,
+                        help=f'Largest number of buildings per pool task (default: {DEFAULT_MAX_BATCH})')
+    args = parser.parse_args(argv)
+
+    # stdout carries the responses in stdio mode, so the log goes to stderr
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    from worker import default_worker_count
+    service = BuildingService(args.workers or default_worker_count(), args.weld_tolerance, args.metrics,
+                              max(args.max_batch, 1))
+    try:
+        if args.http:
+            serve_http(service, args.host, args.http)
+        else:
+            serve_stdio(service)
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
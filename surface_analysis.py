@@ -7,7 +7,14 @@ import numpy as np
 import trimesh
 import logging
 
-def classify_face_orientation(normal_z, horizontal_tolerance=10.0, vertical_tolerance=10.0):
+HORIZONTAL_TOLERANCE = 10.0  # Degrees from horizontal still counted as horizontal
+VERTICAL_TOLERANCE = 10.0  # Degrees from vertical still counted as wall
+FOOTPRINT_FRACTION = 0.1  # Horizontal faces in the lowest share of their z range are footprint
+MIN_Z_RANGE = 0.01  # Below this z range of the horizontal faces the footprint band is FLAT_FOOTPRINT_BAND
+FLAT_FOOTPRINT_BAND = 0.1  # Meters above the lowest horizontal face
+
+def classify_face_orientation(normal_z, horizontal_tolerance=HORIZONTAL_TOLERANCE,
+                              vertical_tolerance=VERTICAL_TOLERANCE):
     """Classify face as horizontal, vertical, or sloped"""
     horizontal_tol_rad = np.radians(horizontal_tolerance)
     vertical_tol_rad = np.radians(vertical_tolerance)
@@ -26,8 +33,8 @@ def classify_face_orientation(normal_z, horizontal_tolerance=10.0, vertical_tole
     else:
         return 'sloped'
 
-def analyze_building_surfaces(vertices, faces):
-    """Analyze building surfaces and calculate areas"""
+def analyze_building_surfaces(vertices, faces, origin=None):
+    """Analyze building surfaces and calculate areas (origin shifts local vertices back to elevations)"""
     result = {
         'surf_roof_area': None,
         'surf_footprint_area': None,
@@ -47,15 +54,15 @@ def analyze_building_surfaces(vertices, faces):
     
     try:
         # Validate input
-        if not vertices or not faces:
+        if len(vertices) == 0 or len(faces) == 0:
             result['surf_analysis_error'] = "No vertices or faces provided"
             return result
         
-        # Create trimesh directly from vertices and faces
+        # Create trimesh directly from the welded vertices and faces
         mesh = trimesh.Trimesh(
-            vertices=np.array(vertices),
-            faces=np.array(faces),
-            process=True  # Merge duplicate vertices
+            vertices=np.asarray(vertices, dtype=np.float64),
+            faces=np.asarray(faces, dtype=np.int64),
+            process=False
         )
         
         # Get mesh properties
@@ -98,7 +105,8 @@ def analyze_building_surfaces(vertices, faces):
             z_range = max_z - min_z
             
             # Footprint threshold
-            footprint_threshold = min_z + 0.1 * z_range if z_range > 0.01 else min_z + 0.1
+            footprint_threshold = (min_z + FOOTPRINT_FRACTION * z_range if z_range > MIN_Z_RANGE
+                                   else min_z + FLAT_FOOTPRINT_BAND)
             
             for face in horizontal_faces:
                 if face['z'] <= footprint_threshold:
@@ -120,8 +128,9 @@ def analyze_building_surfaces(vertices, faces):
         # Building height and elevation
         if len(mesh.vertices) > 0:
             z_coords = mesh.vertices[:, 2]
-            result['surf_min_elevation'] = float(np.min(z_coords))
-            result['surf_max_elevation'] = float(np.max(z_coords))
+            z_origin = float(origin[2]) if origin is not None else 0.0
+            result['surf_min_elevation'] = z_origin + float(np.min(z_coords))
+            result['surf_max_elevation'] = z_origin + float(np.max(z_coords))
             result['surf_building_height'] = float(np.max(z_coords) - np.min(z_coords))
             
             # Wall perimeter estimation
@@ -139,4 +148,78 @@ def analyze_building_surfaces(vertices, faces):
         result['surf_analysis_error'] = str(e)
         logging.debug(f"Surface analysis error: {str(e)}")
     
-    return result
\ No newline at end of file
+    return result
+
+def sweep_surface_areas(vertices, faces, horizontal_tolerances, vertical_tolerances, footprint_fractions):
+    """Roof, footprint, wall and sloped areas for every combination of classification settings
+    
+    Normals, areas and centroids are computed once; returns an array of shape
+    (horizontal, vertical, footprint, 4) with the areas in that order, classified as in
+    analyze_building_surfaces.
+    """
+    mesh = trimesh.Trimesh(
+        vertices=np.asarray(vertices, dtype=np.float64),
+        faces=np.asarray(faces, dtype=np.int64),
+        process=False
+    )
+    face_areas = mesh.area_faces
+    abs_z = np.abs(mesh.face_normals[:, 2])
+    centroid_z = mesh.triangles_center[:, 2]
+    
+    # Face classes per tolerance: (horizontal, faces) and (horizontal, vertical, faces)
+    horizontal_limits = np.cos(np.radians(np.asarray(horizontal_tolerances, dtype=np.float64)))
+    vertical_limits = np.sin(np.radians(np.asarray(vertical_tolerances, dtype=np.float64)))
+    horizontal = abs_z > horizontal_limits[:, None]
+    vertical = ~horizontal[:, None, :] & (abs_z < vertical_limits[:, None])[None]
+    sloped = ~horizontal[:, None, :] & ~vertical
+    
+    # Footprint bands from the horizontal faces of each horizontal tolerance
+    fractions = np.asarray(footprint_fractions, dtype=np.float64)
+    footprint = np.zeros((len(horizontal), len(fractions)))
+    roof = np.zeros((len(horizontal), len(fractions)))
+    for h, mask in enumerate(horizontal):
+        if not mask.any():
+            continue
+        z = centroid_z[mask]
+        min_z = z.min()
+        z_range = z.max() - min_z
+        if z_range > MIN_Z_RANGE:
+            thresholds = min_z + fractions * z_range
+        else:
+            thresholds = np.full(len(fractions), min_z + FLAT_FOOTPRINT_BAND)
+        in_footprint = z[None, :] <= thresholds[:, None]
+        footprint[h] = in_footprint @ face_areas[mask]
+        roof[h] = ~in_footprint @ face_areas[mask]
+    
+    areas = np.empty((len(horizontal), vertical.shape[1], len(fractions), 4))
+    areas[..., 0] = roof[:, None, :]
+    areas[..., 1] = footprint[:, None, :]
+    areas[..., 2] = (vertical @ face_areas)[:, :, None]
+    areas[..., 3] = (sloped @ face_areas)[:, :, None]
+    return areas
+
+def analyze_building_elevation(vertices, origin=None):
+    """Building height and elevations from the vertices only (no mesh, no face classification)"""
+    result = {
+        'surf_building_height': None,
+        'surf_min_elevation': None,
+        'surf_max_elevation': None,
+        'surf_analysis_error': None
+    }
+    
+    try:
+        z_coords = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)[:, 2]
+        if len(z_coords) == 0:
+            result['surf_analysis_error'] = "No vertices provided"
+            return result
+        
+        z_origin = float(origin[2]) if origin is not None else 0.0
+        result['surf_min_elevation'] = z_origin + float(np.min(z_coords))
+        result['surf_max_elevation'] = z_origin + float(np.max(z_coords))
+        result['surf_building_height'] = float(np.max(z_coords) - np.min(z_coords))
+        
+    except Exception as e:
+        result['surf_analysis_error'] = str(e)
+        logging.debug(f"Elevation analysis error: {str(e)}")
+    
+    return result
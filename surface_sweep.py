@@ -0,0 +1,208 @@
+"""
+Surface classification sweep module
+Computes roof, footprint, wall and sloped areas for a grid of horizontal/vertical
+tolerances and footprint fractions in one pass over a layer (normals, areas and
+centroids once per building) and writes them in long format for calibration
+against reference data
+"""
+
+import sys
+import time
+import argparse
+import logging
+from pathlib import Path
+from itertools import product
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from chunking import parse_size
+from welding import DEFAULT_WELD_TOLERANCE
+from surface_analysis import HORIZONTAL_TOLERANCE, VERTICAL_TOLERANCE, FOOTPRINT_FRACTION
+
+DEFAULT_HORIZONTAL = '5,10,15'
+DEFAULT_VERTICAL = '5,10,15'
+DEFAULT_FOOTPRINT = '0.05,0.1,0.2'
+DEFAULT_ID_COLUMNS = 'UUID,EGID'
+PARAMETER_COLUMNS = ['horizontal_tolerance', 'vertical_tolerance', 'footprint_fraction']
+AREA_COLUMNS = ['roof_area', 'footprint_area', 'wall_area', 'sloped_area']
+
+
+def parse_grid(text):
+    """Comma separated, distinct grid values in the given order"""
+    values = []
+    for value in str(text).split(','):
+        if float(value) not in values:
+            values.append(float(value))
+    if not values:
+        raise ValueError("Empty grid")
+    return values
+
+
+def sweep_building_batch(tasks, grid, weld_tolerance=DEFAULT_WELD_TOLERANCE):
+    """Sweep a batch of buildings in a worker - returns [(idx, areas or None, error)]
+
+    grid is (horizontal tolerances, vertical tolerances, footprint fractions); vertices
+    are welded as for a processing run, so the grid point of the defaults matches the
+    surf_ columns of a run.
+    """
+    from surface_analysis import sweep_surface_areas
+    from worker import weld_batch
+
+    welded = weld_batch(tasks, weld_tolerance) if weld_tolerance is not None else {}
+    results = []
+    for task in tasks:
+        idx, vertices, faces = task[:3]
+        if idx in welded:
+            vertices, faces, _ = welded[idx]
+        try:
+            if len(vertices) == 0 or len(faces) == 0:
+                results.append((idx, None, 'No vertices or faces provided'))
+            else:
+                results.append((idx, sweep_surface_areas(vertices, faces, *grid), None))
+        except Exception as e:
+            results.append((idx, None, str(e)))
+    return results
+
+
+def sweep_frame(chunk_data, areas, errors, grid, id_columns):
+    """Long-format rows of a chunk: one per building and grid point"""
+    import numpy as np
+    import pandas as pd
+
+    combinations = np.array(list(product(*grid)), dtype=np.float64)
+    count = len(chunk_data)
+    frame = {name: np.repeat(np.array([row.get(name) for row in chunk_data], dtype=object), len(combinations))
+             for name in id_columns}
+    for i, name in enumerate(PARAMETER_COLUMNS):
+        frame[name] = np.tile(combinations[:, i], count)
+    flat = areas.reshape(count * len(combinations), len(AREA_COLUMNS))
+    for i, name in enumerate(AREA_COLUMNS):
+        frame[name] = flat[:, i]
+    frame['error_detail'] = np.repeat(np.array(errors, dtype=object), len(combinations))
+    return pd.DataFrame(frame)
+
+
+def sweep_chunk(chunk_data, chunk_num, executor, num_workers, grid, weld_tolerance, max_chunk_bytes=None):
+    """Areas of a chunk for all grid points - returns (areas, errors), NaN areas where a building failed"""
+    import numpy as np
+    from main import plan_chunk_batches
+
+    areas = np.full((len(chunk_data),) + tuple(len(values) for values in grid) + (len(AREA_COLUMNS),), np.nan)
+    errors = [None] * len(chunk_data)
+    batches, _, _, max_in_flight = plan_chunk_batches(chunk_data, num_workers, max_chunk_bytes)
+
+    pending = {}
+    next_batch = 0
+    while next_batch < len(batches) or pending:
+        while next_batch < len(batches) and len(pending) < max_in_flight:
+            batch = batches[next_batch]
+            tasks = [task[:3] for task in batch]  # Areas need no origin
+            pending[executor.submit(sweep_building_batch, tasks, grid, weld_tolerance)] = batch
+            next_batch += 1
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            batch = pending.pop(future)
+            try:
+                results = future.result()
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Error sweeping batch in chunk {chunk_num}, idx {batch[0][0]}: "
+                                                  f"{str(e)}")
+                results = [(task[0], None, str(e)) for task in batch]
+            for idx, building_areas, error in results:
+                if building_areas is not None:
+                    areas[idx] = building_areas
+                errors[idx] = error
+    return areas, errors
+
+
+def main(argv=None):
+    """Command line entry point of the sweep subcommand"""
+    import numpy as np
+    import pandas as pd
+    from chunking import CHUNK_SIZE
+    from readers import READERS, select_reader
+    from main import setup_logging, start_worker_pool, default_worker_count
+
+    parser = argparse.ArgumentParser(prog='main.py sweep',
+                                     description='Roof, footprint, wall and sloped areas for a grid of surface '
+                                                 'classification settings in one pass, in long format')
+    parser.add_argument('input_gdb', help='Path to input GDB file (or any input of a processing run)')
+    parser.add_argument('output_dir', help='Output directory for the sweep results')
+    parser.add_argument('--horizontal', type=parse_grid, default=parse_grid(DEFAULT_HORIZONTAL),
+                        help=f'Horizontal tolerances in degrees (default: {DEFAULT_HORIZONTAL}, '
+                             f'runs use {HORIZONTAL_TOLERANCE:g})')
+    parser.add_argument('--vertical', type=parse_grid, default=parse_grid(DEFAULT_VERTICAL),
+                        help=f'Vertical tolerances in degrees (default: {DEFAULT_VERTICAL}, '
+                             f'runs use {VERTICAL_TOLERANCE:g})')
+    parser.add_argument('--footprint', type=parse_grid, default=parse_grid(DEFAULT_FOOTPRINT),
+                        help=f'Footprint fractions of the z range of the horizontal faces (default: '
+                             f'{DEFAULT_FOOTPRINT}, runs use {FOOTPRINT_FRACTION:g})')
+    parser.add_argument('--id-columns', default=DEFAULT_ID_COLUMNS,
+                        help=f'Attributes identifying a building in the output (default: {DEFAULT_ID_COLUMNS})')
+    parser.add_argument('--layer', default='Building_solid', help='GDB layer name')
+    parser.add_argument('--reader', choices=READERS,
+                        help='Input reader (default: by file type)')
+    parser.add_argument('--limit', type=int, help='Limit number of buildings')
+    parser.add_argument('--workers', type=int, help='Number of parallel workers')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'Number of buildings per chunk (default: {CHUNK_SIZE})')
+    parser.add_argument('--max-chunk-mem', type=parse_size, help='Memory budget per chunk, e.g. 2G')
+    parser.add_argument('--weld-tolerance', type=float, default=DEFAULT_WELD_TOLERANCE,
+                        help=f'Vertex weld tolerance in meters (default: {DEFAULT_WELD_TOLERANCE:g})')
+    args = parser.parse_args(argv)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    logger = setup_logging(output_dir)
+    grid = (args.horizontal, args.vertical, args.footprint)
+    combinations = len(args.horizontal) * len(args.vertical) * len(args.footprint)
+    logger.info(f"Sweep of {combinations} settings: horizontal {args.horizontal}, vertical {args.vertical}, "
+                f"footprint {args.footprint}")
+
+    start_time = time.time()
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    results_path = output_dir / f'surface_sweep_{stamp}.csv'
+    totals = np.zeros(tuple(len(values) for values in grid) + (len(AREA_COLUMNS),))
+    swept = 0
+    failed = 0
+
+    num_workers = args.workers or default_worker_count()
+    executor = start_worker_pool(num_workers)
+    try:
+        read_chunks = select_reader(Path(args.input_gdb), args.reader)
+        for chunk_num, chunk_data in read_chunks(Path(args.input_gdb), args.layer, args.chunk_size, args.limit,
+                                                 None, args.max_chunk_mem):
+            # Step 1: Areas of every building for all grid points
+            areas, errors = sweep_chunk(chunk_data, chunk_num, executor, num_workers, grid, args.weld_tolerance,
+                                        args.max_chunk_mem)
+
+            # Step 2: Append the long-format rows and add to the totals
+            id_columns = [name for name in args.id_columns.split(',') if name in chunk_data[0]] if chunk_data else []
+            df = sweep_frame(chunk_data, areas, errors, grid, id_columns)
+            if not id_columns:
+                first = swept + failed
+                df.insert(0, 'building_index', np.repeat(np.arange(first, first + len(chunk_data)), combinations))
+            df.to_csv(results_path, mode='a', header=chunk_num == 0, index=False)
+            ok = ~np.isnan(areas).any(axis=tuple(range(1, areas.ndim)))
+            totals += areas[ok].sum(axis=0)
+            swept += int(ok.sum())
+            failed += int((~ok).sum())
+            logger.info(f"Chunk {chunk_num}: swept {int(ok.sum())}/{len(chunk_data)} buildings")
+    finally:
+        executor.shutdown()
+
+    # Step 3: Totals per grid point for a quick comparison of the settings
+    summary = pd.DataFrame(list(product(*grid)), columns=PARAMETER_COLUMNS)
+    for i, name in enumerate(AREA_COLUMNS):
+        summary[f'total_{name}'] = totals[..., i].reshape(-1)
+    summary['buildings'] = swept
+    summary.to_csv(output_dir / f'surface_sweep_totals_{stamp}.csv', index=False)
+
+    elapsed = time.time() - start_time
+    logger.info(f"Swept {swept} buildings ({failed} failed) over {combinations} settings in {elapsed:.1f}s, "
+                f"results in {results_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""Regression checks of the ring triangulation"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from triangulation import RingBatch
+
+
+def triangulated_area(outer, holes):
+    """Area of the triangles of one polygon with holes (rings without the closing point)"""
+    batch = RingBatch()
+    batch.add_ring(outer + outer[:1])
+    for hole in holes:
+        batch.add_ring(hole + hole[:1], is_hole=True)
+    batch.end_building()
+    vertices, faces, _, _, _ = batch.triangulate()
+    vertices = vertices.astype(np.float64)
+    cross = np.cross(vertices[faces[:, 1]] - vertices[faces[:, 0]], vertices[faces[:, 2]] - vertices[faces[:, 0]])
+    return 0.5 * np.abs(cross).sum()
+
+
+def test_bridge_does_not_pass_through_hole_vertex():
+    # The nearest outer vertex (0, 0) is only reachable through the hole corner (2, 2)
+    outer = [[0, 0, 0], [10, 0, 0], [10, 10, 0], [0, 10, 0]]
+    hole = [[2, 2, 0], [2, 4, 0], [4, 4, 0], [4, 2, 0]]
+    assert triangulated_area(outer, [hole]) == 96.0
+
+
+def test_two_holes():
+    outer = [[0, 0, 0], [10, 0, 0], [10, 10, 0], [0, 10, 0]]
+    holes = [[[5, 5, 0], [5, 6, 0], [6, 6, 0], [6, 5, 0]], [[7, 5, 0], [7, 6, 0], [8, 6, 0], [8, 5, 0]]]
+    assert triangulated_area(outer, holes) == 98.0
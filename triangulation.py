@@ -0,0 +1,466 @@
+"""
+Polygon triangulation module
+Triangulates multipatch rings in packed batches: each polygon is projected to its best-fit
+plane, convex rings keep the fast fan path, concave rings and rings with holes use ear clipping
+"""
+
+import logging
+from array import array
+
+import numpy as np
+
+CONVEX_TOLERANCE = 1e-9  # Sine of the turning angle still counted as straight
+
+# Compact storage of parsed buildings: coordinates relative to the building origin
+VERTEX_DTYPE = np.float32  # Below 0.1 mm within a few hundred meters of the origin
+FACE_DTYPE = np.int32  # Vertex indices local to each building
+
+
+class RingBatch:
+    """Accumulates rings of many buildings into packed arrays"""
+
+    def __init__(self):
+        self.coords = array('d')
+        self.ring_lengths = array('q')
+        self.ring_holes = array('b')
+        self.building_ring_offsets = array('q', [0])
+
+    def add_ring(self, ring, is_hole=False):
+        """Add a closed ring of (x, y[, z]) coordinates - the duplicate last point is skipped"""
+        valid_vertices = 0
+        for coord in ring[:-1]:
+            if isinstance(coord, (list, tuple)) and len(coord) >= 2:
+                if len(coord) >= 3:
+                    self.coords.extend((float(coord[0]), float(coord[1]), float(coord[2])))
+                else:
+                    self.coords.extend((float(coord[0]), float(coord[1]), 0.0))
+                valid_vertices += 1
+        self.ring_lengths.append(valid_vertices)
+        self.ring_holes.append(is_hole)
+        return valid_vertices
+
+    def add_ring_array(self, ring, is_hole=False):
+        """Add a ring given as an (n, 3) coordinate array without the duplicate last point"""
+        ring = np.ascontiguousarray(ring, dtype=np.float64).reshape(-1, 3)
+        self.coords.frombytes(ring.tobytes())
+        self.ring_lengths.append(len(ring))
+        self.ring_holes.append(is_hole)
+        return len(ring)
+
+    def end_building(self):
+        """Close the current building"""
+        self.building_ring_offsets.append(len(self.ring_lengths))
+
+    def __len__(self):
+        return len(self.building_ring_offsets) - 1
+
+    def to_arrays(self):
+        """Packed (vertices, ring_offsets, ring_is_hole, building_ring_offsets)"""
+        vertices = np.frombuffer(self.coords, dtype=np.float64).reshape(-1, 3).copy()
+        ring_offsets = np.zeros(len(self.ring_lengths) + 1, dtype=np.int64)
+        np.cumsum(np.frombuffer(self.ring_lengths, dtype=np.int64), out=ring_offsets[1:])
+        return (vertices, ring_offsets, np.frombuffer(self.ring_holes, dtype=np.int8).astype(bool),
+                np.frombuffer(self.building_ring_offsets, dtype=np.int64).copy())
+
+    def triangulate(self):
+        """Triangulate all buildings in local coordinates
+
+        Returns (vertices, faces, vertex_offsets, face_offsets, origins) with compact local
+        vertices; absolute coordinates are vertices + origins[building].
+        """
+        vertices, ring_offsets, ring_is_hole, building_ring_offsets = self.to_arrays()
+        return triangulate_local(vertices, ring_offsets, ring_is_hole, building_ring_offsets)
+
+
+def localize(vertices, vertex_offsets):
+    """Re-center each building on its bounding box minimum - returns (local vertices, origins)"""
+    counts = np.diff(vertex_offsets)
+    origins = np.zeros((len(counts), 3))
+    nonempty = counts > 0
+    if nonempty.any():
+        origins[nonempty] = np.minimum.reduceat(vertices, vertex_offsets[:-1][nonempty], axis=0)
+    return vertices - np.repeat(origins, counts, axis=0), origins
+
+
+def triangulate_local(vertices, ring_offsets, ring_is_hole, building_ring_offsets):
+    """Localize and triangulate packed buildings, then store them compactly
+
+    Triangulation runs on the float64 local coordinates (small magnitudes keep the
+    orientation tests exact); the result is cast to VERTEX_DTYPE and FACE_DTYPE.
+    Returns (vertices, faces, vertex_offsets, face_offsets, origins).
+    """
+    vertex_offsets = ring_offsets[building_ring_offsets]
+    local, origins = localize(vertices, vertex_offsets)
+    faces, face_offsets = triangulate_packed(local, ring_offsets, ring_is_hole, building_ring_offsets)
+    return local.astype(VERTEX_DTYPE), faces.astype(FACE_DTYPE), vertex_offsets, face_offsets, origins
+
+
+def add_multipatch_geometry(batch, geometry):
+    """Add the rings of a multipatch geometry from GDB to a RingBatch - returns (vertices, rings) added"""
+    vertex_count = 0
+    ring_count = 0
+
+    try:
+        if not geometry:
+            return 0, 0
+
+        geom_type = geometry.get('type', '')
+        coords = geometry.get('coordinates', [])
+
+        if not coords:
+            return 0, 0
+
+        # Multipatch geometry structure in GDB: polygons of an outer ring followed by holes
+        if geom_type == 'MultiPolygon':
+            polygons = coords
+        elif geom_type == 'Polygon':
+            polygons = [coords]
+        else:
+            return 0, 0
+
+        for polygon in polygons:
+            if not isinstance(polygon, list):
+                continue
+
+            for ring_idx, ring in enumerate(polygon):
+                if not isinstance(ring, list):
+                    continue
+                vertex_count += batch.add_ring(ring, is_hole=ring_idx > 0)
+                ring_count += 1
+
+        return vertex_count, ring_count
+
+    except Exception as e:
+        logging.debug(f"Error parsing geometry: {str(e)}")
+        return vertex_count, ring_count
+
+
+def parse_multipatch_geometry(geometry):
+    """Parse multipatch geometry from GDB into local vertex and face arrays - returns (vertices, faces, origin)"""
+    batch = RingBatch()
+    add_multipatch_geometry(batch, geometry)
+    batch.end_building()
+    vertices, faces, _, _, origins = batch.triangulate()
+    return vertices, faces, origins[0]
+
+
+def assign_chunk_geometry(chunk, batch):
+    """Triangulate the rings of a whole chunk at once and attach per-building array views
+
+    _vertices are compact local coordinates relative to _origin (the bounding box minimum).
+    """
+    vertices, faces, vertex_offsets, face_offsets, origins = batch.triangulate()
+    for i, properties in enumerate(chunk):
+        properties['_vertices'] = vertices[vertex_offsets[i]:vertex_offsets[i + 1]]
+        properties['_faces'] = faces[face_offsets[i]:face_offsets[i + 1]]
+        properties['_origin'] = origins[i]
+
+
+def ring_frames(vertices, ring_offsets, frame_ring=None):
+    """Project every ring to the plane of a Newell normal
+
+    frame_ring gives, per ring, the ring whose plane and first vertex define its frame
+    (the outer ring of its polygon, so holes share the frame of their outer ring).
+    Returns per-vertex 2D coordinates (u, v), the ring index of each vertex and the
+    index of the next vertex in its ring.
+    """
+    num_rings = len(ring_offsets) - 1
+    ring_lengths = np.diff(ring_offsets)
+    vertex_ring = np.repeat(np.arange(num_rings), ring_lengths)
+    if frame_ring is None:
+        frame_ring = np.arange(num_rings)
+
+    # Next vertex within the ring (wrapping around)
+    next_idx = np.arange(len(vertices)) + 1
+    ring_ends = ring_offsets[1:][ring_lengths > 0]
+    next_idx[ring_ends - 1] = ring_offsets[:-1][ring_lengths > 0]
+
+    # Local coordinates keep the cross products precise for LV95 magnitudes
+    local = vertices - vertices[ring_offsets[:-1][frame_ring[vertex_ring]]] if len(vertices) else vertices
+    nxt = local[next_idx] if len(vertices) else local
+
+    # Newell normal per ring
+    terms = np.stack([
+        (local[:, 1] - nxt[:, 1]) * (local[:, 2] + nxt[:, 2]),
+        (local[:, 2] - nxt[:, 2]) * (local[:, 0] + nxt[:, 0]),
+        (local[:, 0] - nxt[:, 0]) * (local[:, 1] + nxt[:, 1]),
+    ], axis=1)
+    normals = np.zeros((num_rings, 3))
+    np.add.at(normals, vertex_ring, terms)
+    normals = normals[frame_ring]
+
+    # Drop the dominant axis, keep the other two in cyclic order so winding is preserved
+    drop = np.argmax(np.abs(normals), axis=1)
+    u_axis = (drop + 1) % 3
+    v_axis = (drop + 2) % 3
+    u = local[np.arange(len(local)), u_axis[vertex_ring]]
+    v = local[np.arange(len(local)), v_axis[vertex_ring]]
+
+    # Flip v where the normal points down the dropped axis, so outer rings are CCW in 2D
+    sign = np.sign(normals[np.arange(num_rings), drop])
+    sign[sign == 0] = 1.0
+    v = v * sign[vertex_ring]
+    return u, v, vertex_ring, next_idx
+
+
+def convex_rings(u, v, vertex_ring, next_idx, ring_offsets):
+    """Flag rings whose 2D projection turns the same way at every vertex"""
+    num_rings = len(ring_offsets) - 1
+    ring_lengths = np.diff(ring_offsets)
+    if len(u) == 0:
+        return np.zeros(num_rings, dtype=bool)
+
+    prev_idx = np.empty_like(next_idx)
+    prev_idx[next_idx] = np.arange(len(next_idx))
+
+    e1u, e1v = u - u[prev_idx], v - v[prev_idx]
+    e2u, e2v = u[next_idx] - u, v[next_idx] - v
+    cross = e1u * e2v - e1v * e2u
+    norm = np.hypot(e1u, e1v) * np.hypot(e2u, e2v)
+    sine = np.where(norm > 0, cross / np.where(norm > 0, norm, 1.0), 0.0)
+
+    # Orientation of each ring (shoelace) so CW rings are judged the same way
+    area = np.zeros(num_rings)
+    np.add.at(area, vertex_ring, u * v[next_idx] - u[next_idx] * v)
+    orientation = np.where(area >= 0, 1.0, -1.0)
+
+    turn = sine * orientation[vertex_ring]
+    min_turn = np.full(num_rings, np.inf)
+    np.minimum.at(min_turn, vertex_ring, turn)
+    return (min_turn >= -CONVEX_TOLERANCE) & (ring_lengths >= 3)
+
+
+def signed_area(points):
+    """Shoelace signed area of a 2D polygon given as a list of (x, y)"""
+    area = 0.0
+    for i in range(len(points)):
+        x1, y1 = points[i - 1]
+        x2, y2 = points[i]
+        area += x1 * y2 - x2 * y1
+    return area / 2.0
+
+
+def segments_cross(p1, p2, p3, p4):
+    """True if segments p1-p2 and p3-p4 properly intersect (touching endpoints do not count)"""
+    def orient(a, b, c):
+        return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+    d1 = orient(p3, p4, p1)
+    d2 = orient(p3, p4, p2)
+    d3 = orient(p1, p2, p3)
+    d4 = orient(p1, p2, p4)
+    return ((d1 > 0) != (d2 > 0)) and ((d3 > 0) != (d4 > 0)) and d1 != 0 and d2 != 0 and d3 != 0 and d4 != 0
+
+
+def touches_segment(p, a, b):
+    """True if p lies on the segment a-b (within CONVEX_TOLERANCE of the segment length)"""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    cross = dx * (p[1] - a[1]) - dy * (p[0] - a[0])
+    if abs(cross) > CONVEX_TOLERANCE * (dx * dx + dy * dy):
+        return False
+    return min(a[0], b[0]) <= p[0] <= max(a[0], b[0]) and min(a[1], b[1]) <= p[1] <= max(a[1], b[1])
+
+
+def bridge_holes(points, outer, holes):
+    """Merge holes into the outer ring with bridge edges to the nearest visible outer vertex
+
+    A bridge must not cross an edge nor touch any vertex other than its two ends.
+    """
+    polygon = list(outer)
+    remaining = sorted(holes, key=lambda hole: -max(points[i][0] for i in hole))
+
+    for hole in remaining:
+        # Start the hole at its rightmost vertex
+        start = max(range(len(hole)), key=lambda k: points[hole[k]][0])
+        hole = hole[start:] + hole[:start]
+        m = points[hole[0]]
+
+        # Edges that a bridge must not cross
+        edges = [(polygon[k - 1], polygon[k]) for k in range(len(polygon))]
+        for other in remaining:
+            edges += [(other[k - 1], other[k]) for k in range(len(other))]
+
+        candidates = sorted(range(len(polygon)),
+                            key=lambda k: (points[polygon[k]][0] - m[0]) ** 2 + (points[polygon[k]][1] - m[1]) ** 2)
+        others = {points[i] for i in polygon}
+        for other in remaining:
+            others.update(points[i] for i in other)
+        bridge = candidates[0]
+        for k in candidates:
+            p = points[polygon[k]]
+            if p == m:
+                bridge = k
+                break
+            if any(touches_segment(q, m, p) for q in others if q != m and q != p):
+                continue
+            if not any(segments_cross(m, p, points[a], points[b]) for a, b in edges):
+                bridge = k
+                break
+
+        # outer ... P, M, hole ..., M, P, ... outer
+        polygon = polygon[:bridge + 1] + hole + [hole[0], polygon[bridge]] + polygon[bridge + 1:]
+
+    return polygon
+
+
+def point_in_triangle(p, a, b, c):
+    """True if p is inside or on the CCW triangle abc"""
+    return ((b[0] - a[0]) * (p[1] - a[1]) - (b[1] - a[1]) * (p[0] - a[0]) >= 0 and
+            (c[0] - b[0]) * (p[1] - b[1]) - (c[1] - b[1]) * (p[0] - b[0]) >= 0 and
+            (a[0] - c[0]) * (p[1] - c[1]) - (a[1] - c[1]) * (p[0] - c[0]) >= 0)
+
+
+def earclip(points, polygon):
+    """Ear-clip a CCW simple polygon (list of point indices, may contain bridge duplicates)
+
+    Returns (triangles, fanned) - fanned is True if no ear was left and the rest was fanned.
+    """
+    triangles = []
+    remaining = list(polygon)
+    i = 0
+    misses = 0
+
+    while len(remaining) > 3:
+        n = len(remaining)
+
+        # Self-intersecting or numerically broken input - fan the rest
+        if misses >= n:
+            for k in range(1, n - 1):
+                triangles.append((remaining[0], remaining[k], remaining[k + 1]))
+            return triangles, True
+
+        i %= n
+        ia, ib, ic = remaining[i - 1], remaining[i], remaining[(i + 1) % n]
+        a, b, c = points[ia], points[ib], points[ic]
+        cross = (b[0] - a[0]) * (c[1] - b[1]) - (b[1] - a[1]) * (c[0] - b[0])
+        scale = abs(b[0] - a[0]) + abs(b[1] - a[1]) + abs(c[0] - b[0]) + abs(c[1] - b[1])
+
+        # Collinear vertex: keep the (zero-area) triangle so edges still pair up
+        if abs(cross) <= CONVEX_TOLERANCE * scale * scale:
+            is_ear = True
+        elif cross < 0:
+            is_ear = False  # Reflex vertex
+        else:
+            # No other vertex may lie inside the ear
+            is_ear = True
+            for j in remaining:
+                if j == ia or j == ib or j == ic:
+                    continue
+                p = points[j]
+                if p == a or p == b or p == c:
+                    continue
+                if point_in_triangle(p, a, b, c):
+                    is_ear = False
+                    break
+
+        if is_ear:
+            triangles.append((ia, ib, ic))
+            del remaining[i]
+            misses = 0
+        else:
+            i += 1
+            misses += 1
+
+    if len(remaining) == 3:
+        triangles.append(tuple(remaining))
+    return triangles, False
+
+
+def triangulate_polygon(u, v, rings):
+    """Triangulate one polygon with holes - rings are arrays of global vertex indices, outer first
+
+    Returns (triangles, fanned) as earclip.
+    """
+    points = {}
+    for ring in rings:
+        for i in ring:
+            points[int(i)] = (float(u[i]), float(v[i]))
+
+    # Outer ring CCW, holes CW
+    outer = [int(i) for i in rings[0]]
+    outer_area = signed_area([points[i] for i in outer])
+    flipped = outer_area < 0
+    if flipped:
+        outer = outer[::-1]
+
+    holes = []
+    for ring in rings[1:]:
+        hole = [int(i) for i in ring]
+        if len(hole) < 3:
+            continue
+        if signed_area([points[i] for i in hole]) > 0:
+            hole = hole[::-1]
+        holes.append(hole)
+
+    polygon = bridge_holes(points, outer, holes) if holes else outer
+    triangles, fanned = earclip(points, polygon)
+
+    # Keep the original winding of the outer ring
+    if flipped:
+        triangles = [(a, c, b) for a, b, c in triangles]
+    return triangles, fanned
+
+
+def triangulate_packed(vertices, ring_offsets, ring_is_hole, building_ring_offsets):
+    """Triangulate all polygons of a packed batch
+
+    A polygon is an outer ring followed by its hole rings. Convex polygons without holes
+    are fan-triangulated in one vectorized pass, the rest go through ear clipping.
+    Returns (faces, face_offsets) with faces indexing the vertices of their own building.
+    """
+    num_rings = len(ring_offsets) - 1
+    num_buildings = len(building_ring_offsets) - 1
+    ring_lengths = np.diff(ring_offsets)
+    ring_building = np.repeat(np.arange(num_buildings), np.diff(building_ring_offsets))
+    building_vertex_offsets = ring_offsets[building_ring_offsets]
+
+    # Polygon of each ring: a new polygon starts at every outer ring and every building start
+    starts_polygon = ~ring_is_hole.astype(bool)
+    starts_polygon[building_ring_offsets[:-1][np.diff(building_ring_offsets) > 0]] = True
+    ring_polygon = np.cumsum(starts_polygon) - 1
+    polygon_ring_count = np.bincount(ring_polygon, minlength=ring_polygon[-1] + 1 if num_rings else 0)
+    has_holes = polygon_ring_count[ring_polygon] > 1
+
+    polygon_first_ring = np.nonzero(starts_polygon)[0]
+    polygon_end_ring = np.append(polygon_first_ring[1:], num_rings)
+    u, v, vertex_ring, next_idx = ring_frames(vertices, ring_offsets, polygon_first_ring[ring_polygon])
+    convex = convex_rings(u, v, vertex_ring, next_idx, ring_offsets)
+    fan = convex & ~has_holes
+
+    # Fan path, vectorized over all convex rings
+    tri_per_ring = np.where(fan, np.maximum(ring_lengths - 2, 0), 0)
+    tri_ring = np.repeat(np.arange(num_rings), tri_per_ring)
+    tri_starts = np.concatenate([[0], np.cumsum(tri_per_ring)[:-1]]).astype(np.int64)
+    step = np.arange(len(tri_ring)) - tri_starts[tri_ring] + 1
+    first = ring_offsets[:-1][tri_ring]
+    fan_faces = np.stack([first, first + step, first + step + 1], axis=1)
+    fan_polygons = ring_polygon[tri_ring]
+
+    # Ear clipping for concave rings and polygons with holes
+    ear_faces = []
+    ear_polygons = []
+    fanned_polygons = 0
+    for polygon in ring_polygon[~fan & (ring_lengths >= 3) & starts_polygon]:
+        rings = [np.arange(ring_offsets[r], ring_offsets[r + 1])
+                 for r in range(polygon_first_ring[polygon], polygon_end_ring[polygon])]
+        triangles, fanned = triangulate_polygon(u, v, rings)
+        fanned_polygons += fanned
+        ear_faces.extend(triangles)
+        ear_polygons.extend([polygon] * len(triangles))
+    if fanned_polygons:
+        logging.getLogger(__name__).warning(f"Ear clipping found no ear in {fanned_polygons} polygons "
+                                            f"(self-intersecting rings), fan-triangulated them instead")
+
+    faces = np.concatenate([fan_faces, np.array(ear_faces, dtype=np.int64).reshape(-1, 3)])
+    face_polygons = np.concatenate([fan_polygons, np.array(ear_polygons, dtype=np.int64)])
+
+    # Group faces by building (stable, so each polygon keeps its triangle order)
+    order = np.argsort(face_polygons, kind='stable')
+    faces = faces[order]
+    polygon_building = ring_building[starts_polygon] if num_rings else np.zeros(0, dtype=np.int64)
+    face_building = polygon_building[face_polygons[order]]
+    faces = faces - building_vertex_offsets[face_building][:, None]
+
+    face_offsets = np.zeros(num_buildings + 1, dtype=np.int64)
+    np.cumsum(np.bincount(face_building, minlength=num_buildings), out=face_offsets[1:])
+    return faces.astype(np.int64), face_offsets
@@ -0,0 +1,158 @@
+"""
+Vertex welding module
+Tolerance-based vertex welding with spatial hashing and neighbor-cell checks
+Works on one building or on a packed batch of buildings (never welds across buildings)
+"""
+
+import numpy as np
+
+DEFAULT_WELD_TOLERANCE = 1e-4  # Meters
+
+# Half of the 27 neighbor cells (plus the cell itself) - enough because pairs are symmetric
+NEIGHBOR_OFFSETS = np.array([(dx, dy, dz)
+                             for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                             if (dx, dy, dz) >= (0, 0, 0)], dtype=np.int64)
+
+# Large odd multipliers for the cell hash (collisions only add candidate pairs)
+HASH_PRIMES = np.array([73856093, 19349663, 83492791, 2654435761], dtype=np.int64)
+FIBONACCI_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+BITMAP_LOAD = 16  # Bitmap buckets per vertex (about 6% false positives)
+
+
+def cell_hash(cells, building_ids):
+    """Hash integer cell coordinates and building ids into one int64 key"""
+    return (cells[:, 0] * HASH_PRIMES[0] ^ cells[:, 1] * HASH_PRIMES[1]
+            ^ cells[:, 2] * HASH_PRIMES[2] ^ building_ids * HASH_PRIMES[3])
+
+
+def hash_bucket(keys, bits):
+    """Fibonacci hashing of int64 keys into 2**bits buckets"""
+    return ((keys.view(np.uint64) * FIBONACCI_MULTIPLIER) >> np.uint64(64 - bits)).astype(np.intp)
+
+
+def weld_labels(vertices, tolerance, building_ids=None):
+    """Label of each vertex after welding (the lowest vertex index of its cluster)"""
+    n = len(vertices)
+    labels = np.arange(n)
+    if n < 2:
+        return labels
+    if building_ids is None:
+        building_ids = np.zeros(n, dtype=np.int64)
+
+    # Grid cells of size tolerance, relative to the batch minimum
+    cells = np.floor((vertices - vertices.min(axis=0)) / tolerance).astype(np.int64)
+    keys = cell_hash(cells, building_ids)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    # Occupancy bitmap of hash buckets - most neighbor cells are empty and skip the search
+    bits = int(np.ceil(np.log2(BITMAP_LOAD * n)))
+    occupied = np.zeros(1 << bits, dtype=bool)
+    occupied[hash_bucket(keys, bits)] = True
+
+    # Own cell: runs of equal keys in sorted order, no search needed
+    run_start = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+    run_id = np.cumsum(run_start) - 1
+    run_bounds = np.r_[np.flatnonzero(run_start), n]
+    own_lo = np.empty(n, dtype=np.int64)
+    own_hi = np.empty(n, dtype=np.int64)
+    own_lo[order] = run_bounds[run_id]
+    own_hi[order] = run_bounds[run_id + 1]
+
+    pairs_i = []
+    pairs_j = []
+    for offset in NEIGHBOR_OFFSETS:
+        if not offset.any():
+            candidates = np.flatnonzero(own_hi - own_lo > 1)
+            lo = own_lo[candidates]
+            hi = own_hi[candidates]
+        else:
+            query = cell_hash(cells + offset, building_ids)
+            candidates = np.flatnonzero(occupied[hash_bucket(query, bits)])
+            if len(candidates) == 0:
+                continue
+            query = query[candidates]
+            lo = np.searchsorted(sorted_keys, query, side='left')
+            hi = np.searchsorted(sorted_keys, query, side='right')
+        counts = hi - lo
+        if not counts.any():
+            continue
+
+        # Expand every vertex into its candidates in the neighbor cell
+        i = np.repeat(candidates, counts)
+        starts = np.repeat(lo - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+        j = order[np.arange(len(i)) + starts]
+
+        keep = (i < j) if not offset.any() else (i != j)
+        pairs_i.append(i[keep])
+        pairs_j.append(j[keep])
+
+    if not pairs_i:
+        return labels
+    i = np.concatenate(pairs_i)
+    j = np.concatenate(pairs_j)
+
+    # Exact distance check (also drops hash collisions and cross-building pairs)
+    close = ((np.sum((vertices[i] - vertices[j]) ** 2, axis=1) <= tolerance * tolerance)
+             & (building_ids[i] == building_ids[j]))
+    i = i[close]
+    j = j[close]
+    if len(i) == 0:
+        return labels
+
+    # Connected components by min-label propagation with pointer jumping
+    while True:
+        smallest = np.minimum(labels[i], labels[j])
+        updated = labels.copy()
+        np.minimum.at(updated, i, smallest)
+        np.minimum.at(updated, j, smallest)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def weld_vertices(vertices, faces, tolerance=DEFAULT_WELD_TOLERANCE, drop_degenerate=True):
+    """Weld the vertices of one building - returns (vertices, faces)"""
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+
+    labels = weld_labels(vertices, tolerance)
+    representatives, inverse = np.unique(labels, return_inverse=True)
+    faces = inverse[faces]
+
+    # Faces that collapsed onto an edge or a point
+    if drop_degenerate and len(faces):
+        faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])]
+    return vertices[representatives], faces
+
+
+def weld_packed(vertices, vertex_offsets, faces, face_offsets, tolerance=DEFAULT_WELD_TOLERANCE,
+                drop_degenerate=True):
+    """Weld a packed batch of buildings in one pass
+
+    faces index the vertices of their own building. Returns (vertices, vertex_offsets,
+    faces, face_offsets) in the same layout.
+    """
+    num_buildings = len(vertex_offsets) - 1
+    vertex_building = np.repeat(np.arange(num_buildings), np.diff(vertex_offsets))
+    face_building = np.repeat(np.arange(num_buildings), np.diff(face_offsets))
+
+    labels = weld_labels(vertices, tolerance, vertex_building)
+    representatives, inverse = np.unique(labels, return_inverse=True)
+
+    # Global face indices -> welded global indices -> local indices per building
+    new_vertex_offsets = np.searchsorted(representatives, vertex_offsets)
+    global_faces = faces + vertex_offsets[:-1][face_building][:, None]
+    new_faces = inverse[global_faces]
+
+    if drop_degenerate and len(new_faces):
+        keep = ((new_faces[:, 0] != new_faces[:, 1]) & (new_faces[:, 1] != new_faces[:, 2])
+                & (new_faces[:, 0] != new_faces[:, 2]))
+        new_faces = new_faces[keep]
+        face_building = face_building[keep]
+
+    new_faces = new_faces - new_vertex_offsets[:-1][face_building][:, None]
+    new_face_offsets = np.zeros(num_buildings + 1, dtype=np.int64)
+    np.cumsum(np.bincount(face_building, minlength=num_buildings), out=new_face_offsets[1:])
+    return vertices[representatives], new_vertex_offsets, new_faces, new_face_offsets
@@ -0,0 +1,235 @@
+"""
+Arrow/WKB bulk reader module
+Reads building layers in Arrow batches through pyogrio and decodes WKB geometries
+straight into packed NumPy vertex, ring and building offset arrays
+"""
+
+import gc
+import struct
+import logging
+
+import numpy as np
+
+# WKB geometry type codes (without Z/M flags)
+WKB_POLYGON = 3
+WKB_MULTIPOLYGON = 6
+WKB_GEOMETRYCOLLECTION = 7
+WKB_POLYHEDRALSURFACE = 15
+WKB_TIN = 16
+WKB_TRIANGLE = 17
+
+WKB_VERTEX_BYTES = 24  # One XYZ point in WKB
+SLICE_FRACTION = 0.25  # Share of the chunk budget for decoding one slice of an Arrow batch
+
+# EWKB (PostGIS) flags
+EWKB_Z = 0x80000000
+EWKB_M = 0x40000000
+EWKB_SRID = 0x20000000
+
+
+def read_wkb_header(buf, pos):
+    """Read byte order and geometry type at pos - returns (endian, type, dims, has z, new pos)"""
+    endian = '<' if buf[pos] == 1 else '>'
+    (type_code,) = struct.unpack_from(endian + 'I', buf, pos + 1)
+    pos += 5
+
+    has_z = bool(type_code & EWKB_Z)
+    has_m = bool(type_code & EWKB_M)
+    if type_code & EWKB_SRID:
+        pos += 4
+    type_code &= 0x0FFFFFFF
+
+    # ISO WKB encodes Z/M as +1000/+2000/+3000
+    if type_code >= 3000:
+        has_z = has_m = True
+        type_code -= 3000
+    elif type_code >= 2000:
+        has_m = True
+        type_code -= 2000
+    elif type_code >= 1000:
+        has_z = True
+        type_code -= 1000
+
+    dims = 2 + has_z + has_m
+    return endian, type_code, dims, has_z, pos
+
+
+def read_polygon_rings(buf, pos, endian, dims, has_z, rings, holes):
+    """Read the rings of a WKB polygon body into (n, 3) arrays"""
+    (num_rings,) = struct.unpack_from(endian + 'I', buf, pos)
+    pos += 4
+
+    for ring_idx in range(num_rings):
+        (num_points,) = struct.unpack_from(endian + 'I', buf, pos)
+        pos += 4
+        coords = np.frombuffer(buf, dtype=endian + 'f8', count=num_points * dims, offset=pos)
+        pos += num_points * dims * 8
+        coords = coords.reshape(num_points, dims)
+
+        ring = np.zeros((num_points, 3), dtype=np.float64)
+        ring[:, :2] = coords[:, :2]
+        if has_z:
+            ring[:, 2] = coords[:, 2]
+
+        # Skip duplicate last point
+        if num_points > 1 and np.array_equal(ring[0], ring[-1]):
+            ring = ring[:-1]
+
+        rings.append(ring)
+        holes.append(ring_idx > 0)
+
+    return pos
+
+
+def read_wkb_geometry(buf, pos, rings, holes):
+    """Recursively read a WKB geometry and collect its rings"""
+    endian, type_code, dims, has_z, pos = read_wkb_header(buf, pos)
+
+    if type_code in (WKB_POLYGON, WKB_TRIANGLE):
+        return read_polygon_rings(buf, pos, endian, dims, has_z, rings, holes)
+
+    if type_code in (WKB_MULTIPOLYGON, WKB_POLYHEDRALSURFACE, WKB_TIN, WKB_GEOMETRYCOLLECTION):
+        (num_parts,) = struct.unpack_from(endian + 'I', buf, pos)
+        pos += 4
+        for _ in range(num_parts):
+            pos = read_wkb_geometry(buf, pos, rings, holes)
+        return pos
+
+    raise ValueError(f"Unsupported WKB geometry type: {type_code}")
+
+
+def decode_wkb_batch(wkb_values):
+    """Decode WKB geometries into packed arrays
+
+    Returns (vertices, ring_offsets, ring_is_hole, building_ring_offsets) where vertices
+    is an (N, 3) float64 array, ring_offsets has one entry per ring plus the end, and
+    building_ring_offsets indexes the rings of each building.
+    """
+    rings = []
+    holes = []
+    building_ring_offsets = [0]
+
+    for wkb in wkb_values:
+        if wkb:
+            try:
+                read_wkb_geometry(memoryview(wkb), 0, rings, holes)
+            except (ValueError, struct.error) as e:
+                logging.debug(f"Error decoding WKB geometry: {str(e)}")
+                # Drop the partially decoded rings of this building
+                del rings[building_ring_offsets[-1]:]
+                del holes[building_ring_offsets[-1]:]
+        building_ring_offsets.append(len(rings))
+
+    ring_lengths = np.fromiter((len(ring) for ring in rings), dtype=np.int64, count=len(rings))
+    ring_offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+    np.cumsum(ring_lengths, out=ring_offsets[1:])
+
+    vertices = np.concatenate(rings) if rings else np.zeros((0, 3), dtype=np.float64)
+    return (vertices, ring_offsets, np.array(holes, dtype=bool),
+            np.array(building_ring_offsets, dtype=np.int64))
+
+
+def budget_slices(batch, geometry_name, max_bytes=None):
+    """Row slices of an Arrow batch whose decoding stays within a share of the chunk budget
+
+    The vertex count of each building is estimated from the length of its WKB.
+    """
+    if not max_bytes:
+        yield batch
+        return
+    import pyarrow.compute as pc
+    from chunking import ROW_BYTES, estimate_parse_bytes
+
+    wkb_bytes = pc.binary_length(batch.column(geometry_name)).fill_null(0).to_numpy(zero_copy_only=False)
+    vertices = wkb_bytes / WKB_VERTEX_BYTES
+    cost = np.cumsum(estimate_parse_bytes(vertices, vertices / 2) + 2 * wkb_bytes + ROW_BYTES)
+    start = 0
+    while start < batch.num_rows:
+        before = cost[start - 1] if start else 0
+        stop = max(int(np.searchsorted(cost, before + max_bytes * SLICE_FRACTION, side='right')), start + 1)
+        yield batch.slice(start, stop - start)
+        start = stop
+
+
+def read_gdb_buildings_arrow(gdb_path, layer_name='Building_solid', chunk_size=None, limit=None,
+                             progress=None, max_chunk_bytes=None):
+    """Read buildings in chunks from Arrow batches with WKB geometry (pyogrio backend)"""
+    from chunking import CHUNK_SIZE, ChunkBudget, estimate_parse_bytes
+    from readers import resolve_layer_name
+    from triangulation import triangulate_local
+    logger = logging.getLogger(__name__)
+    logger.info(f"Reading buildings from {gdb_path}, layer: {layer_name} (Arrow reader)")
+
+    try:
+        import pyogrio
+        from pyogrio.raw import open_arrow
+    except ImportError:
+        raise ImportError("The Arrow reader requires pyogrio and pyarrow "
+                          "(python -m pip install pyogrio pyarrow)")
+
+    chunk_size = chunk_size or CHUNK_SIZE
+    layers = [name for name, _ in pyogrio.list_layers(gdb_path)]
+    actual_layer = resolve_layer_name(gdb_path, layer_name, layers)
+
+    info = pyogrio.read_info(gdb_path, layer=actual_layer)
+    logger.info(f"Layer CRS: {info.get('crs')}")
+    logger.info(f"Layer bounds: {info.get('total_bounds')}")
+    if progress is not None:
+        feature_count = info.get('features', -1)
+        if feature_count >= 0:
+            progress.set_total(min(feature_count, limit) if limit else feature_count)
+
+    # max_features is not supported for Arrow streams, so the limit is applied to the batches
+    with open_arrow(gdb_path, layer=actual_layer, batch_size=min(chunk_size, limit or chunk_size, 65536),
+                    use_pyarrow=True) as (meta, reader):
+        geometry_name = meta.get('geometry_name') or 'wkb_geometry'
+
+        chunk = []
+        chunk_num = 0
+        budget = ChunkBudget(max_chunk_bytes, chunk_size)
+        count = 0
+
+        for batch in reader:
+            if limit is not None:
+                if count >= limit:
+                    break
+                batch = batch.slice(0, limit - count)
+            count += batch.num_rows
+            for piece in budget_slices(batch, geometry_name, max_chunk_bytes):
+                attribute_names = [name for name in piece.schema.names if name != geometry_name]
+                rows = piece.select(attribute_names).to_pylist()
+                wkb_values = piece.column(geometry_name).to_pylist()
+
+                # Decode the whole slice at once, then hand out per-building views
+                vertices, ring_offsets, ring_is_hole, building_ring_offsets = decode_wkb_batch(wkb_values)
+                vertices, faces, vertex_offsets, face_offsets, origins = triangulate_local(
+                    vertices, ring_offsets, ring_is_hole, building_ring_offsets)
+
+                for i, properties in enumerate(rows):
+                    building_vertices = vertices[vertex_offsets[i]:vertex_offsets[i + 1]]
+                    building_faces = faces[face_offsets[i]:face_offsets[i + 1]]
+                    properties['_vertices'] = building_vertices
+                    properties['_faces'] = building_faces
+                    properties['_origin'] = origins[i]
+                    properties['_geometry_type'] = meta.get('geometry_type')
+                    chunk.append(properties)
+
+                    if progress is not None:
+                        progress.advance('read', failed=0 if len(building_faces) else 1)
+
+                    # Yield chunk when it reaches chunk_size or the memory budget
+                    # The WKB is held twice (Arrow buffer and Python bytes) until the next batch
+                    if budget.add(len(building_vertices), len(building_faces),
+                                  estimate_parse_bytes(len(building_vertices), len(building_faces))
+                                  + 2 * len(wkb_values[i] or b'')):
+                        logger.info(f"Chunk {chunk_num} read: {budget.describe()}")
+                        yield chunk_num, chunk
+                        chunk = []
+                        chunk_num += 1
+                        budget.reset()
+                        gc.collect()  # Force garbage collection
+
+        # Yield final chunk if any remaining
+        if chunk:
+            logger.info(f"Chunk {chunk_num} read: {budget.describe()}")
+            yield chunk_num, chunk
@@ -0,0 +1,209 @@
+"""
+Worker-side processing module
+Runs inside the pool processes and only imports what geometry processing needs
+Heavy geometry modules (numpy, trimesh) are loaded once per worker by init_worker
+"""
+
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from result_schema import Status, ErrorCode, pack_record
+from welding import DEFAULT_WELD_TOLERANCE
+from metrics import ALL_STAGES, STAGE_MESH, STAGE_SURFACES, STAGE_ELEVATION
+
+_import_seconds = None
+_caches = {}  # Geometry caches mapped by this worker
+
+
+def init_worker():
+    """Pool initializer - import the geometry modules once and time it"""
+    global _import_seconds
+    start = time.perf_counter()
+    import mesh_repair_volume  # noqa: F401
+    import surface_analysis  # noqa: F401
+    _import_seconds = time.perf_counter() - start
+
+
+def worker_startup_info():
+    """Report the import time of this worker (used to measure pool startup)"""
+    if _import_seconds is None:
+        init_worker()
+    return {'pid': os.getpid(), 'import_seconds': _import_seconds}
+
+
+def default_worker_count():
+    """Default number of parallel workers (from the CPUs and memory available, at least 1)"""
+    from autotune import default_workers
+    return default_workers()
+
+
+def start_worker_pool(num_workers):
+    """Start the worker pool and measure how long the workers take to become ready"""
+    logger = logging.getLogger(__name__)
+
+    start = time.perf_counter()
+    executor = ProcessPoolExecutor(max_workers=num_workers, initializer=init_worker)
+
+    # One probe per worker forces the processes to spawn and import the geometry modules
+    probes = [executor.submit(worker_startup_info) for _ in range(num_workers)]
+    import_times = {}
+    for probe in probes:
+        info = probe.result()
+        import_times[info['pid']] = info['import_seconds']
+
+    ready_seconds = time.perf_counter() - start
+    logger.info(f"Worker pool ready in {ready_seconds:.2f}s ({num_workers} workers, "
+                f"worker imports mean {sum(import_times.values()) / len(import_times):.2f}s, "
+                f"max {max(import_times.values()):.2f}s)")
+    return executor
+
+
+def process_single_building(task, weld_tolerance=DEFAULT_WELD_TOLERANCE, merged_vertices=None,
+                            stages=ALL_STAGES):
+    """Process a single building - runs in parallel
+
+    task is (idx, vertices, faces[, origin]) with vertices relative to origin (absolute
+    without one); returns (idx, record, busy seconds) where record is a compact tuple in
+    result_schema.RESULT_COLUMNS order. With weld_tolerance=None the
+    geometry is taken as already welded (merged_vertices reports the earlier weld, if any).
+    stages lists the metrics.STAGE_* steps to run, see metrics.plan_metrics.
+    """
+    import numpy as np
+    from mesh_repair_volume import process_building_mesh
+    from surface_analysis import analyze_building_surfaces, analyze_building_elevation
+    from welding import weld_vertices
+
+    idx, vertices, faces = task[:3]
+    origin = task[3] if len(task) > 3 else None
+    result = {}
+    start = time.perf_counter()
+
+    try:
+        # Validate that vertices and faces are lists or packed arrays
+        if not isinstance(vertices, (list, np.ndarray)) or not isinstance(faces, (list, np.ndarray)):
+            result['processing_status'] = Status.FAILED
+            result['error_code'] = ErrorCode.INVALID_GEOMETRY
+            result['error_detail'] = f'Invalid geometry types: {type(vertices).__name__}, {type(faces).__name__}'
+
+        elif len(vertices) == 0 or len(faces) == 0:
+            result['processing_status'] = Status.FAILED
+            result['error_code'] = ErrorCode.NO_GEOMETRY
+
+        else:
+            # Step 0: Weld duplicate vertices once for all mesh based stages
+            if weld_tolerance is not None and (STAGE_MESH in stages or STAGE_SURFACES in stages):
+                vertex_count = len(vertices)
+                vertices, faces = weld_vertices(vertices, faces, weld_tolerance)
+                merged_vertices = vertex_count - len(vertices)
+
+            # Step 1: Mesh repair and volume calculation (skipped if no volume is requested)
+            mesh_results = {}
+            if STAGE_MESH in stages:
+                mesh_results = process_building_mesh(vertices, faces)
+                result.update(mesh_results)
+                if merged_vertices is not None:
+                    result['mesh_merged_vertices'] = merged_vertices
+
+            if mesh_results.get('mesh_process_error'):
+                result['error_code'] = ErrorCode.MESH_ERROR
+                result['error_detail'] = mesh_results['mesh_process_error']
+
+            elif STAGE_MESH in stages and mesh_results.get('mesh_volume') is None:
+                result['error_code'] = ErrorCode.NO_VOLUME
+
+            # Step 2: Surface analysis (only if mesh processing succeeded or was not requested)
+            elif STAGE_SURFACES in stages or STAGE_ELEVATION in stages:
+                if STAGE_SURFACES in stages:
+                    surface_results = analyze_building_surfaces(vertices, faces, origin)
+                else:
+                    surface_results = analyze_building_elevation(vertices, origin)
+                result.update(surface_results)
+                if surface_results.get('surf_analysis_error'):
+                    result['error_code'] = ErrorCode.SURFACE_ERROR
+                    result['error_detail'] = surface_results['surf_analysis_error']
+
+            result['processing_status'] = Status.SUCCESS
+
+    except Exception as e:
+        result['processing_status'] = Status.FAILED
+        result['error_code'] = ErrorCode.WORKER_ERROR
+        result['error_detail'] = str(e)
+
+    return idx, pack_record(result), time.perf_counter() - start
+
+
+def weld_batch(tasks, weld_tolerance):
+    """Weld all packed geometries of a batch in one pass - returns {idx: (vertices, faces, merged)}
+
+    Vertices of all buildings share one float64 array; local coordinates (see
+    triangulation.localize) keep the weld grid exact for the compact float32 input.
+    """
+    import numpy as np
+    from welding import weld_packed
+
+    packed = [(idx, vertices, faces) for idx, vertices, faces in (task[:3] for task in tasks)
+              if isinstance(vertices, np.ndarray) and isinstance(faces, np.ndarray)
+              and len(vertices) and len(faces)]
+    if not packed:
+        return {}
+
+    vertex_offsets = np.zeros(len(packed) + 1, dtype=np.int64)
+    face_offsets = np.zeros(len(packed) + 1, dtype=np.int64)
+    np.cumsum([len(vertices) for _, vertices, _ in packed], out=vertex_offsets[1:])
+    np.cumsum([len(faces) for _, _, faces in packed], out=face_offsets[1:])
+
+    vertices, vertex_offsets_out, faces, face_offsets_out = weld_packed(
+        np.concatenate([np.asarray(v, dtype=np.float64).reshape(-1, 3) for _, v, _ in packed]),
+        vertex_offsets,
+        np.concatenate([np.asarray(f, dtype=np.int64).reshape(-1, 3) for _, _, f in packed]),
+        face_offsets, weld_tolerance)
+
+    welded = {}
+    for i, (idx, _, _) in enumerate(packed):
+        v0, v1 = vertex_offsets_out[i], vertex_offsets_out[i + 1]
+        f0, f1 = face_offsets_out[i], face_offsets_out[i + 1]
+        merged = int(vertex_offsets[i + 1] - vertex_offsets[i] - (v1 - v0))
+        welded[idx] = (vertices[v0:v1], faces[f0:f1], merged)
+    return welded
+
+
+def process_building_batch(tasks, weld_tolerance=DEFAULT_WELD_TOLERANCE, stages=ALL_STAGES):
+    """Process a batch of buildings in one task to amortize the IPC overhead
+
+    Vertices of the whole batch are welded in one vectorized pass before the per-building
+    mesh and surface stages.
+    """
+    if weld_tolerance is None or not (STAGE_MESH in stages or STAGE_SURFACES in stages):
+        return [process_single_building(task, None, stages=stages) for task in tasks]
+
+    start = time.perf_counter()
+    welded = weld_batch(tasks, weld_tolerance)
+    weld_share = (time.perf_counter() - start) / max(len(tasks), 1)
+
+    results = []
+    for task in tasks:
+        idx = task[0]
+        if idx in welded:
+            vertices, faces, merged = welded[idx]
+            idx, record, seconds = process_single_building((idx, vertices, faces) + tuple(task[3:]), None,
+                                                           merged, stages)
+        else:
+            idx, record, seconds = process_single_building(task, weld_tolerance, stages=stages)
+        results.append((idx, record, seconds + weld_share))
+    return results
+
+
+def process_cached_batch(cache_path, first_row, first_idx, count, weld_tolerance=DEFAULT_WELD_TOLERANCE,
+                         stages=ALL_STAGES):
+    """Process count consecutive buildings of a geometry cache - the worker maps their geometry itself
+
+    Task indices start at first_idx (the position of first_row in its chunk).
+    """
+    if cache_path not in _caches:
+        from geometry_cache import GeometryCache
+        _caches[cache_path] = GeometryCache(cache_path)
+    cache = _caches[cache_path]
+    tasks = [(first_idx + i,) + cache.geometry(first_row + i) for i in range(count)]
+    return process_building_batch(tasks, weld_tolerance, stages)